@@ -0,0 +1,243 @@
+"""
+Agent Loop for ThinkChain / SublimeChain
+
+Runs the request → tool_use → tool_result cycle as an explicit loop instead
+of recursion. Each round appends the assistant message and its tool results
+to the transcript in place, the loop stops on a final answer or when the
+round/token budget is spent, and every round's latency is split into model,
+tool and memory time. ``AsyncAgentLoop`` is the same engine for coroutine
+callbacks (AsyncAnthropic streaming, awaitable tool execution).
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RoundTiming:
+    """Wall-clock time spent in one agent round, split by phase"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.model = 0.0
+        self.tools = 0.0
+        self.memory = 0.0
+        self.tool_calls = 0
+
+    @property
+    def total(self) -> float:
+        return self.model + self.tools + self.memory
+
+    @contextmanager
+    def measure(self, phase: str):
+        """Add the time spent in the block to ``phase`` ("model", "tools" or "memory")"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, phase, getattr(self, phase) + time.perf_counter() - start)
+
+    def summary(self) -> str:
+        return (f"round {self.index}: model {self.model:.2f}s · tools {self.tools:.2f}s "
+                f"({self.tool_calls} calls) · memory {self.memory:.2f}s")
+
+
+class AgentResult:
+    """Outcome of one agent run"""
+
+    def __init__(self, final_message: Any, stop_reason: str, rounds: List[RoundTiming],
+                 input_tokens: int, output_tokens: int):
+        self.final_message = final_message
+        # "end_turn" (final answer), "max_rounds" or "max_tokens" (budget exhausted)
+        self.stop_reason = stop_reason
+        self.rounds = rounds
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+    @property
+    def completed(self) -> bool:
+        return self.stop_reason == "end_turn"
+
+    def totals(self) -> Dict[str, float]:
+        """Total time per phase across all rounds"""
+        return {
+            "model": sum(timing.model for timing in self.rounds),
+            "tools": sum(timing.tools for timing in self.rounds),
+            "memory": sum(timing.memory for timing in self.rounds),
+        }
+
+
+class AgentLoop:
+    """
+    Explicit request/tool loop with a round and token budget.
+
+    Args:
+        request_round: ``(messages, timing) -> message`` sends one request and
+            returns the final assistant message. Time it records with
+            ``timing.measure("memory")`` is not counted as model time.
+        run_tools: ``(tool_uses, timing) -> [str]`` executes the tool_use blocks
+            of one round and returns their results in the same order.
+        prepare: optional ``(messages, timing) -> None`` called once before the
+            first request (e.g. memory lookup).
+        max_rounds: upper bound on model requests per run.
+        max_tokens: upper bound on input + output tokens per run (None = no limit).
+        on_round_end: optional ``(timing) -> None`` called after every round.
+    """
+
+    def __init__(self, request_round: Callable[[List[Dict[str, Any]], RoundTiming], Any],
+                 run_tools: Callable[[List[Any], RoundTiming], List[str]],
+                 prepare: Optional[Callable[[List[Dict[str, Any]], RoundTiming], None]] = None,
+                 max_rounds: int = 25, max_tokens: Optional[int] = None,
+                 on_round_end: Optional[Callable[[RoundTiming], None]] = None):
+        self.request_round = request_round
+        self.run_tools = run_tools
+        self.prepare = prepare
+        self.max_rounds = max(1, max_rounds)
+        self.max_tokens = max_tokens
+        self.on_round_end = on_round_end
+
+    def run(self, messages: List[Dict[str, Any]]) -> AgentResult:
+        """
+        Run rounds until the model stops calling tools or the budget is spent.
+
+        ``messages`` is extended in place with each round's assistant message
+        and tool results; only the latest message object is kept alive here.
+        """
+        run = _AgentRun(self)
+        for timing in run.rounds_iter():
+            if timing.index == 1 and self.prepare is not None:
+                self.prepare(messages, timing)
+
+            start = time.perf_counter()
+            memory_before = timing.memory
+            message = self.request_round(messages, timing)
+            timing.model += time.perf_counter() - start - (timing.memory - memory_before)
+
+            tool_uses = run.record_response(message, messages, timing)
+            if not tool_uses:
+                break
+
+            with timing.measure("tools"):
+                results = self.run_tools(tool_uses, timing)
+
+            if run.record_results(tool_uses, results, messages, timing):
+                break
+
+        return run.result()
+
+    def _end_round(self, timing: RoundTiming):
+        if self.on_round_end is not None:
+            try:
+                self.on_round_end(timing)
+            except Exception as e:
+                logger.debug(f"Round callback failed: {e}")
+
+
+class AsyncAgentLoop(AgentLoop):
+    """
+    ``AgentLoop`` for coroutine callbacks.
+
+    ``request_round``, ``run_tools`` and ``prepare`` are ``async`` functions
+    with the same signatures; ``run`` is awaited on the caller's event loop.
+    """
+
+    def __init__(self, request_round: Callable[[List[Dict[str, Any]], RoundTiming], Awaitable[Any]],
+                 run_tools: Callable[[List[Any], RoundTiming], Awaitable[List[str]]],
+                 prepare: Optional[Callable[[List[Dict[str, Any]], RoundTiming], Awaitable[None]]] = None,
+                 max_rounds: int = 25, max_tokens: Optional[int] = None,
+                 on_round_end: Optional[Callable[[RoundTiming], None]] = None):
+        super().__init__(request_round, run_tools, prepare, max_rounds, max_tokens, on_round_end)
+
+    async def run(self, messages: List[Dict[str, Any]]) -> AgentResult:
+        """Async version of ``AgentLoop.run``"""
+        run = _AgentRun(self)
+        for timing in run.rounds_iter():
+            if timing.index == 1 and self.prepare is not None:
+                await self.prepare(messages, timing)
+
+            start = time.perf_counter()
+            memory_before = timing.memory
+            message = await self.request_round(messages, timing)
+            timing.model += time.perf_counter() - start - (timing.memory - memory_before)
+
+            tool_uses = run.record_response(message, messages, timing)
+            if not tool_uses:
+                break
+
+            with timing.measure("tools"):
+                results = await self.run_tools(tool_uses, timing)
+
+            if run.record_results(tool_uses, results, messages, timing):
+                break
+
+        return run.result()
+
+
+class _AgentRun:
+    """Bookkeeping shared by the sync and async loops for a single run"""
+
+    def __init__(self, loop: AgentLoop):
+        self.loop = loop
+        self.rounds: List[RoundTiming] = []
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.final_message = None
+        self.stop_reason = "max_rounds"
+
+    def rounds_iter(self):
+        for index in range(1, self.loop.max_rounds + 1):
+            timing = RoundTiming(index)
+            self.rounds.append(timing)
+            yield timing
+
+    def record_response(self, message: Any, messages: List[Dict[str, Any]],
+                        timing: RoundTiming) -> List[Any]:
+        """Account for one response; returns its tool_use blocks (empty = final answer)"""
+        self.final_message = message
+
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            self.input_tokens += (getattr(usage, "input_tokens", 0) or 0) + \
+                                 (getattr(usage, "cache_read_input_tokens", 0) or 0) + \
+                                 (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+            self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+
+        tool_uses = [block for block in message.content if block.type == 'tool_use']
+        if not tool_uses:
+            self.stop_reason = "end_turn"
+            self.loop._end_round(timing)
+            return []
+
+        messages.append({
+            "role": "assistant",
+            "content": [block.model_dump() for block in message.content]
+        })
+        timing.tool_calls = len(tool_uses)
+        return tool_uses
+
+    def record_results(self, tool_uses: List[Any], results: List[str],
+                       messages: List[Dict[str, Any]], timing: RoundTiming) -> bool:
+        """Append the tool_result message; returns True when the token budget is spent"""
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": tool_use.id, "content": result}
+                for tool_use, result in zip(tool_uses, results)
+            ]
+        })
+        self.loop._end_round(timing)
+
+        max_tokens = self.loop.max_tokens
+        if max_tokens is not None and self.input_tokens + self.output_tokens >= max_tokens:
+            self.stop_reason = "max_tokens"
+            return True
+        return False
+
+    def result(self) -> AgentResult:
+        if self.stop_reason != "end_turn":
+            logger.warning(f"Agent loop stopped after {len(self.rounds)} rounds ({self.stop_reason})")
+        return AgentResult(self.final_message, self.stop_reason, self.rounds,
+                           self.input_tokens, self.output_tokens)
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for TranscriptCompactor.
+
+Times compaction of synthetic transcripts of 100 to 3,000 messages against
+a budget of an eighth of their estimated size (so old results are
+elided and the oldest turns dropped), cold (first compaction) and warm
+(the same transcript sent again, which should only re-apply earlier
+decisions). Every result is checked for the shape the Messages API
+accepts, including a turn whose own tool rounds alone exceed the budget.
+
+Usage:
+    python benchmarks/bench_context_compactor.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_compactor import TranscriptCompactor, estimate_message_tokens
+
+SIZES = [100, 300, 1000, 3000]
+
+
+def tool_round(tool_id: str, payload_chars: int) -> list:
+    """An assistant thinking + tool_use message and the user message with its tool_result"""
+    return [
+        {"role": "assistant", "content": [
+            {"type": "thinking", "thinking": "I should read the file.", "signature": "sig"},
+            {"type": "tool_use", "id": tool_id, "name": "filecontentreadertool",
+             "input": {"file_paths": [f"src/{tool_id}.py"]}},
+        ]},
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": tool_id, "content": "x = 1\n" * (payload_chars // 6)},
+        ]},
+    ]
+
+
+def build_transcript(size: int, payload_chars: int = 2000) -> list:
+    """Synthetic transcript: user -> tool round -> assistant text, repeated"""
+    transcript = []
+    turn = 0
+    while len(transcript) < size:
+        transcript.append({"role": "user", "content": f"Question number {turn}: read the project files"})
+        transcript.extend(tool_round(f"toolu_{turn:06d}", payload_chars))
+        transcript.append({"role": "assistant", "content": f"Module {turn} sets x to 1."})
+        turn += 1
+    # End on a user turn, as when a request is about to be sent
+    return transcript[:size - 1] + [{"role": "user", "content": "And now?"}]
+
+
+def build_long_turn(rounds: int = 6, payload_chars: int = 20_000) -> list:
+    """A short exchange, then one turn whose tool rounds alone exceed the budget"""
+    transcript = [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello! What should we work on?"},
+        {"role": "user", "content": "Read every module and summarize them"},
+    ]
+    for index in range(rounds):
+        transcript.extend(tool_round(f"toolu_long_{index}", payload_chars))
+    return transcript
+
+
+def check_shape(messages: list):
+    """Assert the transcript starts with a plain user turn and every tool_result follows its tool_use"""
+    first = messages[0]
+    assert first["role"] == "user", first
+    assert not isinstance(first["content"], list) or all(
+        block.get("type") != "tool_result" for block in first["content"]), first
+    previous_ids = set()
+    for message in messages:
+        content = message["content"] if isinstance(message["content"], list) else []
+        types = [block.get("type") for block in content]
+        if message["role"] == "assistant" and "thinking" in types:
+            assert types[0] == "thinking", types
+        if message["role"] == "user":
+            results = [block.get("tool_use_id") for block in content if block.get("type") == "tool_result"]
+            assert set(results) <= previous_ids, (results, previous_ids)
+        previous_ids = {block.get("id") for block in content if block.get("type") == "tool_use"}
+
+
+def best_of(func, repeat: int) -> float:
+    """Best-of-``repeat`` wall time of one call, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size (best is reported)")
+    args = parser.parse_args()
+
+    long_turn = build_long_turn()
+    compacted = TranscriptCompactor().compact(long_turn, 8000)
+    check_shape(compacted)
+    assert compacted[0]["content"][-1]["text"] == long_turn[2]["content"], compacted[0]
+
+    print(f"{'messages':>9} {'cold (ms)':>10} {'warm (ms)':>10} {'sent':>6}")
+    for size in SIZES:
+        transcript = build_transcript(size)
+        budget = sum(estimate_message_tokens(message) for message in transcript) // 8
+
+        cold = best_of(lambda: TranscriptCompactor().compact(transcript, budget), args.repeat)
+        compactor = TranscriptCompactor()
+        sent = compactor.compact(transcript, budget)
+        check_shape(sent)
+        warm = best_of(lambda: compactor.compact(transcript, budget), args.repeat)
+        assert all(a is b for a, b in zip(sent, compactor.compact(transcript, budget)))
+        print(f"{size:>9} {cold * 1000:>10.3f} {warm * 1000:>10.3f} {len(sent):>6}")
+
+
+if __name__ == "__main__":
+    main()
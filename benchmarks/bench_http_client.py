@@ -0,0 +1,113 @@
+"""
+Cost of repeated web tool fetches: cold requests.get vs the shared client.
+
+Serves a page from a local HTTP/1.1 server that adds a fixed delay per
+new connection (standing in for the TCP and TLS handshakes of a remote
+host) and per response (server time), and answers conditional requests
+with 304. It fetches the page N times with a fresh requests.get each
+time (the previous behavior), through the pooled session without the
+cache, and through the cache for a page that must be revalidated
+(ETag + no-cache) and for one with max-age.
+
+Usage:
+    python benchmarks/bench_http_client.py [--fetches N] [--handshake-ms MS] [--server-ms MS]
+"""
+
+import argparse
+import hashlib
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from http_client import HttpClient
+
+PAGE = b"<html><body><main>" + b"<p>Documentation paragraph.</p>" * 2000 + b"</main></body></html>"
+ETAG = '"%s"' % hashlib.md5(PAGE).hexdigest()
+
+
+def start_server(handshake: float, server_time: float):
+    counts = {"connections": 0, "200": 0, "304": 0}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; without this, delayed ACKs stall keep-alive responses
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            counts["connections"] += 1
+            time.sleep(handshake)
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(server_time)
+            if self.headers.get("If-None-Match") == ETAG:
+                counts["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            counts["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.send_header("ETag", ETAG)
+            self.send_header("Cache-Control", "max-age=60" if self.path == "/static" else "no-cache")
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fetches", type=int, default=20, help="fetches of the same page per mode")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="delay per new connection")
+    parser.add_argument("--server-ms", type=float, default=10.0, help="delay per response")
+    args = parser.parse_args()
+
+    server, counts = start_server(args.handshake_ms / 1000, args.server_ms / 1000)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{args.fetches} fetches of a {len(PAGE) // 1024} KB page, "
+          f"{args.handshake_ms:.0f} ms per connection, {args.server_ms:.0f} ms per response")
+    print(f"{'mode':<28} {'total (ms)':>11} {'per fetch':>10} {'conns':>6} {'200s':>5} {'304s':>5}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        pooled = HttpClient(use_cache=False)
+        cached = HttpClient(cache_dir=cache_dir, use_cache=True)
+        modes = [
+            ("requests.get (cold)", lambda path: requests.get(base + path, timeout=10)),
+            ("pooled session, no cache", lambda path: pooled.get(base + path)),
+            ("cache, ETag + no-cache", lambda path: cached.get(base + path)),
+            ("cache, max-age", lambda path: cached.get(base + "/static")),
+        ]
+        try:
+            for label, fetch in modes:
+                before = dict(counts)
+                start = time.perf_counter()
+                for _ in range(args.fetches):
+                    fetch("/page").raise_for_status()
+                elapsed = time.perf_counter() - start
+                delta = {key: counts[key] - before[key] for key in counts}
+                print(f"{label:<28} {elapsed * 1000:>11.1f} {elapsed / args.fetches * 1000:>10.1f} "
+                      f"{delta['connections']:>6} {delta['200']:>5} {delta['304']:>5}")
+        finally:
+            pooled.close()
+            cached.close()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Micro-benchmark for the memory-worthiness heuristics.
+
+Times should_remember_conversation on assistant responses of 1 KB to
+64 KB, with and without a memory-worthy phrase near the end, plus the
+short-text checks run on every turn (memory lookup trigger, smart_recall
+strategy, tool usage). The previous implementations, which rebuilt the
+keyword lists and ran one substring scan per keyword, are timed alongside;
+their answers are checked against the current ones on every input.
+
+Usage:
+    python benchmarks/bench_memory_heuristics.py [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_heuristics import (
+    recall_strategy, should_remember_conversation, should_remember_tool_usage, wants_memory_search
+)
+
+SIZES = [1_000, 4_000, 16_000, 64_000]
+
+# Prose without any of the heuristics' keywords
+FILLER_WORDS = ("the function returns a list of values which the caller then sorts by "
+                "their key and writes into a table so each row shows one result with "
+                "its score while a second pass checks the numbers against what was "
+                "expected earlier").split()
+
+
+def build_response(size: int, tail: str = "") -> str:
+    """Keyword-free prose of about ``size`` characters, optionally ending with ``tail``"""
+    rng = random.Random(size)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word.capitalize() if rng.random() < 0.05 else word)
+        length += len(word) + 1
+    return " ".join(words) + tail
+
+
+def legacy_should_remember_conversation(user_input: str, assistant_response: str) -> bool:
+    """The previous implementation (one substring scan per keyword)"""
+    if len(user_input) < 30 or len(assistant_response) < 100:
+        return False
+    generic_phrases = [
+        "i don't have", "i don't know", "based on the information",
+        "according to what", "hello", "hi there", "how can i help",
+        "sure, i can help", "let me help", "i'll help you"
+    ]
+    if any(phrase in assistant_response.lower()[:200] for phrase in generic_phrases):
+        return False
+    valuable_topics = [
+        'my name is', 'i am', 'i work', 'i live', 'i prefer', 'i like',
+        'i usually', 'my favorite', 'my background', 'about me',
+        'prefer', 'workflow', 'process', 'standard', 'template',
+        'always do', 'usually do', 'best practice', 'convention',
+        'learned', 'discovered', 'figured out', 'solution', 'pattern',
+        'mistake', 'lesson', 'insight', 'remember that', 'note that',
+        'configuration', 'setup', 'environment', 'api key', 'token',
+        'credential', 'setting', 'config', 'install', 'deploy'
+    ]
+    combined_text = f"{user_input} {assistant_response}".lower()
+    if any(topic in combined_text for topic in valuable_topics):
+        return True
+    memory_requests = [
+        'remember', 'note', 'save', 'store', 'keep in mind',
+        'for future', 'next time', 'going forward'
+    ]
+    if any(request in user_input.lower() for request in memory_requests):
+        return True
+    return False
+
+
+def legacy_wants_memory_search(user_input: str) -> bool:
+    memory_keywords = ["remember", "recall", "told you", "discussed", "my", "me", "i am", "name", "preferences"]
+    return any(keyword in user_input.lower() for keyword in memory_keywords)
+
+
+def legacy_recall_strategy(query: str):
+    query_lower = query.lower()
+    if any(term in query_lower for term in ["yesterday", "today", "last week", "last month", "this week"]):
+        return "temporal"
+    elif any(term in query_lower for term in ["about me", "know about me", "who am i", "my info", "my details"]):
+        return "personal"
+    elif any(term in query_lower for term in ["what did i", "where did i", "what have i", "activities", "events"]):
+        return "activity"
+    elif any(term in query_lower for term in ["tools", "work", "projects", "code", "development"]):
+        return "work"
+    return None
+
+
+def legacy_should_remember_tool_usage(name: str, args: dict, result: str, context: str) -> bool:
+    trivial_tools = {'duckduckgotool', 'webscrapertool', 'mcp_fetch_fetch', 'filecontentreadertool', 'weathertool'}
+    if name in trivial_tools:
+        return False
+    if name.startswith('mcp_brave-search_'):
+        if 'local_search' in name and ('error' in result.lower() or len(result) < 50):
+            return False
+        search_terms = str(args).lower()
+        valuable_searches = [
+            'prefer', 'favorite', 'best', 'recommend', 'how to', 'tutorial',
+            'learn', 'guide', 'documentation', 'api', 'error', 'problem',
+            'comparison', 'versus', 'review', 'alternative'
+        ]
+        if 'web_search' in name:
+            if not any(term in search_terms for term in valuable_searches):
+                return False
+        if 'local_search' in name:
+            if not any(term in search_terms for term in valuable_searches + ['near me', 'nearby', 'area']):
+                return False
+    elif 'search' in name.lower():
+        search_terms = str(args).lower()
+        valuable_searches = [
+            'prefer', 'favorite', 'best', 'recommend', 'how to', 'tutorial',
+            'learn', 'guide', 'documentation', 'api', 'error', 'problem'
+        ]
+        if not any(term in search_terms for term in valuable_searches):
+            return False
+    valuable_tools = {'claudecode', 'createfolderstool', 'diffeditortool', 'uvpackagemanager'}
+    if name in valuable_tools:
+        return True
+    if 'notion' in name.lower() or 'pushover' in name.lower():
+        return True
+    if name.startswith('mcp_') and any(action in name.lower() for action in [
+        'create', 'update', 'delete', 'write', 'edit', 'add', 'remove'
+    ]):
+        return True
+    if len(result) < 100:
+        return False
+    if result.startswith('<error>') or 'error' in result.lower()[:50]:
+        return False
+    if len(result) > 2000:
+        return False
+    if context and any(keyword in context.lower() for keyword in [
+        'prefer', 'like', 'favorite', 'always', 'usually', 'workflow',
+        'setup', 'configure', 'pattern', 'template', 'standard'
+    ]):
+        return True
+    return False
+
+
+SHORT_INPUTS = [
+    "What did I work on yesterday?",
+    "Can you summarize the numbers in that table for me",
+    "Tell me what you know about me",
+    "Which tools did we use for the projects last month?",
+    "Sort these values by key and print each row",
+]
+
+TOOL_CALLS = [
+    ("mcp_brave-search_brave_web_search", {"query": "best python formatter versus black"}, "x" * 300, ""),
+    ("mcp_brave-search_brave_local_search", {"query": "coffee nearby"}, "y" * 300, ""),
+    ("tavily_search", {"query": "weather in paris"}, "z" * 300, ""),
+    ("mcp_notion_create_page", {"title": "Plan"}, "ok", ""),
+    ("lintingtool", {"path": "a.py"}, "w" * 500, "I usually run ruff with this setup"),
+]
+
+
+def best_of(funcs: tuple, args: tuple, repeat: int, number: int) -> list:
+    """
+    Best-of-``repeat`` time of one call of each of ``funcs``, in seconds.
+    The functions take turns within every repeat, so drift in machine load
+    affects them alike.
+    """
+    best = [float("inf")] * len(funcs)
+    for _ in range(repeat):
+        for index, func in enumerate(funcs):
+            start = time.perf_counter()
+            for _ in range(number):
+                func(*args)
+            best[index] = min(best[index], (time.perf_counter() - start) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    args = parser.parse_args()
+
+    user_input = "Please sort the values in this table by their key for me"
+    print(f"{'response':>9} {'worthy':>7} {'current (us)':>13} {'legacy (us)':>12} {'speedup':>8}")
+    for size in SIZES:
+        for tail in ("", " which is the pattern we settled on."):
+            response = build_response(size, tail)
+            case = (user_input, response)
+            assert should_remember_conversation(*case) == legacy_should_remember_conversation(*case)
+            number = max(1, 200_000 // size)
+            current, legacy = best_of((should_remember_conversation, legacy_should_remember_conversation),
+                                      case, args.repeat, number)
+            print(f"{len(response):>9} {'yes' if tail else 'no':>7} {current * 1e6:>13.1f} "
+                  f"{legacy * 1e6:>12.1f} {legacy / current:>7.1f}x")
+
+    print(f"\n{'short-text checks':<30} {'current (us)':>13} {'legacy (us)':>12} {'speedup':>8}")
+    checks = [
+        ("memory lookup trigger", wants_memory_search, legacy_wants_memory_search, [(text,) for text in SHORT_INPUTS]),
+        ("smart_recall strategy", recall_strategy, legacy_recall_strategy, [(text,) for text in SHORT_INPUTS]),
+        ("tool usage", should_remember_tool_usage, legacy_should_remember_tool_usage, TOOL_CALLS),
+    ]
+    for label, func, legacy_func, cases in checks:
+        for case in cases:
+            assert func(*case) == legacy_func(*case), (label, case)
+        times = [best_of((func, legacy_func), case, args.repeat, 2000) for case in cases]
+        current = sum(current for current, _ in times) / len(cases)
+        legacy = sum(legacy for _, legacy in times) / len(cases)
+        print(f"{label:<30} {current * 1e6:>13.2f} {legacy * 1e6:>12.2f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+CPU cost of rendering a streamed response, per delta.
+
+Replays a synthetic response (a thinking block, then Markdown prose with a
+code block) as small text deltas, paced like fine-grained streaming, into
+a terminal console writing to /dev/null. It compares the previous
+approach, one console.print (or one write and flush without Rich) per
+delta, with StreamRenderer in plain and Markdown mode. CPU time is
+process time, so the pacing sleeps are not counted.
+
+Usage:
+    python benchmarks/bench_stream_renderer.py [--deltas N] [--rate DELTAS_PER_SECOND]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ui_components
+from ui_components import EnhancedConsole, RICH_AVAILABLE
+
+PARAGRAPH = ("The renderer collects streamed deltas and writes them in batches, so the "
+             "terminal sees a few dozen writes per response instead of thousands. ")
+
+
+def build_deltas(count: int, size: int = 4):
+    """(region, text) deltas: a quarter thinking, the rest Markdown response"""
+    thinking = (PARAGRAPH * (count // 8 * size // len(PARAGRAPH) + 1))[:count // 4 * size]
+    body = []
+    while sum(map(len, body)) < (count - count // 4) * size:
+        body.append(f"## Step {len(body)}\n\n{PARAGRAPH * 3}\n\n```python\nprint('step {len(body)}')\n```\n\n")
+    response = "".join(body)[:(count - count // 4) * size]
+    deltas = [("thinking", thinking[i:i + size]) for i in range(0, len(thinking), size)]
+    deltas += [("response", response[i:i + size]) for i in range(0, len(response), size)]
+    return deltas
+
+
+def make_console(out):
+    ui = EnhancedConsole()
+    if RICH_AVAILABLE:
+        ui.console = ui_components.Console(file=out, force_terminal=True, width=100)
+    return ui
+
+
+def legacy_stream(ui, out, deltas, pause):
+    region = None
+    for kind, text in deltas:
+        if kind != region:
+            if region == "thinking":
+                if ui.console is not None:
+                    ui.console.print("")
+                else:
+                    out.write("\n")
+            region = kind
+        if ui.console is not None:
+            ui.console.print(text, end='', style="italic blue" if kind == "thinking" else None)
+        else:
+            out.write(text)
+            out.flush()
+        time.sleep(pause)
+    return len(deltas)
+
+
+def renderer_stream(ui, out, deltas, pause, markdown):
+    stdout, sys.stdout = sys.stdout, out
+    try:
+        with ui.stream_renderer(markdown=markdown) as renderer:
+            for kind, text in deltas:
+                if kind != renderer.region:
+                    renderer.begin(kind)
+                renderer.write(text)
+                time.sleep(pause)
+        return renderer.stats["writes"]
+    finally:
+        sys.stdout = stdout
+
+
+def measure(func, *args):
+    wall, cpu = time.perf_counter(), time.process_time()
+    writes = func(*args)
+    return time.process_time() - cpu, time.perf_counter() - wall, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--deltas", type=int, default=2000, help="deltas per response")
+    parser.add_argument("--rate", type=float, default=500.0, help="deltas arriving per second")
+    args = parser.parse_args()
+
+    deltas = build_deltas(args.deltas)
+    pause = 1.0 / args.rate if args.rate > 0 else 0.0
+    print(f"{len(deltas)} deltas at {args.rate:.0f}/s, Rich {'available' if RICH_AVAILABLE else 'not installed'}")
+    print(f"{'mode':<22} {'CPU (ms)':>9} {'us/delta':>9} {'writes':>7} {'wall (s)':>9}")
+
+    modes = [("per-delta print", legacy_stream, ()),
+             ("StreamRenderer", renderer_stream, (False,))]
+    if RICH_AVAILABLE:
+        modes.append(("StreamRenderer + md", renderer_stream, (True,)))
+    with open(os.devnull, "w") as out:
+        for label, func, extra in modes:
+            cpu, wall, writes = measure(func, make_console(out), out, deltas, pause, *extra)
+            print(f"{label:<22} {cpu * 1000:>9.1f} {cpu / len(deltas) * 1e6:>9.1f} {writes:>7} {wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
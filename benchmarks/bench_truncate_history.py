@@ -0,0 +1,122 @@
+"""
+Micro-benchmark for truncate_conversation_history.
+
+Builds synthetic transcripts of 100 to 10,000 messages (user turns, tool
+rounds with sizeable tool_result payloads, assistant replies) and times
+truncation with a window of half the transcript, so the work done grows
+with the transcript. Per-message cost should stay flat for the current
+implementation; the previous implementation is timed alongside for
+comparison (skipped on the largest sizes, where it takes minutes).
+
+Usage:
+    python benchmarks/bench_truncate_history.py [--repeat N] [--legacy-max N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_compactor import truncate_conversation_history
+
+SIZES = [100, 300, 1000, 3000, 10000]
+
+
+def build_transcript(size: int, payload_chars: int = 2000) -> list:
+    """Synthetic transcript: user -> assistant tool_use -> user tool_result -> assistant text"""
+    transcript = [{"role": "system", "content": "You are a helpful assistant."}]
+    turn = 0
+    while len(transcript) < size:
+        tool_id = f"toolu_{turn:06d}"
+        transcript.append({"role": "user", "content": f"Question number {turn}: read the project files"})
+        transcript.append({"role": "assistant", "content": [
+            {"type": "text", "text": "Let me look at that."},
+            {"type": "tool_use", "id": tool_id, "name": "filecontentreadertool",
+             "input": {"file_paths": [f"src/module_{turn}.py"]}},
+        ]})
+        transcript.append({"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": tool_id,
+             "content": (f"# module {turn}\n" + "x = 1\n" * (payload_chars // 6))},
+        ]})
+        transcript.append({"role": "assistant", "content": f"Module {turn} sets x to 1."})
+        turn += 1
+    return transcript[:size]
+
+
+def legacy_truncate(transcript: list, max_messages: int = 20) -> list:
+    """The previous implementation (deep-equality membership checks)"""
+    if len(transcript) <= max_messages:
+        return transcript
+    system_messages = [msg for msg in transcript if msg.get("role") == "system"]
+    recent_messages = transcript[-max_messages:]
+    cleaned_recent = []
+    for msg in recent_messages:
+        if msg.get("role") == "user" and isinstance(msg.get("content"), list):
+            content_blocks = []
+            for block in msg.get("content", []):
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    tool_use_id = block.get("tool_use_id")
+                    found_tool_use = False
+                    if cleaned_recent:
+                        prev_msg = cleaned_recent[-1]
+                        if prev_msg.get("role") == "assistant" and isinstance(prev_msg.get("content"), list):
+                            for prev_block in prev_msg.get("content", []):
+                                if (isinstance(prev_block, dict) and
+                                    prev_block.get("type") == "tool_use" and
+                                    prev_block.get("id") == tool_use_id):
+                                    found_tool_use = True
+                                    break
+                    if found_tool_use:
+                        content_blocks.append(block)
+                else:
+                    content_blocks.append(block)
+            if content_blocks:
+                msg = {**msg, "content": content_blocks}
+                cleaned_recent.append(msg)
+        else:
+            cleaned_recent.append(msg)
+    result = system_messages.copy()
+    for msg in cleaned_recent:
+        if msg not in result:
+            result.append(msg)
+    return result
+
+
+def time_call(func, transcript: list, window: int, repeat: int) -> float:
+    """Best-of-``repeat`` wall time of one call, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(transcript, max_messages=window)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size (best is reported)")
+    parser.add_argument("--legacy-max", type=int, default=3000,
+                        help="largest size to time the previous implementation on")
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'current (ms)':>13} {'ns/message':>11} {'legacy (ms)':>12} {'speedup':>8}")
+    for size in SIZES:
+        transcript = build_transcript(size)
+        window = size // 2
+
+        current = time_call(truncate_conversation_history, transcript, window, args.repeat)
+        row = f"{size:>9} {current * 1000:>13.3f} {current / size * 1e9:>11.0f}"
+
+        if size <= args.legacy_max:
+            legacy = time_call(legacy_truncate, transcript, window, max(1, args.repeat // 5))
+            assert legacy_truncate(transcript, window) == truncate_conversation_history(transcript, window)
+            row += f" {legacy * 1000:>12.3f} {legacy / current:>7.0f}x"
+        else:
+            row += f" {'-':>12} {'-':>8}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Transcript Compaction for SublimeChain
+
+Keeps the messages sent to Claude inside a token budget instead of a fixed
+message count. Old tool_result payloads are elided first, then the oldest
+exchanges are dropped, always keeping tool_use/tool_result pairs together.
+Compaction decisions are remembered, so the prefix sent on consecutive
+requests stays byte-identical and prompt caching keeps hitting.
+"""
+
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Context window (tokens) per model; unknown models fall back to the default
+MODEL_CONTEXT_WINDOWS = {
+    "claude-sonnet-4-20250514": 200_000,
+    "claude-opus-4-20250514": 200_000,
+}
+DEFAULT_CONTEXT_WINDOW = 200_000
+
+# Rough characters-per-token ratio for English text and JSON
+CHARS_PER_TOKEN = 4
+# Fixed per-message / per-block overhead of the Messages API framing
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _block_text(block: Any) -> str:
+    """Text that a content block contributes to the prompt"""
+    if isinstance(block, str):
+        return block
+    if not isinstance(block, dict):
+        return str(block)
+
+    block_type = block.get("type")
+    if block_type == "text":
+        return block.get("text", "")
+    if block_type == "thinking":
+        return block.get("thinking", "")
+    if block_type == "tool_use":
+        return block.get("name", "") + json.dumps(block.get("input", {}), separators=(",", ":"))
+    if block_type == "tool_result":
+        return _tool_result_text(block)
+    return json.dumps(block, separators=(",", ":"), default=str)
+
+
+def _tool_result_text(block: Dict[str, Any]) -> str:
+    """Flatten the content of a tool_result block to text"""
+    content = block.get("content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(_block_text(part) for part in content)
+    return str(content)
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    """Estimate the token count of one transcript message"""
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(content)
+
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for block in content or []:
+        tokens += MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(_block_text(block))
+    return tokens
+
+
+def _has_tool_use(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return (message.get("role") == "assistant" and isinstance(content, list) and
+            any(isinstance(block, dict) and block.get("type") == "tool_use" for block in content))
+
+
+def _has_tool_result(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return (message.get("role") == "user" and isinstance(content, list) and
+            any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content))
+
+
+class TranscriptCompactor:
+    """
+    Token-budget compaction of a conversation transcript.
+
+    The transcript is split into units: a tool round (assistant tool_use
+    message plus the user message carrying its tool_results) or a single
+    message. When the transcript exceeds the budget, tool_result payloads of
+    older rounds are replaced by short summaries, then the oldest units are
+    dropped, until it fits under ``low_water`` of the budget. The user
+    message that starts the current turn is never dropped; if the turn's own
+    tool rounds are still too large, their payloads are summarized too,
+    recent rounds included. Compacting down
+    to the low-water mark means compaction happens rarely, and between
+    compactions the same messages (the very same dict objects) are sent again.
+    """
+
+    def __init__(self, keep_recent_rounds: int = 2, min_elide_tokens: int = 400,
+                 preview_chars: int = 300, low_water: float = 0.75, cache_size: int = 4096):
+        self.keep_recent_rounds = keep_recent_rounds
+        self.min_elide_tokens = min_elide_tokens
+        self.preview_chars = preview_chars
+        self.low_water = low_water
+        self.cache_size = cache_size
+
+        # id(message) -> (message, tokens); the message reference keeps the id valid
+        self._token_cache: "OrderedDict[int, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        # id(original message) -> (original, compacted copy) for messages with elided results
+        self._elided: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        # First message kept after the last drop; earlier messages stay dropped
+        self._first_kept: Optional[Dict[str, Any]] = None
+        self._first_kept_note: Optional[Dict[str, Any]] = None
+        self.stats = {"compactions": 0, "elided_results": 0, "dropped_messages": 0}
+
+    def message_tokens(self, message: Dict[str, Any]) -> int:
+        """Token estimate for a message, cached per message object"""
+        key = id(message)
+        cached = self._token_cache.get(key)
+        if cached is not None and cached[0] is message:
+            self._token_cache.move_to_end(key)
+            return cached[1]
+
+        tokens = estimate_message_tokens(message)
+        self._token_cache[key] = (message, tokens)
+        if len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+        return tokens
+
+    def reset(self):
+        """Forget all compaction decisions (e.g. after /clear)"""
+        self._token_cache.clear()
+        self._elided.clear()
+        self._first_kept = None
+        self._first_kept_note = None
+
+    def compact(self, transcript: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """
+        Return the messages to send for ``transcript`` within ``budget`` tokens.
+
+        The input list and its messages are never modified.
+        """
+        # Each entry is [original message, message as sent]
+        entries = self._apply_previous_decisions(transcript)
+        total = sum(self.message_tokens(sent) for _, sent in entries)
+        if total <= budget:
+            return [sent for _, sent in entries]
+
+        self.stats["compactions"] += 1
+        target = int(budget * self.low_water)
+        units = self._split_units(entries)
+
+        # 1. Elide tool_result payloads of older tool rounds, oldest first
+        tool_rounds = [unit for unit in units if len(unit) == 2]
+        elidable = tool_rounds[:-self.keep_recent_rounds] if self.keep_recent_rounds else tool_rounds
+        for tool_use_entry, result_entry in elidable:
+            if total <= target:
+                break
+            total += self._elide_round(tool_use_entry, result_entry)
+
+        # 2. Drop the oldest units, never leaving a conversation that starts mid-round
+        #    and never dropping the user message that starts the current turn
+        droppable = max((index for index, unit in enumerate(units) if self._is_turn_start(unit)), default=0)
+        dropped = 0
+        while total > target and droppable > 0:
+            unit = units.pop(0)
+            droppable -= 1
+            total -= sum(self.message_tokens(sent) for _, sent in unit)
+            dropped += len(unit)
+            while droppable > 0 and not self._is_turn_start(units[0]):
+                unit = units.pop(0)
+                droppable -= 1
+                total -= sum(self.message_tokens(sent) for _, sent in unit)
+                dropped += len(unit)
+
+        # 3. Still over: the current turn's rounds are too large, so elide the recent ones too
+        for unit in units:
+            if total <= target:
+                break
+            if len(unit) == 2:
+                total += self._elide_round(*unit)
+
+        entries = [entry for unit in units for entry in unit]
+        if dropped:
+            self.stats["dropped_messages"] += dropped
+            self._mark_first_kept(entries[0])
+            kept = {id(original) for original, _ in entries}
+            self._elided = {key: value for key, value in self._elided.items() if key in kept}
+
+        if total > budget:
+            logger.warning(f"Transcript still over budget after compaction ({total} > {budget} tokens)")
+
+        return [sent for _, sent in entries]
+
+    def _apply_previous_decisions(self, transcript: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Re-apply earlier drops and elisions so the sent prefix does not change"""
+        start = 0
+        if self._first_kept is not None:
+            for index, message in enumerate(transcript):
+                if message is self._first_kept:
+                    start = index
+                    break
+            else:
+                # Transcript no longer contains the boundary (e.g. it was cleared)
+                self._first_kept = None
+                self._first_kept_note = None
+
+        entries = []
+        for index in range(start, len(transcript)):
+            message = transcript[index]
+            sent = message
+            elided = self._elided.get(id(message))
+            if elided is not None and elided[0] is message:
+                sent = elided[1]
+            if index == start and self._first_kept is not None:
+                sent = self._first_kept_note
+            entries.append([message, sent])
+        return entries
+
+    def _elide_round(self, tool_use_entry: List[Dict[str, Any]], result_entry: List[Dict[str, Any]]) -> int:
+        """Elide the payloads of one tool round in place; returns the change in tokens"""
+        compacted = self._elide_results(tool_use_entry[1], result_entry[1])
+        if compacted is result_entry[1]:
+            return 0
+        delta = self.message_tokens(compacted) - self.message_tokens(result_entry[1])
+        result_entry[1] = compacted
+        self._elided[id(result_entry[0])] = (result_entry[0], compacted)
+        return delta
+
+    def _split_units(self, entries: List[List[Dict[str, Any]]]) -> List[List[List[Dict[str, Any]]]]:
+        """Group messages so a tool_use message and its tool_results are never separated"""
+        units = []
+        index = 0
+        while index < len(entries):
+            message = entries[index][1]
+            if (_has_tool_use(message) and index + 1 < len(entries) and
+                    _has_tool_result(entries[index + 1][1])):
+                units.append([entries[index], entries[index + 1]])
+                index += 2
+            else:
+                units.append([entries[index]])
+                index += 1
+        return units
+
+    @staticmethod
+    def _is_turn_start(unit: List[List[Dict[str, Any]]]) -> bool:
+        """A transcript sent to the API must start with a plain user message"""
+        message = unit[0][1]
+        return len(unit) == 1 and message.get("role") == "user" and not _has_tool_result(message)
+
+    def _elide_results(self, tool_use_message: Dict[str, Any],
+                       result_message: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace large tool_result payloads in ``result_message`` with summaries"""
+        tool_names = {
+            block.get("id"): block.get("name", "tool")
+            for block in tool_use_message.get("content", [])
+            if isinstance(block, dict) and block.get("type") == "tool_use"
+        }
+
+        blocks = []
+        changed = False
+        for block in result_message.get("content", []):
+            if isinstance(block, dict) and block.get("type") == "tool_result":
+                text = _tool_result_text(block)
+                tokens = estimate_text_tokens(text)
+                if tokens >= self.min_elide_tokens:
+                    tool_name = tool_names.get(block.get("tool_use_id"), "tool")
+                    preview = text[:self.preview_chars].rstrip()
+                    block = {
+                        **block,
+                        "content": (f"[Earlier {tool_name} result elided to save context "
+                                    f"(~{tokens} tokens). Preview:]\n{preview}\n[...]")
+                    }
+                    changed = True
+                    self.stats["elided_results"] += 1
+            blocks.append(block)
+
+        if not changed:
+            return result_message
+        return {**result_message, "content": blocks}
+
+    def _mark_first_kept(self, entry: List[Dict[str, Any]]):
+        """
+        Record the new drop boundary and prefix the first kept message with a
+        note. Drops always stop at a plain user message; the note is never put
+        in front of anything else (an assistant message must keep its
+        thinking block first, tool_results must lead their message).
+        """
+        original, sent = entry
+        if not self._is_turn_start([entry]):
+            self._first_kept = original
+            self._first_kept_note = sent
+            return
+        content = sent.get("content", "")
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        note = {"type": "text", "text": "[Earlier conversation was compacted to fit the context window.]"}
+        marked = {**sent, "content": [note] + list(content)}
+
+        self._first_kept = original
+        self._first_kept_note = marked
+        entry[1] = marked
+
+
+def _tool_use_ids(message: Dict[str, Any]) -> frozenset:
+    """IDs of the tool_use blocks in an assistant message"""
+    content = message.get("content")
+    if message.get("role") != "assistant" or not isinstance(content, list):
+        return frozenset()
+    return frozenset(
+        block.get("id") for block in content
+        if isinstance(block, dict) and block.get("type") == "tool_use"
+    )
+
+
+def truncate_conversation_history(transcript: List[Dict[str, Any]], max_messages: int = 20) -> List[Dict[str, Any]]:
+    """
+    Keep system messages plus the last ``max_messages`` messages.
+
+    tool_result blocks whose tool_use is not in the preceding kept message are
+    removed, and user messages left empty are dropped. Runs in one pass over
+    the transcript; messages are only copied when a block is actually removed.
+    """
+    if len(transcript) <= max_messages:
+        return transcript
+
+    start = len(transcript) - max_messages
+    # System messages go first, wherever they appear
+    result = [message for message in transcript if message.get("role") == "system"]
+    previous_tool_use_ids = frozenset()
+
+    for index in range(start, len(transcript)):
+        message = transcript[index]
+        role = message.get("role")
+        if role == "system":
+            continue
+
+        content = message.get("content")
+        if role == "user" and isinstance(content, list):
+            kept_blocks = None  # only allocated once a block is dropped
+            for position, block in enumerate(content):
+                if (isinstance(block, dict) and block.get("type") == "tool_result" and
+                        block.get("tool_use_id") not in previous_tool_use_ids):
+                    if kept_blocks is None:
+                        kept_blocks = content[:position]
+                    continue
+                if kept_blocks is not None:
+                    kept_blocks.append(block)
+
+            if kept_blocks is not None:
+                if not kept_blocks:
+                    continue
+                message = {**message, "content": kept_blocks}
+            elif not content:
+                continue
+
+        result.append(message)
+        previous_tool_use_ids = _tool_use_ids(message)
+
+    return result
+
+
+def context_budget(model: str, max_tokens: int, reserved_tokens: int = 0,
+                   cap: Optional[int] = None, margin: float = 0.05) -> int:
+    """
+    Token budget available to the transcript for one request.
+
+    It is the model's context window minus the response allowance
+    (``max_tokens``), anything else sent with the request (tools, system
+    prompt) and a safety margin for estimation error, optionally capped.
+    """
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    budget = int(window * (1 - margin)) - max_tokens - reserved_tokens
+    if cap:
+        budget = min(budget, cap)
+    return max(budget, 1024)
+
+
+# Global instance for easy access
+_compactor = None
+
+def get_transcript_compactor() -> TranscriptCompactor:
+    """Get the global TranscriptCompactor instance"""
+    global _compactor
+    if _compactor is None:
+        _compactor = TranscriptCompactor()
+    return _compactor
@@ -0,0 +1,370 @@
+"""
+Shared HTTP Client for SublimeChain Web Tools
+
+One pooled ``requests.Session`` serves every web tool, so repeated calls
+to the same host reuse kept-alive connections instead of opening a new
+TCP/TLS connection each time. GET responses are kept in an on-disk HTTP
+cache that follows Cache-Control/Expires (falling back to a per-call TTL)
+and revalidates stale entries with ETag/Last-Modified, so fetching the
+same page twice costs nothing while it is fresh and a 304 after that.
+
+Cache directory: ``SUBLIME_HTTP_CACHE_DIR`` (default
+``~/.sublimechain/http-cache``); set ``SUBLIME_HTTP_CACHE=off`` to disable it.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple, Union
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) seconds; every request gets one unless the caller passes its own
+DEFAULT_TIMEOUT = (5, 15)
+# Freshness for responses that carry no caching headers of their own
+DEFAULT_TTL = 300
+
+# Headers of a desktop browser, for sites that turn away unknown clients
+BROWSER_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                   "AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/91.0.4472.124 Safari/537.36")
+}
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".sublimechain", "http-cache")
+# Bodies larger than this are not cached
+MAX_CACHED_BODY = 10 * 1024 * 1024
+# The cache is pruned back to PRUNE_TO of this once it grows past it
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+PRUNE_TO = 0.8
+# Stores between checks of the cache's total size
+PRUNE_EVERY = 50
+# Headers describing the bytes on the wire (a gzip body, a 304's empty body), not
+# the decoded body the cache keeps; never stored or merged into an entry
+BODY_FRAMING_HEADERS = ("Content-Length", "Content-Encoding", "Transfer-Encoding")
+
+# Per-host connection pools and how many connections each keeps alive
+POOL_HOSTS = 16
+POOL_CONNECTIONS_PER_HOST = 8
+
+
+class HttpCache:
+    """
+    On-disk store of GET responses: ``<key>.json`` holds the status,
+    headers, encoding and freshness, ``<key>.body`` the raw bytes. Both are
+    written to a temporary file and renamed into place, so concurrent
+    readers never see a partial entry.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("SUBLIME_HTTP_CACHE_DIR") or DEFAULT_CACHE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stores = 0
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".json", base + ".body"
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if len(body) != meta.get("size"):
+            return None
+        return meta, body
+
+    def save(self, key: str, meta: Dict[str, Any], body: Optional[bytes] = None) -> None:
+        """Write an entry; with ``body`` None only the metadata is replaced (after a 304)"""
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if body is not None:
+                with open(body_path + suffix, "wb") as f:
+                    f.write(body)
+                os.replace(body_path + suffix, body_path)
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            logger.debug(f"HTTP cache write failed for {meta.get('url')}: {e}")
+            return
+
+        with self._lock:
+            self._stores += 1
+            prune = self._stores % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self, max_bytes: int = MAX_CACHE_BYTES) -> int:
+        """Delete the least recently stored entries once the cache is over ``max_bytes``; returns how many"""
+        entries = []
+        total = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        body_size = os.stat(entry.path[:-5] + ".body").st_size
+                        stamp = entry.stat().st_mtime
+                    except OSError:
+                        body_size, stamp = 0, 0
+                    entries.append((stamp, entry.path, body_size))
+                    total += body_size
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        for _, meta_path, body_size in sorted(entries):
+            if total <= max_bytes * PRUNE_TO:
+                break
+            for path in (meta_path, meta_path[:-5] + ".body"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= body_size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+
+def _cache_directives(headers: Any) -> Dict[str, Optional[str]]:
+    """Cache-Control directives as a dict, lowercased names, values unquoted"""
+    directives = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers: Any, ttl: float) -> Optional[float]:
+    """
+    Seconds a response stays fresh: max-age, else Expires, else ``ttl``.
+    None means it must not be stored at all.
+    """
+    directives = _cache_directives(headers)
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]) - float(headers.get("Age", 0) or 0))
+        except (TypeError, ValueError):
+            return 0.0
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            date = headers.get("Date")
+            now = parsedate_to_datetime(date).timestamp() if date else time.time()
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            # An unparseable Expires (often "0" or "-1") means already expired
+            return 0.0
+    return float(ttl)
+
+
+class HttpClient:
+    """
+    Pooled session plus HTTP cache. ``get`` returns a regular
+    ``requests.Response`` whether it came from the network or the cache, with
+    ``response.from_cache`` set to "fresh", "revalidated", "stale" (served
+    because the network failed) or False.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, use_cache: Optional[bool] = None):
+        self.session = requests.Session()
+        retry = Retry(total=2, connect=2, read=1, backoff_factor=0.3,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET", "HEAD"]),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_CONNECTIONS_PER_HOST,
+                              max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if use_cache is None:
+            use_cache = os.getenv("SUBLIME_HTTP_CACHE", "on").lower() not in ("off", "false", "no", "0")
+        self.cache: Optional[HttpCache] = None
+        if use_cache:
+            try:
+                self.cache = HttpCache(cache_dir)
+            except OSError as e:
+                logger.warning(f"HTTP cache disabled, cannot create its directory: {e}")
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "fresh_hits": 0, "revalidated": 0, "stale_served": 0,
+                      "network": 0, "stored": 0}
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _cache_key(url: str, headers: Optional[Dict[str, str]]) -> str:
+        # Headers the caller sets (user agent, accept) can change the representation
+        varies = sorted((k.lower(), v) for k, v in (headers or {}).items())
+        return hashlib.sha256(json.dumps([url, varies]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _entity_headers(headers: Dict[str, str]) -> CaseInsensitiveDict:
+        """``headers`` without the ones that only describe the wire encoding of a body"""
+        headers = CaseInsensitiveDict(headers)
+        for name in BODY_FRAMING_HEADERS:
+            headers.pop(name, None)
+        return headers
+
+    @staticmethod
+    def _from_cache(meta: Dict[str, Any], body: bytes, how: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = meta["status"]
+        # Entries written before framing headers were dropped may still carry them
+        response.headers = HttpClient._entity_headers(meta["headers"])
+        response._content = body
+        response.encoding = meta.get("encoding")
+        response.url = meta["url"]
+        response.reason = "OK"
+        response.from_cache = how
+        return response
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+            timeout: Union[float, Tuple[float, float], None] = None, ttl: float = DEFAULT_TTL,
+            cache: bool = True) -> requests.Response:
+        """
+        GET through the pool and the cache. ``ttl`` is the freshness of
+        responses without Cache-Control/Expires; ``cache=False`` bypasses
+        the cache both ways.
+        """
+        self._bump("requests")
+        timeout = timeout or DEFAULT_TIMEOUT
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        if not cache or self.cache is None:
+            return self._network_get(url, headers, timeout)
+
+        key = self._cache_key(url, headers)
+        cached = self.cache.load(key)
+        if cached is not None:
+            meta, body = cached
+            if time.time() < meta["fresh_until"]:
+                self._bump("fresh_hits")
+                return self._from_cache(meta, body, "fresh")
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if meta.get("etag"):
+                request_headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = self._network_get(url, request_headers, timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            logger.info(f"Network error for {url}; serving the stale cached copy")
+            self._bump("stale_served")
+            return self._from_cache(meta, body, "stale")
+
+        if response.status_code == 304 and cached is not None:
+            # Not modified: refresh the entry's headers and freshness, keep its body
+            merged = self._entity_headers(meta["headers"])
+            merged.update(self._entity_headers(response.headers))
+            lifetime = freshness_lifetime(merged, ttl)
+            meta["headers"] = dict(merged)
+            meta["fresh_until"] = time.time() + (lifetime or 0.0)
+            self.cache.save(key, meta)
+            self._bump("revalidated")
+            return self._from_cache(meta, body, "revalidated")
+
+        self._store(key, response, ttl)
+        response.from_cache = False
+        return response
+
+    def _network_get(self, url: str, headers: Optional[Dict[str, str]],
+                     timeout: Union[float, Tuple[float, float]]) -> requests.Response:
+        self._bump("network")
+        return self.session.get(url, headers=headers, timeout=timeout)
+
+    def _store(self, key: str, response: requests.Response, ttl: float) -> None:
+        if response.status_code != 200 or len(response.content) > MAX_CACHED_BODY:
+            return
+        if response.headers.get("Vary", "").strip() == "*":
+            return
+        lifetime = freshness_lifetime(response.headers, ttl)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        # Nothing to gain from an entry that is already stale and cannot be revalidated
+        if lifetime is None or (lifetime <= 0 and not etag and not last_modified):
+            return
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            # response.content is decoded, so the wire's length and encoding no longer apply
+            "headers": dict(self._entity_headers(response.headers)),
+            "encoding": response.encoding,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh_until": time.time() + lifetime,
+            "size": len(response.content),
+        }
+        self.cache.save(key, meta, response.content)
+        self._bump("stored")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """The process-wide client shared by the web tools"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """``HttpClient.get`` on the shared client"""
+    return get_http_client().get(url, **kwargs)
+
+
+def close_http_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_http_client)
@@ -0,0 +1,264 @@
+"""
+SublimeChain Local Memory Backend
+
+Offline alternative to the Mem0 cloud client. Memories live in a SQLite
+database next to the user's other SublimeChain state and are recalled
+through a BM25 full-text index (SQLite FTS5), so recall is a local query
+instead of a network round trip and nothing needs an API key.
+
+Select it with ``SUBLIME_MEMORY_BACKEND=local`` (database path:
+``SUBLIME_MEMORY_PATH``, default ``~/.sublimechain/memory.db``).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), ".sublimechain", "memory.db")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class MemoryBackend(ABC):
+    """
+    The storage surface SublimeMemory talks to.
+
+    It is the subset of Mem0's ``MemoryClient`` API that SublimeMemory uses,
+    with the same argument names and response shapes, so the cloud client
+    fits it as-is and local implementations can stand in for it.
+    """
+
+    @abstractmethod
+    def add(self, messages: List[Dict], user_id: str, metadata: Optional[Dict] = None, **kwargs) -> Dict:
+        """Store a memory extracted from ``messages``; returns ``{"results": [...]}``"""
+
+    @abstractmethod
+    def search(self, query: str, filters: Optional[Dict] = None, limit: int = 10, **kwargs) -> Dict:
+        """Memories relevant to ``query``, best first, each with a 0-1 ``score``"""
+
+    @abstractmethod
+    def get_all(self, user_id: Optional[str] = None, filters: Optional[Dict] = None,
+                page: int = 1, page_size: int = 100, **kwargs) -> Dict:
+        """One page of memories, newest first; returns ``{"count": total, "results": [...]}``"""
+
+    @abstractmethod
+    def delete(self, memory_id: str) -> Dict:
+        """Delete one memory; raises if it does not exist"""
+
+    @abstractmethod
+    def batch_delete(self, memories: List[Dict]) -> Dict:
+        """Delete ``[{"memory_id": ...}, ...]`` in one call"""
+
+
+class LocalMemoryBackend(MemoryBackend):
+    """
+    SQLite memory store with a BM25 index.
+
+    Mem0 distills memories from messages with an LLM; locally the memory
+    text is the metadata ``content`` SublimeMemory already writes (the
+    conversation summary, the learning, the remembered fact) or, failing
+    that, a line built from the tool metadata or the messages themselves.
+    Timestamps are stored in UTC so range filters compare as strings.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("SUBLIME_MEMORY_PATH") or DEFAULT_DB_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # One connection shared by the recall, page and writer threads
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._fts = True
+        self._create_schema()
+        logger.info(f"Local memory store at {self.path} ({'FTS5 BM25' if self._fts else 'keyword'} index)")
+
+    def _create_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS memories (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    memory TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS memories_user_created ON memories (user_id, created_at)")
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5("
+                    "memory, id UNINDEXED, user_id UNINDEXED)")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"SQLite has no FTS5, falling back to keyword scoring: {e}")
+                self._fts = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ── Writes ──────────────────────────────────────────────────────────── #
+
+    @staticmethod
+    def _memory_text(messages: List[Dict], metadata: Dict) -> str:
+        """The text that gets indexed and returned as ``memory``"""
+        content = metadata.get("content")
+        if isinstance(content, str) and content.strip():
+            return content.strip()
+        if metadata.get("type") == "tool_success":
+            return (f"Used {metadata.get('tool', 'a tool')} for {metadata.get('task', '')}: "
+                    f"{metadata.get('result_summary', '')}").strip()
+        parts = [m.get("content") for m in messages if isinstance(m, dict) and isinstance(m.get("content"), str)]
+        return " | ".join(parts)
+
+    def add(self, messages: List[Dict], user_id: str, metadata: Optional[Dict] = None, **kwargs) -> Dict:
+        metadata = metadata or {}
+        memory_id = str(uuid.uuid4())
+        text = self._memory_text(messages, metadata)
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO memories (id, user_id, memory, metadata, messages, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (memory_id, user_id, text, json.dumps(metadata, default=str),
+                 json.dumps(messages, default=str), now, now))
+            if self._fts:
+                self._conn.execute("INSERT INTO memories_fts (memory, id, user_id) VALUES (?, ?, ?)",
+                                   (text, memory_id, user_id))
+        return {"results": [{"id": memory_id, "memory": text, "event": "ADD"}]}
+
+    def delete(self, memory_id: str) -> Dict:
+        if not self._delete_ids([memory_id]):
+            raise KeyError(f"Memory {memory_id} not found")
+        return {"message": "Memory deleted successfully!"}
+
+    def batch_delete(self, memories: List[Dict]) -> Dict:
+        deleted = self._delete_ids([m.get("memory_id") for m in memories if m.get("memory_id")])
+        return {"message": f"Successfully deleted {deleted} memories"}
+
+    def _delete_ids(self, memory_ids: List[str]) -> int:
+        deleted = 0
+        with self._lock, self._conn:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(memory_ids), 500):
+                chunk = memory_ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                deleted += self._conn.execute(f"DELETE FROM memories WHERE id IN ({marks})", chunk).rowcount
+                if self._fts:
+                    self._conn.execute(f"DELETE FROM memories_fts WHERE id IN ({marks})", chunk)
+        return deleted
+
+    # ── Reads ───────────────────────────────────────────────────────────── #
+
+    @staticmethod
+    def _row_to_memory(row: sqlite3.Row, score: Optional[float] = None) -> Dict:
+        memory = {
+            "id": row["id"],
+            "memory": row["memory"],
+            "user_id": row["user_id"],
+            "metadata": json.loads(row["metadata"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if score is not None:
+            memory["score"] = score
+        return memory
+
+    @staticmethod
+    def _utc(value: str) -> str:
+        """An ISO timestamp filter value, normalized to the stored UTC form"""
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+        return moment.astimezone(timezone.utc).isoformat()
+
+    def _where(self, user_id: Optional[str], filters: Optional[Dict]) -> Tuple[str, List[Any]]:
+        """SQL condition for a user id plus Mem0 v2 filters (flat dict or ``{"AND": [...]}``)"""
+        clauses: List[Dict] = []
+        if filters:
+            clauses = filters["AND"] if "AND" in filters else [{key: value} for key, value in filters.items()]
+        if user_id:
+            clauses = [{"user_id": user_id}] + clauses
+
+        sql: List[str] = []
+        params: List[Any] = []
+        for clause in clauses:
+            for key, value in clause.items():
+                if key == "user_id":
+                    sql.append("m.user_id = ?")
+                    params.append(value)
+                elif key == "metadata" and isinstance(value, dict):
+                    for field, expected in value.items():
+                        sql.append("json_extract(m.metadata, ?) = ?")
+                        params.extend([f"$.{field}", expected])
+                elif key in ("created_at", "updated_at") and isinstance(value, dict):
+                    for op, bound in value.items():
+                        symbol = {"gte": ">=", "lte": "<=", "gt": ">", "lt": "<"}.get(op)
+                        if symbol is None:
+                            raise ValueError(f"Unsupported {key} operator: {op}")
+                        sql.append(f"m.{key} {symbol} ?")
+                        params.append(self._utc(bound))
+                else:
+                    raise ValueError(f"Unsupported memory filter: {key}")
+        return (" AND ".join(sql) or "1"), params
+
+    def get_all(self, user_id: Optional[str] = None, filters: Optional[Dict] = None,
+                page: int = 1, page_size: int = 100, **kwargs) -> Dict:
+        where, params = self._where(user_id, filters)
+        offset = (max(1, page) - 1) * page_size
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM memories m WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM memories m WHERE {where} ORDER BY m.created_at DESC, m.rowid DESC "
+                f"LIMIT ? OFFSET ?", params + [page_size, offset]).fetchall()
+        return {"count": total, "results": [self._row_to_memory(row) for row in rows]}
+
+    def search(self, query: str, filters: Optional[Dict] = None, limit: int = 10, **kwargs) -> Dict:
+        terms = list(dict.fromkeys(token.lower() for token in _TOKEN_RE.findall(query or "")))
+        if not terms:
+            return {"results": []}
+        where, params = self._where(None, filters)
+        if self._fts:
+            return {"results": self._search_fts(terms, where, params, limit)}
+        return {"results": self._search_keywords(terms, where, params, limit)}
+
+    def _search_fts(self, terms: List[str], where: str, params: List[Any], limit: int) -> List[Dict]:
+        # Any term may match; BM25 ranks documents matching more (and rarer) terms first
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT m.*, bm25(memories_fts) AS rank FROM memories_fts "
+                f"JOIN memories m ON m.id = memories_fts.id "
+                f"WHERE memories_fts MATCH ? AND {where} ORDER BY rank LIMIT ?",
+                [match] + params + [limit]).fetchall()
+        # bm25() is negative, more negative = more relevant. Its scale depends on how common
+        # the terms are, so map it onto 0-1 (like Mem0's scores) relative to the best match
+        best = rows[0]["rank"] if rows else 0.0
+        if best >= 0:
+            # Terms in (nearly) every row carry no weight; every match is as good as the best
+            return [self._row_to_memory(row, score=1.0) for row in rows]
+        return [self._row_to_memory(row, score=row["rank"] / best) for row in rows]
+
+    def _search_keywords(self, terms: List[str], where: str, params: List[Any], limit: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM memories m WHERE {where}", params).fetchall()
+        scored = []
+        for row in rows:
+            words = set(token.lower() for token in _TOKEN_RE.findall(row["memory"]))
+            hits = sum(1 for term in terms if term in words)
+            if hits:
+                scored.append((hits / len(terms), row))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [self._row_to_memory(row, score=score) for score, row in scored[:limit]]
@@ -6,12 +6,17 @@ while preserving all existing functionality including streaming and thinking.
 """
 
 import asyncio
+import atexit
+import concurrent.futures
+import hashlib
 import json
 import logging
 import os
 import shutil
+import threading
+import time
 from contextlib import AsyncExitStack
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional
 from pathlib import Path
 
 try:
@@ -26,14 +31,112 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+class MCPRuntime:
+    """
+    Background thread that owns the one event loop used for all MCP work.
+    
+    MCP sessions and their stdio transports are bound to the loop they were
+    opened on, so every MCP coroutine (startup, tool calls, cleanup) must run
+    here. Sync callers submit coroutines and get ``concurrent.futures.Future``
+    objects back instead of spinning up a fresh loop per call.
+    """
+    
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The runtime event loop, starting the thread on first use"""
+        self.start()
+        return self._loop
+    
+    def is_running(self) -> bool:
+        """Check if the runtime thread is alive"""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        """Start the runtime thread if it isn't running yet"""
+        with self._lock:
+            if self.is_running():
+                return
+            
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+            
+            self._loop = loop
+            self._thread = threading.Thread(target=run_loop, name="mcp-runtime", daemon=True)
+            self._thread.start()
+            started.wait()
+            logger.debug("MCP runtime loop started")
+    
+    def in_runtime(self) -> bool:
+        """Check if the caller is already running on the runtime loop"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+    
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedule a coroutine on the runtime loop and return its future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the runtime loop and block until it finishes"""
+        if self.in_runtime():
+            coro.close()
+            raise RuntimeError("MCPRuntime.run() cannot block the runtime loop; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+    
+    async def run_async(self, coro: Awaitable[Any]) -> Any:
+        """Await a coroutine on the runtime loop from any event loop"""
+        if self.in_runtime():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the runtime loop and wait for the thread to exit"""
+        with self._lock:
+            if not self.is_running():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._loop.close()
+            self._thread = None
+            self._loop = None
+            logger.debug("MCP runtime loop stopped")
+
+
 class MCPTool:
     """Represents a tool from an MCP server, compatible with our tool registry"""
     
-    def __init__(self, name: str, description: str, input_schema: Dict[str, Any], server_name: str):
+    def __init__(self, name: str, description: str, input_schema: Dict[str, Any], server_name: str,
+                 original_name: Optional[str] = None):
         self.name = name
         self.description = description
         self.input_schema = input_schema
         self.server_name = server_name
+        # Name of the tool on the server itself (without the mcp_<server>_ prefix)
+        self.original_name = original_name or name.replace(f"mcp_{server_name}_", "", 1)
+    
+    @classmethod
+    def from_server_tool(cls, server_name: str, name: str, description: Optional[str],
+                         input_schema: Dict[str, Any]) -> "MCPTool":
+        """Build a registry tool from the name/description/schema a server advertises"""
+        return cls(
+            name=f"mcp_{server_name}_{name}",  # Prefix to avoid conflicts
+            description=f"[MCP:{server_name}] {description}",
+            input_schema=input_schema,
+            server_name=server_name,
+            original_name=name
+        )
     
     def to_claude_format(self) -> Dict[str, Any]:
         """Convert to Claude API tool format"""
@@ -42,18 +145,188 @@ class MCPTool:
             'description': self.description,
             'input_schema': self.input_schema
         }
+    
+    def to_cache_entry(self) -> Dict[str, Any]:
+        """Serialize the server-side definition for the schema cache"""
+        return {
+            'name': self.original_name,
+            'description': self.description.replace(f"[MCP:{self.server_name}] ", "", 1),
+            'input_schema': self.input_schema
+        }
+
+
+class MCPSchemaCache:
+    """
+    On-disk cache of the tool schemas each MCP server advertises.
+    
+    Entries are keyed by a hash of the server's config entry (command, args,
+    env var names) plus the server package version when it can be determined,
+    so editing a server's config or pinning a new version invalidates its
+    entry. The cache lets the tool registry be built before any server is
+    running; entries are revalidated whenever a server actually connects.
+    """
+    
+    def __init__(self, path: str = os.path.join(".cache", "mcp_tool_schemas.json")):
+        self.path = Path(path)
+        self._entries: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def package_version(config: Dict[str, Any]) -> Optional[str]:
+        """Best-effort version of the package a server config launches"""
+        command = os.path.basename(config.get('command') or "")
+        args = [str(arg) for arg in config.get('args', [])]
+        
+        if command in ('npx', 'uvx'):
+            positional = [arg for arg in args if not arg.startswith('-')]
+            if '--from' in args and args.index('--from') + 1 < len(args):
+                positional = [args[args.index('--from') + 1]]
+            if not positional:
+                return None
+            spec = positional[0]
+            
+            # Pinned specs: @scope/pkg@1.2.3, pkg@1.2.3, pkg==1.2.3
+            if '==' in spec:
+                return spec.split('==', 1)[1]
+            if '@' in spec[1:]:
+                return spec[1:].split('@', 1)[1]
+            
+            # Unpinned npm package installed in the project
+            if command == 'npx':
+                package_json = Path("node_modules") / spec / "package.json"
+                if package_json.exists():
+                    try:
+                        return json.loads(package_json.read_text()).get("version")
+                    except Exception:
+                        return None
+            return None
+        
+        # Script launched directly (node ./server/build/index.js): look for its package.json
+        for arg in args:
+            script = Path(arg)
+            if not script.suffix or not script.exists():
+                continue
+            for parent in script.resolve().parents:
+                package_json = parent / "package.json"
+                if package_json.exists():
+                    try:
+                        return json.loads(package_json.read_text()).get("version")
+                    except Exception:
+                        return None
+            return None
+        return None
+    
+    @classmethod
+    def cache_key(cls, server_name: str, config: Dict[str, Any]) -> str:
+        """Hash of everything that can change the tools a server advertises"""
+        fingerprint = {
+            "server": server_name,
+            "command": config.get('command'),
+            "args": config.get('args', []),
+            "env_keys": sorted(config.get('env', {}).keys()),
+            "version": cls.package_version(config)
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+    
+    def _load(self) -> Dict[str, Any]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f).get("entries", {})
+            except FileNotFoundError:
+                self._entries = {}
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable MCP schema cache {self.path}: {e}")
+                self._entries = {}
+        return self._entries
+    
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump({"entries": self._entries}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to write MCP schema cache {self.path}: {e}")
+    
+    def get(self, server_name: str, config: Dict[str, Any]) -> Optional[List[MCPTool]]:
+        """Return the cached tools for a server config, or None when nothing is cached"""
+        key = self.cache_key(server_name, config)
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry:
+            return None
+        return [
+            MCPTool.from_server_tool(server_name, tool['name'], tool.get('description'), tool['input_schema'])
+            for tool in entry.get("tools", [])
+        ]
+    
+    def put(self, server_name: str, config: Dict[str, Any], tools: List[MCPTool]) -> bool:
+        """
+        Store the tools a server advertised.
+        
+        Returns True if the entry changed (new, or schemas differ from the cache).
+        """
+        key = self.cache_key(server_name, config)
+        tool_entries = [tool.to_cache_entry() for tool in tools]
+        with self._lock:
+            entries = self._load()
+            previous = entries.get(key)
+            if previous and previous.get("tools") == tool_entries:
+                return False
+            
+            # Drop entries left behind by older configs of the same server
+            for stale_key in [k for k, v in entries.items() if v.get("server") == server_name]:
+                del entries[stale_key]
+            entries[key] = {
+                "server": server_name,
+                "version": self.package_version(config),
+                "updated_at": time.time(),
+                "tools": tool_entries
+            }
+            self._save()
+        return True
 
 
 class MCPServer:
     """Manages individual MCP server connections"""
     
-    def __init__(self, name: str, config: Dict[str, Any]):
+    def __init__(self, name: str, config: Dict[str, Any], on_tools_discovered=None):
         self.name = name
         self.config = config
+        # Called with the server after every successful list_tools()
+        self.on_tools_discovered = on_tools_discovered
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
         self.tools: List[MCPTool] = []
         self.is_initialized = False
+        self._session_task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self.last_used = time.monotonic()
+        self.active_calls = 0
+    
+    def load_cached_tools(self, tools: List[MCPTool]):
+        """Advertise cached tools without starting the server process"""
+        self.tools = list(tools)
+    
+    async def ensure_started(self) -> bool:
+        """Start the server on first use (lazy mode); no-op if already running"""
+        if self.is_initialized:
+            return True
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.is_initialized:
+                return True
+            logger.info(f"Starting MCP server {self.name} on demand")
+            return await self.initialize()
+    
+    def is_idle(self, ttl: float) -> bool:
+        """Check if the server is running but hasn't been used for ``ttl`` seconds"""
+        return (self.is_initialized and self.active_calls == 0 and
+                time.monotonic() - self.last_used > ttl)
     
     async def initialize(self) -> bool:
         """Initialize the MCP server connection"""
@@ -84,25 +357,17 @@ class MCPServer:
                 env={**os.environ, **self.config.get('env', {})}
             )
             
-            # Set up stdio transport
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            read, write = stdio_transport
+            # The session lives in its own task so the transport's cancel scopes
+            # are entered and exited by the same task, whoever triggers cleanup
+            self._ready = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._session_task = asyncio.create_task(self._run_session(server_params))
+            await self._ready.wait()
             
-            # Create session
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            )
-            
-            # Initialize session
-            await session.initialize()
-            self.session = session
-            
-            # Discover tools
-            await self._discover_tools()
+            if not self.is_initialized:
+                await self.cleanup()
+                return False
             
-            self.is_initialized = True
             logger.info(f"Initialized MCP server {self.name} with {len(self.tools)} tools")
             return True
             
@@ -111,6 +376,35 @@ class MCPServer:
             await self.cleanup()
             return False
     
+    async def _run_session(self, server_params: "StdioServerParameters"):
+        """Own the stdio transport and client session until cleanup is requested"""
+        try:
+            async with AsyncExitStack() as exit_stack:
+                # Set up stdio transport
+                read, write = await exit_stack.enter_async_context(
+                    stdio_client(server_params)
+                )
+                
+                # Create and initialize session
+                session = await exit_stack.enter_async_context(
+                    ClientSession(read, write)
+                )
+                await session.initialize()
+                self.session = session
+                
+                # Discover tools
+                await self._discover_tools()
+                
+                self.is_initialized = True
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            logger.error(f"MCP server {self.name} session ended with error: {e}")
+        finally:
+            self.session = None
+            self.is_initialized = False
+            self._ready.set()
+    
     async def _discover_tools(self):
         """Discover tools from the MCP server"""
         if not self.session:
@@ -123,24 +417,36 @@ class MCPServer:
             for item in tools_response:
                 if isinstance(item, tuple) and item[0] == "tools":
                     for tool in item[1]:
-                        mcp_tool = MCPTool(
-                            name=f"mcp_{self.name}_{tool.name}",  # Prefix to avoid conflicts
-                            description=f"[MCP:{self.name}] {tool.description}",
-                            input_schema=tool.inputSchema,
-                            server_name=self.name
+                        mcp_tool = MCPTool.from_server_tool(
+                            self.name, tool.name, tool.description, tool.inputSchema
                         )
                         self.tools.append(mcp_tool)
             
+            if self.on_tools_discovered:
+                self.on_tools_discovered(self)
+            
         except Exception as e:
             logger.error(f"Failed to discover tools for {self.name}: {e}")
     
     async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
-        """Execute a tool on this MCP server"""
-        if not self.session or not self.is_initialized:
+        """Execute a tool on this MCP server by its prefixed registry name"""
+        # Remove the mcp prefix to get the original tool name
+        return await self.call_tool(tool_name.replace(f"mcp_{self.name}_", "", 1), arguments)
+    
+    async def call_tool(self, original_tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Execute a tool on this MCP server by its own name, starting it first if needed"""
+        self.active_calls += 1
+        try:
+            return await self._call_tool(original_tool_name, arguments)
+        finally:
+            self.active_calls -= 1
+            self.last_used = time.monotonic()
+    
+    async def _call_tool(self, original_tool_name: str, arguments: Dict[str, Any]) -> str:
+        if not await self.ensure_started() or not self.session:
             raise RuntimeError(f"MCP server {self.name} not initialized")
         
-        # Remove the mcp prefix to get the original tool name
-        original_tool_name = tool_name.replace(f"mcp_{self.name}_", "")
+        tool_name = f"mcp_{self.name}_{original_tool_name}"
         
         try:
             result = await self.session.call_tool(original_tool_name, arguments)
@@ -183,28 +489,45 @@ class MCPServer:
     
     async def cleanup(self):
         """Gracefully shutdown MCP server connection"""
+        task = self._session_task
         try:
-            # Clean shutdown of exit stack (manages session + stdio)
-            if hasattr(self, 'exit_stack'):
-                await self.exit_stack.aclose()
+            if task is not None and not task.done():
+                self._stop.set()
+                await asyncio.wait_for(task, timeout=5.0)
         except Exception as e:
             # Log cleanup errors but don't fail - they're usually harmless during shutdown
-            pass
+            logger.debug(f"Cleanup of MCP server {self.name} raised: {e}")
         finally:
             self.session = None
             self.is_initialized = False
-            # Reset the exit stack for potential reinitilization
-            self.exit_stack = AsyncExitStack()
+            self._session_task = None
 
 
 class MCPManager:
     """Manages all MCP servers and integrates with our tool discovery system"""
     
-    def __init__(self, config_path: str = "mcp_config.json"):
+    def __init__(self, config_path: str = "mcp_config.json", lazy: Optional[bool] = None,
+                 idle_ttl: Optional[float] = None, schema_cache: Optional[MCPSchemaCache] = None):
         self.config_path = config_path
         self.servers: Dict[str, MCPServer] = {}
         self.mcp_tools: List[MCPTool] = []
+        # Registry name -> tool, rebuilt whenever the tool list changes
+        self.tool_index: Dict[str, MCPTool] = {}
         self.is_initialized = False
+        # None means "take the value from mcp_config.json" (lazyStart / idleTimeout)
+        self._lazy_setting = lazy
+        self._idle_ttl_setting = idle_ttl
+        self.lazy = bool(lazy)
+        self.idle_ttl = idle_ttl if idle_ttl is not None else 600.0
+        self.schema_cache = schema_cache or MCPSchemaCache()
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._background_tasks: set = set()
+        self._tools_changed_listeners: List[Any] = []
+    
+    def add_tools_changed_listener(self, callback):
+        """Register ``callback(server_name)`` to run when a server's advertised tools change"""
+        if callback not in self._tools_changed_listeners:
+            self._tools_changed_listeners.append(callback)
     
     def load_config(self) -> Dict[str, Any]:
         """Load MCP server configuration"""
@@ -221,7 +544,16 @@ class MCPManager:
             return {"mcpServers": {}}
     
     async def initialize(self) -> int:
-        """Initialize all MCP servers"""
+        """
+        Initialize all MCP servers.
+        
+        Servers with cached tool schemas never block startup: their tools are
+        advertised from the cache right away. In eager mode they connect in
+        the background and revalidate the cache once connected; in lazy mode
+        they start on the first call to one of their tools and are shut down
+        again once idle for longer than ``idle_ttl`` seconds. Only servers
+        with no cache entry are awaited here.
+        """
         if not MCP_AVAILABLE:
             logger.info("MCP not available, skipping MCP initialization")
             return 0
@@ -233,73 +565,151 @@ class MCPManager:
             logger.info("No MCP servers configured")
             return 0
         
+        self.lazy = bool(config.get("lazyStart", False)) if self._lazy_setting is None else self._lazy_setting
+        self.idle_ttl = float(config.get("idleTimeout", 600)) if self._idle_ttl_setting is None else self._idle_ttl_setting
+        
         # Create server instances
         self.servers = {
-            name: MCPServer(name, server_config)
+            name: MCPServer(name, server_config, on_tools_discovered=self._on_tools_discovered)
             for name, server_config in mcp_servers_config.items()
         }
         
-        # Initialize servers concurrently
+        servers_to_start = []
+        for server in self.servers.values():
+            if not server.config.get('enabled', False):
+                continue
+            cached_tools = self.schema_cache.get(server.name, server.config)
+            if cached_tools is None:
+                servers_to_start.append(server)
+                continue
+            
+            server.load_cached_tools(cached_tools)
+            logger.info(f"Loaded {len(cached_tools)} cached tools for MCP server {server.name}")
+            if not self.lazy:
+                self._start_in_background(server)
+        
+        # Servers without cached schemas have to be started before their tools are known
         initialization_tasks = [
-            server.initialize() for server in self.servers.values()
+            server.initialize() for server in servers_to_start
         ]
         
         results = await asyncio.gather(*initialization_tasks, return_exceptions=True)
         
-        # Collect tools from successfully initialized servers
-        self.mcp_tools.clear()
-        initialized_count = 0
-        
-        for server, result in zip(self.servers.values(), results):
-            if isinstance(result, bool) and result:
-                self.mcp_tools.extend(server.tools)
-                initialized_count += 1
-            elif isinstance(result, Exception):
+        for server, result in zip(servers_to_start, results):
+            if isinstance(result, Exception):
                 logger.error(f"Server {server.name} failed to initialize: {result}")
         
+        self._rebuild_tool_list()
+        
+        if self.lazy and self.idle_ttl > 0:
+            self._reaper_task = asyncio.create_task(self._reap_idle_servers())
+        
         self.is_initialized = True
-        logger.info(f"Initialized {initialized_count} MCP servers with {len(self.mcp_tools)} tools total")
+        running = sum(1 for server in self.servers.values() if server.is_initialized)
+        logger.info(f"Initialized MCP with {len(self.mcp_tools)} tools total "
+                    f"({running} servers running, lazy={self.lazy})")
         return len(self.mcp_tools)
     
+    def _start_in_background(self, server: MCPServer):
+        """Connect a server without blocking; its tools are revalidated once it's up"""
+        task = asyncio.create_task(server.ensure_started())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _on_tools_discovered(self, server: MCPServer):
+        """Revalidate the cache against what a connected server actually lists"""
+        if not self.schema_cache.put(server.name, server.config, server.tools):
+            return
+        
+        if self.is_initialized:
+            logger.info(f"MCP tool schemas for {server.name} changed; updating registry")
+            self._rebuild_tool_list()
+            for callback in self._tools_changed_listeners:
+                try:
+                    callback(server.name)
+                except Exception as e:
+                    logger.error(f"MCP tools-changed listener failed: {e}")
+    
+    def _rebuild_tool_list(self):
+        """Collect the advertised tools of every enabled server"""
+        mcp_tools = [
+            tool
+            for server in self.servers.values()
+            if server.config.get('enabled', False)
+            for tool in server.tools
+        ]
+        # Swap in new objects so readers on other threads never see a half-built index
+        self.tool_index = {tool.name: tool for tool in mcp_tools}
+        self.mcp_tools = mcp_tools
+    
+    async def _reap_idle_servers(self):
+        """Shut down lazily started servers that have been idle past the TTL"""
+        interval = max(1.0, min(self.idle_ttl / 4, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            for server in list(self.servers.values()):
+                if server.is_idle(self.idle_ttl):
+                    logger.info(f"Stopping idle MCP server {server.name}")
+                    await server.cleanup()
+    
     def get_claude_tools(self) -> List[Dict[str, Any]]:
         """Get MCP tools in Claude API format"""
         return [tool.to_claude_format() for tool in self.mcp_tools]
     
     async def execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
         """Execute an MCP tool"""
-        # Find which server this tool belongs to
-        for server in self.servers.values():
-            for tool in server.tools:
-                if tool.name == tool_name:
-                    return await server.execute_tool(tool_name, tool_input)
-        
-        raise ValueError(f"MCP tool {tool_name} not found")
+        tool = self.tool_index.get(tool_name)
+        if tool is None:
+            raise ValueError(f"MCP tool {tool_name} not found")
+        return await self.execute_server_tool(tool.server_name, tool.original_name, tool_input)
+    
+    async def execute_server_tool(self, server_name: str, original_name: str, tool_input: Dict[str, Any]) -> str:
+        """Execute a tool on a known server without looking the tool up"""
+        server = self.servers.get(server_name)
+        if server is None:
+            raise ValueError(f"MCP server {server_name} not found")
+        return await server.call_tool(original_name, tool_input)
+    
+    def get_server_tools(self, server_name: str) -> List[MCPTool]:
+        """Get the tools currently advertised by one server"""
+        server = self.servers.get(server_name)
+        if server is None or not server.config.get('enabled', False):
+            return []
+        return list(server.tools)
     
     def list_tools(self) -> List[str]:
         """List all MCP tool names"""
-        return [tool.name for tool in self.mcp_tools]
+        return list(self.tool_index)
     
     def get_tool_info(self, tool_name: str) -> Optional[Dict[str, Any]]:
         """Get information about a specific MCP tool"""
-        for tool in self.mcp_tools:
-            if tool.name == tool_name:
-                return {
-                    'name': tool.name,
-                    'description': tool.description,
-                    'input_schema': tool.input_schema,
-                    'server': tool.server_name,
-                    'type': 'mcp'
-                }
-        return None
+        tool = self.tool_index.get(tool_name)
+        if tool is None:
+            return None
+        return {
+            'name': tool.name,
+            'description': tool.description,
+            'input_schema': tool.input_schema,
+            'server': tool.server_name,
+            'type': 'mcp'
+        }
     
     async def cleanup(self):
         """Clean up all MCP servers"""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        for task in list(self._background_tasks):
+            task.cancel()
+        self._background_tasks.clear()
+        
         if self.servers:
             cleanup_tasks = [server.cleanup() for server in self.servers.values()]
             await asyncio.gather(*cleanup_tasks, return_exceptions=True)
         
         self.servers.clear()
-        self.mcp_tools.clear()
+        self.mcp_tools = []
+        self.tool_index = {}
         self.is_initialized = False
         logger.info("MCP manager cleanup completed")
     
@@ -309,8 +719,9 @@ class MCPManager:
         return await self.initialize()
 
 
-# Global MCP manager instance
+# Global MCP manager and runtime instances
 _mcp_manager: Optional[MCPManager] = None
+_mcp_runtime: Optional[MCPRuntime] = None
 
 def get_mcp_manager() -> MCPManager:
     """Get the global MCP manager instance"""
@@ -319,14 +730,43 @@ def get_mcp_manager() -> MCPManager:
         _mcp_manager = MCPManager()
     return _mcp_manager
 
+def get_mcp_runtime() -> MCPRuntime:
+    """Get the global MCP runtime (the thread owning all MCP sessions)"""
+    global _mcp_runtime
+    if _mcp_runtime is None:
+        _mcp_runtime = MCPRuntime()
+    return _mcp_runtime
+
+def run_mcp_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the MCP runtime loop from synchronous code"""
+    return get_mcp_runtime().run(coro, timeout)
+
+async def run_in_mcp_runtime(coro: Awaitable[Any]) -> Any:
+    """Await a coroutine on the MCP runtime loop from any event loop"""
+    return await get_mcp_runtime().run_async(coro)
+
 async def initialize_mcp() -> int:
     """Initialize MCP integration"""
-    return await get_mcp_manager().initialize()
+    return await run_in_mcp_runtime(get_mcp_manager().initialize())
 
 async def cleanup_mcp():
     """Clean up MCP integration"""
     if _mcp_manager:
-        await _mcp_manager.cleanup()
+        await run_in_mcp_runtime(_mcp_manager.cleanup())
+
+def shutdown_mcp(timeout: float = 10.0):
+    """Close every MCP session and stop the runtime thread"""
+    if _mcp_runtime is None or not _mcp_runtime.is_running():
+        return
+    try:
+        if _mcp_manager:
+            _mcp_runtime.run(_mcp_manager.cleanup(), timeout)
+    except Exception as e:
+        logger.debug(f"MCP shutdown cleanup failed: {e}")
+    finally:
+        _mcp_runtime.stop()
+
+atexit.register(shutdown_mcp)
 
 def get_mcp_tools() -> List[Dict[str, Any]]:
     """Get all MCP tools in Claude API format"""
@@ -334,7 +774,11 @@ def get_mcp_tools() -> List[Dict[str, Any]]:
 
 async def execute_mcp_tool(tool_name: str, tool_input: Dict[str, Any]) -> str:
     """Execute an MCP tool"""
-    return await get_mcp_manager().execute_tool(tool_name, tool_input)
+    return await run_in_mcp_runtime(get_mcp_manager().execute_tool(tool_name, tool_input))
+
+async def execute_mcp_server_tool(server_name: str, original_name: str, tool_input: Dict[str, Any]) -> str:
+    """Execute a tool on a specific MCP server by its server-side name"""
+    return await run_in_mcp_runtime(get_mcp_manager().execute_server_tool(server_name, original_name, tool_input))
 
 def list_mcp_tools() -> List[str]:
     """List all MCP tool names"""
@@ -342,4 +786,4 @@ def list_mcp_tools() -> List[str]:
 
 async def refresh_mcp() -> int:
     """Refresh MCP servers"""
-    return await get_mcp_manager().refresh()
\ No newline at end of file
+    return await run_in_mcp_runtime(get_mcp_manager().refresh())
\ No newline at end of file
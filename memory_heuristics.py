@@ -0,0 +1,263 @@
+"""
+Memory-Worthiness Heuristics for SublimeChain
+
+Decides which tool calls and conversations are worth storing, which user
+inputs warrant a memory lookup and what kind of recall a query needs. The
+keyword lists behind these decisions are KeywordClassifier categories,
+built once at import instead of on every call.
+"""
+
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+def _minimal_keywords(phrases: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Lowercase ``phrases`` in their given order, without duplicates or
+    phrases that contain another one (the shorter phrase matches wherever
+    the longer one does, so the longer one never decides a check).
+    """
+    unique = list(dict.fromkeys(phrase.lower() for phrase in phrases if phrase))
+    return tuple(phrase for phrase in unique
+                 if not any(other != phrase and other in phrase for other in unique))
+
+
+class KeywordClassifier:
+    """
+    Case-insensitive substring matcher over named keyword categories.
+
+    Each category keeps the smallest keyword tuple that gives the same
+    answers. Checks lowercase the text once and stop at the first keyword
+    found; callers that already hold lowercase text use ``matches_lowered``
+    so it is not lowercased again.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories: Dict[str, Tuple[str, ...]] = {
+            name: _minimal_keywords(phrases) for name, phrases in categories.items()
+        }
+        # Keywords per tuple of categories asked about; combinations are built on first use
+        self._keywords: Dict[Tuple[str, ...], Tuple[str, ...]] = {
+            (name,): keywords for name, keywords in self.categories.items()
+        }
+
+    def classify(self, text: str, wanted: Optional[Iterable[str]] = None) -> Set[str]:
+        """Categories with a keyword in ``text`` (only ``wanted`` ones, if given)"""
+        contains = text.lower().__contains__
+        names = self.categories if wanted is None else wanted
+        return {name for name in names if any(map(contains, self.categories[name]))}
+
+    def first(self, text: str, categories: Iterable[str]) -> Optional[str]:
+        """The first of ``categories`` with a keyword in ``text``, or None"""
+        contains = text.lower().__contains__
+        for name in categories:
+            if any(map(contains, self.categories[name])):
+                return name
+        return None
+
+    def matches(self, text: str, *categories: str) -> bool:
+        """True if ``text`` has a keyword of any of ``categories``"""
+        keywords = self._keywords.get(categories) or self._combine(categories)
+        # map() keeps the loop in C; any() stops at the first keyword found
+        return any(map(text.lower().__contains__, keywords))
+
+    def matches_lowered(self, lowered: str, *categories: str) -> bool:
+        """``matches`` for text that is already lowercase"""
+        keywords = self._keywords.get(categories) or self._combine(categories)
+        return any(map(lowered.__contains__, keywords))
+
+    def _combine(self, categories: Tuple[str, ...]) -> Tuple[str, ...]:
+        keywords = self._keywords[categories] = _minimal_keywords(
+            phrase for name in categories for phrase in self.categories[name])
+        return keywords
+
+
+# ─────────────────────────────── Tool usage ─────────────────────────────── #
+
+# Never remember simple/common tools that don't provide lasting value
+TRIVIAL_TOOLS = frozenset({
+    'duckduckgotool',  # Generic web searches
+    'webscrapertool',   # One-time content fetching
+    'mcp_fetch_fetch',  # One-time content fetching
+    'filecontentreadertool',  # One-time file reads
+    'weathertool'  # Temporal data
+})
+
+# Always remember configuration/setup tools
+VALUABLE_TOOLS = frozenset({
+    'claudecode',  # Coding patterns worth remembering
+    'createfolderstool',  # Project structure patterns
+    'diffeditortool',  # Code editing patterns
+    'uvpackagemanager',  # Package management patterns
+})
+
+# Matched against the tool name (a few fixed substrings, checked inline)
+PRODUCTIVITY_TOOL_KEYWORDS = ('notion', 'pushover')
+MUTATION_TOOL_KEYWORDS = ('create', 'update', 'delete', 'write', 'edit', 'add', 'remove')
+
+# Matched against the tool arguments (searches) and the conversation context
+TOOL_USAGE_KEYWORDS = KeywordClassifier({
+    # Searches that seem like preferences/research patterns
+    "research": ['prefer', 'favorite', 'best', 'recommend', 'how to', 'tutorial',
+                 'learn', 'guide', 'documentation', 'api', 'error', 'problem'],
+    # Also valuable for Brave searches
+    "comparison": ['comparison', 'versus', 'review', 'alternative'],
+    # Only valuable for Brave local searches
+    "nearby": ['near me', 'nearby', 'area'],
+    # Personal preferences or reusable patterns in the context
+    "reusable": ['prefer', 'like', 'favorite', 'always', 'usually', 'workflow',
+                 'setup', 'configure', 'pattern', 'template', 'standard'],
+})
+
+
+def should_remember_tool_usage(name: str, args: dict, result: str, context: str) -> bool:
+    """Determine if a tool usage is worth remembering based on value and reusability"""
+    if name in TRIVIAL_TOOLS:
+        return False
+    name_lower = name.lower()
+
+    # Handle Brave search tools specifically
+    if name.startswith('mcp_brave-search_'):
+        # local_search often fails due to API limits - don't remember failed attempts
+        if 'local_search' in name and ('error' in result.lower() or len(result) < 50):
+            return False
+
+        # Only remember searches that seem like preferences/research patterns
+        search_terms = str(args).lower()
+
+        # For web_search, be more selective since it's reliable
+        if 'web_search' in name:
+            if not TOOL_USAGE_KEYWORDS.matches_lowered(search_terms, "research", "comparison"):
+                return False
+
+        # For local_search, only remember if it actually succeeded AND is reusable
+        if 'local_search' in name:
+            if not TOOL_USAGE_KEYWORDS.matches_lowered(search_terms, "research", "comparison", "nearby"):
+                return False
+
+    # Handle other search tools
+    elif 'search' in name_lower:
+        if not TOOL_USAGE_KEYWORDS.matches(str(args), "research"):
+            return False
+
+    if name in VALUABLE_TOOLS:
+        return True
+
+    # Remember Notion/productivity tools (project/workflow patterns)
+    if any(map(name_lower.__contains__, PRODUCTIVITY_TOOL_KEYWORDS)):
+        return True
+
+    # Remember MCP tools that modify state or create content
+    if name.startswith('mcp_') and any(map(name_lower.__contains__, MUTATION_TOOL_KEYWORDS)):
+        return True
+
+    # Check result quality - only remember if substantial and useful
+    if len(result) < 100:  # Too short to be valuable
+        return False
+
+    # Skip error results
+    if result.startswith('<error>') or 'error' in result[:50].lower():
+        return False
+
+    # Skip very long results (probably one-time data dumps)
+    if len(result) > 2000:
+        return False
+
+    # Check context for personal preferences or reusable patterns
+    if context and TOOL_USAGE_KEYWORDS.matches(context, "reusable"):
+        return True
+
+    # Default: don't remember (be conservative)
+    return False
+
+
+# ────────────────────────────── Conversations ───────────────────────────── #
+
+CONVERSATION_KEYWORDS = KeywordClassifier({
+    # Generic responses (checked against the start of the reply)
+    "generic": [
+        "i don't have", "i don't know", "based on the information",
+        "according to what", "hello", "hi there", "how can i help",
+        "sure, i can help", "let me help", "i'll help you"
+    ],
+    # Preferences, learning and personal info (checked against the whole exchange)
+    "valuable": [
+        # Personal information
+        'my name is', 'i am', 'i work', 'i live', 'i prefer', 'i like',
+        'i usually', 'my favorite', 'my background', 'about me',
+
+        # Preferences and workflows
+        'prefer', 'workflow', 'process', 'standard', 'template',
+        'always do', 'usually do', 'best practice', 'convention',
+
+        # Learning and insights
+        'learned', 'discovered', 'figured out', 'solution', 'pattern',
+        'mistake', 'lesson', 'insight', 'remember that', 'note that',
+
+        # Technical setup/configuration
+        'configuration', 'setup', 'environment', 'api key', 'token',
+        'credential', 'setting', 'config', 'install', 'deploy'
+    ],
+    # Explicit learning/memory requests (checked against the user input)
+    "memory_request": [
+        'remember', 'note', 'save', 'store', 'keep in mind',
+        'for future', 'next time', 'going forward'
+    ],
+})
+
+
+def should_remember_conversation(user_input: str, assistant_response: str) -> bool:
+    """Determine if a conversation is worth remembering for future context"""
+    # Skip short conversations
+    if len(user_input) < 30 or len(assistant_response) < 100:
+        return False
+
+    # Each text is lowercased once; the checks below look at parts of it
+    user_lower = user_input.lower()
+    response_lower = assistant_response.lower()
+
+    # Skip generic responses
+    if CONVERSATION_KEYWORDS.matches_lowered(response_lower[:200], "generic"):
+        return False
+
+    # Remember conversations about preferences, learning, and personal info
+    if CONVERSATION_KEYWORDS.matches_lowered(f"{user_lower} {response_lower}", "valuable"):
+        return True
+
+    # Remember conversations with explicit learning/memory requests
+    return CONVERSATION_KEYWORDS.matches_lowered(user_lower, "memory_request")
+
+
+# ─────────────────────────────── Recall ─────────────────────────────────── #
+
+# User input that refers to something the assistant may remember
+MEMORY_QUERY_KEYWORDS = KeywordClassifier({
+    "memory": ["remember", "recall", "told you", "discussed", "my", "me", "i am", "name", "preferences"],
+})
+
+
+def wants_memory_search(user_input: str) -> bool:
+    """True if the input looks like it needs memory context"""
+    return MEMORY_QUERY_KEYWORDS.matches(user_input, "memory")
+
+
+# smart_recall strategies, in priority order
+RECALL_QUERY_KEYWORDS = KeywordClassifier({
+    # Temporal queries (yesterday, last week, etc.)
+    "temporal": ["yesterday", "today", "last week", "last month", "this week"],
+    # Personal info queries
+    "personal": ["about me", "know about me", "who am i", "my info", "my details"],
+    # Activity queries (what did I do, where did I go)
+    "activity": ["what did i", "where did i", "what have i", "activities", "events"],
+    # Tool/work queries
+    "work": ["tools", "work", "projects", "code", "development"],
+})
+RECALL_STRATEGIES = ("temporal", "personal", "activity", "work")
+
+# Programming topics searched by work queries; each term is its own category
+PROGRAMMING_TERMS = ("code", "programming", "development", "python", "typescript", "react", "bun")
+PROGRAMMING_KEYWORDS = KeywordClassifier({term: [term] for term in PROGRAMMING_TERMS})
+
+
+def recall_strategy(query: str) -> Optional[str]:
+    """The smart_recall strategy for ``query``, or None for a plain context search"""
+    return RECALL_QUERY_KEYWORDS.first(query, RECALL_STRATEGIES)
@@ -5,14 +5,23 @@ Provides persistent AI memory using Mem0 for enhanced context awareness,
 learning from past interactions, and intelligent pattern recognition.
 """
 
+import atexit
 import os
 import json
+import queue
 import asyncio
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from typing import Dict, List, Any, Optional, Callable, Iterable, Iterator, Tuple
 from datetime import datetime, timedelta
 import logging
 import re
 
+from local_memory import LocalMemoryBackend
+from memory_heuristics import PROGRAMMING_KEYWORDS, PROGRAMMING_TERMS, recall_strategy
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,17 +34,136 @@ except ImportError:
     logger.warning("Mem0 not available. Install with: pip install mem0ai")
 
 
+class MemoryCache:
+    """
+    In-process read-through cache for Mem0 reads, with TTL and LRU eviction.
+    
+    Keys are ``(user_id, kind, query, filters, limit)`` tuples. ``kind`` is
+    "search" for ``recall_context`` results and "get_all" for complete
+    (all pages) listings, one per server-side filter. Deletes patch cached
+    lists by memory id; adds invalidate the user's entries, since a new
+    memory can match any query.
+    """
+    
+    _MISSING = object()
+    
+    def __init__(self, ttl: float = 60.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def make_key(user_id: str, kind: str, query: Optional[str] = None,
+                 filters: Optional[Dict] = None, limit: Any = None) -> tuple:
+        frozen_filters = tuple(sorted((k, json.dumps(v, sort_keys=True, default=str))
+                                      for k, v in (filters or {}).items()))
+        return (user_id, kind, query, frozen_filters, limit)
+    
+    def get(self, key: tuple) -> Any:
+        """Cached value for ``key`` or ``MemoryCache._MISSING``"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return self._MISSING
+    
+    def put(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, user_id: str, kinds: Optional[List[str]] = None) -> int:
+        """Drop the user's entries (optionally only some kinds); returns how many"""
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[0] == user_id and (kinds is None or key[1] in kinds)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+    
+    def remove_ids(self, user_id: str, memory_ids: set) -> None:
+        """Remove deleted memories from every cached list of the user"""
+        if not memory_ids:
+            return
+        with self._lock:
+            for key, (expires_at, value) in list(self._entries.items()):
+                if key[0] == user_id and isinstance(value, list):
+                    kept = [m for m in value if not (isinstance(m, dict) and m.get("id") in memory_ids)]
+                    if len(kept) != len(value):
+                        self._entries[key] = (expires_at, kept)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+            }
+
+
 class SublimeMemory:
     """Enhanced memory management for SublimeChain with context-aware storage and retrieval"""
     
-    def __init__(self, user_id: str = "default_user"):
+    def __init__(self, user_id: str = "default_user", backend: Optional[str] = None, cache_ttl: float = 60.0, cache_size: int = 256,
+                 recall_workers: int = 10, recall_timeout: float = 5.0,
+                 page_size: int = 100, page_workers: int = 4,
+                 write_queue_size: int = 256, write_batch_size: int = 20, write_retries: int = 3):
         self.user_id = user_id
+        # "mem0" (cloud) or "local" (SQLite + BM25, see local_memory.py)
+        self.backend = (backend or os.getenv("SUBLIME_MEMORY_BACKEND") or "mem0").lower()
         self.memory = None
+        self.cache = MemoryCache(ttl=cache_ttl, max_entries=cache_size)
+        # Bounded pool for smart_recall fan-outs; created on first use
+        self.recall_workers = recall_workers
+        self.recall_timeout = recall_timeout
+        self._recall_pool: Optional[ThreadPoolExecutor] = None
+        # Separate pool for get_all page fetches: listings may run inside a recall task
+        self.page_size = page_size
+        self.page_workers = page_workers
+        self._page_pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Background writer for learned memories; started on the first queued write
+        self._writer_options = {"max_queue": write_queue_size, "batch_size": write_batch_size,
+                                "max_retries": write_retries}
+        self._writer: Optional[MemoryWriter] = None
+        # Cleared if Mem0 rejects get_all filters; filtering then happens client-side only
+        self._server_filters = True
         self.conversation_context = []
         self.tool_patterns = {}
         self.session_start = datetime.now()
         
-        if MEMORY_AVAILABLE:
+        if self.backend == "local":
+            try:
+                self.memory = LocalMemoryBackend()
+                logger.info(f"SublimeMemory initialized with local store for user: {user_id}")
+            except Exception as e:
+                logger.error(f"Failed to open local memory store: {e}")
+                self.memory = None
+        elif MEMORY_AVAILABLE:
             try:
                 # Initialize Mem0 Cloud Client (not open-source)
                 self.memory = MemoryClient()
@@ -51,33 +179,277 @@ class SublimeMemory:
         """Check if memory functionality is available"""
         return self.memory is not None
     
+    @staticmethod
+    def _extract_memories(all_memories_response: Any) -> List[Dict]:
+        """Pull the memory list out of a get_all response (handles the double-nested v1.1 format)"""
+        if isinstance(all_memories_response, dict) and "results" in all_memories_response:
+            results = all_memories_response["results"]
+            if isinstance(results, dict) and "results" in results:
+                all_memories = results["results"]
+            else:
+                all_memories = results if isinstance(results, list) else []
+        else:
+            all_memories = all_memories_response if isinstance(all_memories_response, list) else []
+        
+        # Handle case where get_all returns a string or unexpected format
+        return all_memories if isinstance(all_memories, list) else []
+    
+    def _get_pool(self, name: str) -> ThreadPoolExecutor:
+        """The lazily created "recall" or "page" executor"""
+        attr = f"_{name}_pool"
+        with self._pool_lock:
+            pool = getattr(self, attr)
+            if pool is None:
+                workers = self.recall_workers if name == "recall" else self.page_workers
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"memory-{name}")
+                setattr(self, attr, pool)
+            return pool
+    
+    def _fetch_page(self, page: int, page_size: int, filters: Optional[List[Dict]]) -> Tuple[List[Dict], Optional[int]]:
+        """
+        One get_all page and the total count the server reports (None if it
+        doesn't). ``filters`` go to the server as given; pass None for an
+        unfiltered page. Errors propagate.
+        """
+        kwargs = {"version": "v2", "output_format": "v1.1", "page": page, "page_size": page_size}
+        if filters:
+            response = self.memory.get_all(filters={"AND": [{"user_id": self.user_id}] + filters}, **kwargs)
+        else:
+            response = self.memory.get_all(user_id=self.user_id, **kwargs)
+        return self._extract_memories(response), self._extract_count(response)
+    
+    @staticmethod
+    def _is_filter_rejection(error: Exception) -> bool:
+        """Whether a get_all error says the filters are invalid, as opposed to a transient failure"""
+        if isinstance(error, (ValueError, TypeError)):
+            # The local backend raises ValueError for filters it does not support
+            return True
+        if "validation" in type(error).__name__.lower():
+            return True
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        return status in (400, 422)
+    
+    def _fetch_first_page(self, page_size: int, filters: Optional[List[Dict]]) -> Tuple[List[Dict], Optional[int], Optional[List[Dict]]]:
+        """
+        Page 1, settling whether ``filters`` can go to the server before the
+        page count is fixed. Returns (memories, total, filters to use for the
+        remaining pages). Only an explicit filter rejection switches to local
+        filtering for the session; other errors propagate.
+        """
+        if filters and self._server_filters:
+            try:
+                memories, total = self._fetch_page(1, page_size, filters)
+                return memories, total, filters
+            except Exception as e:
+                if not self._is_filter_rejection(e):
+                    raise
+                logger.warning(f"Mem0 rejected get_all filters, filtering locally instead: {e}")
+                self._server_filters = False
+        memories, total = self._fetch_page(1, page_size, None)
+        return memories, total, None
+    
+    @staticmethod
+    def _extract_count(all_memories_response: Any) -> Optional[int]:
+        count = all_memories_response.get("count") if isinstance(all_memories_response, dict) else None
+        return count if isinstance(count, int) else None
+    
+    def iter_memories(self, filters: Optional[List[Dict]] = None, page_size: Optional[int] = None,
+                      reverse: bool = False) -> Iterator[Dict]:
+        """
+        Stream every memory of the user, page by page.
+        
+        ``filters`` are Mem0 v2 filter clauses (e.g. ``{"metadata": {"type": "learning"}}``)
+        ANDed with the user filter and applied on the server; callers must still
+        check them locally in case the server ignores or rejects them. Once page 1
+        reports the total count, the remaining pages are fetched concurrently on
+        the page pool. ``reverse`` yields the last page first, so deleting yielded
+        memories never shifts a page that is still to be read; without a count
+        the last page is unknown, so every page is read before anything is
+        yielded.
+        """
+        page_size = page_size or self.page_size
+        # Every page uses the mode page 1 settled on, so the page range matches the count
+        memories, total, filters = self._fetch_first_page(page_size, filters)
+        
+        if total is None:
+            # No count: walk forward until a short page
+            pages = [memories]
+            page = 1
+            if not reverse:
+                yield from memories
+            while len(memories) == page_size:
+                page += 1
+                memories, _ = self._fetch_page(page, page_size, filters)
+                if reverse:
+                    pages.append(memories)
+                else:
+                    yield from memories
+            if reverse:
+                # Collected before yielding: deletes by the caller would shift unread pages
+                for memories in reversed(pages):
+                    yield from memories
+            return
+        
+        pages = max(1, -(-total // page_size))
+        remaining = list(range(pages, 1, -1)) if reverse else list(range(2, pages + 1))
+        if not reverse:
+            yield from memories
+        
+        pool = self._get_pool("page")
+        window = max(1, self.page_workers)
+        in_flight = [pool.submit(self._fetch_page, page, page_size, filters) for page in remaining[:window]]
+        next_page = len(in_flight)
+        try:
+            while in_flight:
+                page_memories, _ = in_flight.pop(0).result()
+                if next_page < len(remaining):
+                    in_flight.append(pool.submit(self._fetch_page, remaining[next_page], page_size, filters))
+                    next_page += 1
+                yield from page_memories
+        finally:
+            for future in in_flight:
+                future.cancel()
+        
+        if reverse:
+            yield from memories
+    
+    def _list_memories(self, filters: Optional[List[Dict]] = None,
+                       predicate: Optional[Callable[[Dict], bool]] = None,
+                       use_cache: bool = True) -> List[Dict]:
+        """
+        Every memory matching ``filters`` (server-side) and ``predicate`` (local).
+        
+        Complete listings are cached per filter; a cached unfiltered listing
+        also answers filtered requests. ``use_cache=False`` always asks Mem0
+        and refreshes the cached listing.
+        """
+        filter_key = {"AND": filters} if filters else None
+        key = self.cache.make_key(self.user_id, "get_all", filters=filter_key)
+        
+        memories = MemoryCache._MISSING
+        if use_cache:
+            memories = self.cache.get(key)
+            if memories is MemoryCache._MISSING and filters:
+                memories = self.cache.get(self.cache.make_key(self.user_id, "get_all"))
+        if memories is MemoryCache._MISSING:
+            memories = [memory for memory in self.iter_memories(filters) if isinstance(memory, dict)]
+            self.cache.put(key, memories)
+        
+        if predicate is None:
+            return list(memories)
+        return [memory for memory in memories if predicate(memory)]
+    
+    def _delete_stream(self, memory_ids: Iterable[str], batch_size: int = 1000) -> Tuple[int, int]:
+        """
+        Batch-delete ids as they arrive from an iterator; returns (deleted, seen).
+        
+        The cache is patched per successful batch and dropped for the user if
+        any batch fails.
+        """
+        deleted = 0
+        seen = 0
+        failed = False
+        batch: List[str] = []
+        
+        def flush():
+            nonlocal deleted, failed
+            try:
+                result = self.memory.batch_delete([{"memory_id": mid} for mid in batch])
+            except Exception as e:
+                logger.error(f"Error deleting batch: {e}")
+                result = None
+            if result:
+                deleted += len(batch)
+                self._after_delete(batch)
+                logger.info(f"Deleted batch of {len(batch)} memories")
+            else:
+                failed = True
+                logger.error(f"Failed to delete batch of {len(batch)} memories")
+            batch.clear()
+        
+        for memory_id in memory_ids:
+            if not memory_id:
+                continue
+            seen += 1
+            batch.append(memory_id)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        
+        if failed:
+            self._after_delete([], complete=False)
+        return deleted, seen
+    
+    def _after_write(self) -> None:
+        """A memory was added: cached searches and snapshots may be missing it"""
+        self.cache.invalidate(self.user_id)
+    
+    def _after_delete(self, memory_ids: Iterable[str], complete: bool = True) -> None:
+        """Memories were deleted: patch them out of the cache, or drop it if unsure what went"""
+        if complete:
+            self.cache.remove_ids(self.user_id, set(memory_ids))
+        else:
+            self.cache.invalidate(self.user_id)
+    
+    def _add(self, messages: List[Dict], metadata: Dict) -> Any:
+        """One Mem0 add call; callers invalidate the cache"""
+        return self.memory.add(
+            messages=messages,
+            user_id=self.user_id,
+            metadata=metadata,
+            output_format="v1.1"  # Explicitly set output format to avoid deprecation
+        )
+    
+    def _conversation_write(self, messages: List[Dict], context: str = None) -> Tuple[List[Dict], Dict]:
+        """Messages and metadata of a conversation memory"""
+        memory_content = {
+            "type": "conversation",
+            "content": self._summarize_conversation(messages),
+            "context": context or "general_chat",
+            "timestamp": datetime.now().isoformat(),
+            "message_count": len(messages)
+        }
+        # Pass the actual conversation messages; the summary goes into the metadata
+        return messages, memory_content
+    
+    def _tool_success_write(self, tool_name: str, task: str, result: str, context: Dict = None) -> Tuple[List[Dict], Dict]:
+        """Messages and metadata of a tool success memory"""
+        memory_content = {
+            "type": "tool_success",
+            "tool": tool_name,
+            "task": task,
+            "result_summary": result[:500],  # Truncate long results
+            "context": context or {},
+            "timestamp": datetime.now().isoformat()
+        }
+        # Store tool success as a proper conversation
+        tool_messages = [
+            {"role": "user", "content": f"I used the {tool_name} tool for: {task}"},
+            {"role": "assistant", "content": f"Successfully executed {tool_name}. {result[:200]}..."}
+        ]
+        return tool_messages, memory_content
+    
+    def _track_tool_pattern(self, tool_name: str, task: str) -> None:
+        """Track tool patterns locally too"""
+        self.tool_patterns.setdefault(tool_name, []).append({
+            "task": task,
+            "timestamp": datetime.now().isoformat(),
+            "success": True
+        })
+    
     def store_conversation(self, messages: List[Dict], context: str = None):
         """Store conversation context for future reference"""
         if not self.is_available():
             return
             
         try:
-            # Create a meaningful memory entry
-            conversation_summary = self._summarize_conversation(messages)
-            
-            memory_content = {
-                "type": "conversation",
-                "content": conversation_summary,
-                "context": context or "general_chat",
-                "timestamp": datetime.now().isoformat(),
-                "message_count": len(messages)
-            }
-            
-            # Store in Mem0 using cloud client API - pass actual conversation messages
-            result = self.memory.add(
-                messages=messages,  # Use the actual conversation messages
-                user_id=self.user_id,
-                metadata=memory_content,  # Store metadata separately
-                output_format="v1.1"  # Explicitly set output format to avoid deprecation
-            )
+            result = self._add(*self._conversation_write(messages, context))
             
             # Memory stored silently for clean UI experience
             # Verbose feedback disabled for better UX
+            self._after_write()
             logger.debug(f"Stored conversation memory: {result}")
             
         except Exception as e:
@@ -89,36 +461,9 @@ class SublimeMemory:
             return
             
         try:
-            memory_content = {
-                "type": "tool_success",
-                "tool": tool_name,
-                "task": task,
-                "result_summary": result[:500],  # Truncate long results
-                "context": context or {},
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            # Store tool success as a proper conversation
-            tool_messages = [
-                {"role": "user", "content": f"I used the {tool_name} tool for: {task}"},
-                {"role": "assistant", "content": f"Successfully executed {tool_name}. {result[:200]}..."}
-            ]
-            
-            result = self.memory.add(
-                messages=tool_messages,
-                user_id=self.user_id,
-                metadata=memory_content,
-                output_format="v1.1"
-            )
-            
-            # Track tool patterns locally too
-            if tool_name not in self.tool_patterns:
-                self.tool_patterns[tool_name] = []
-            self.tool_patterns[tool_name].append({
-                "task": task,
-                "timestamp": datetime.now().isoformat(),
-                "success": True
-            })
+            self._add(*self._tool_success_write(tool_name, task, result, context))
+            self._after_write()
+            self._track_tool_pattern(tool_name, task)
             
             # Tool pattern learned silently for clean UI experience
             # Verbose feedback disabled for better UX
@@ -127,6 +472,41 @@ class SublimeMemory:
         except Exception as e:
             logger.error(f"Failed to store tool success: {e}")
     
+    def _get_writer(self) -> "MemoryWriter":
+        with self._pool_lock:
+            if self._writer is None:
+                self._writer = MemoryWriter(self, **self._writer_options)
+            return self._writer
+    
+    def queue_conversation(self, messages: List[Dict], context: str = None) -> bool:
+        """``store_conversation`` on the background writer; False if the write was dropped"""
+        if not self.is_available():
+            return False
+        return self._get_writer().submit(self._conversation_write(messages, context), "conversation")
+    
+    def queue_tool_success(self, tool_name: str, task: str, result: str, context: Dict = None) -> bool:
+        """``store_tool_success`` on the background writer; False if the write was dropped"""
+        if not self.is_available():
+            return False
+        return self._get_writer().submit(self._tool_success_write(tool_name, task, result, context),
+                                         f"tool_success:{tool_name}",
+                                         on_success=lambda: self._track_tool_pattern(tool_name, task))
+    
+    def pending_writes(self) -> int:
+        """Queued or in-flight background writes"""
+        return self._writer.pending if self._writer is not None else 0
+    
+    def flush_writes(self, timeout: float = 10.0) -> bool:
+        """Wait until queued writes are stored; True if the queue drained in time"""
+        return self._writer.flush(timeout) if self._writer is not None else True
+    
+    def close(self, timeout: float = 10.0) -> bool:
+        """Flush queued writes, stop the writer thread and release a local store"""
+        drained = self._writer.close(timeout) if self._writer is not None else True
+        if drained and isinstance(self.memory, LocalMemoryBackend):
+            self.memory.close()
+        return drained
+    
     def store_learning(self, learning: str, category: str = "general", importance: str = "medium"):
         """Store important learnings and insights"""
         if not self.is_available():
@@ -156,6 +536,7 @@ class SublimeMemory:
             
             # Learning stored silently for clean UI experience
             # Verbose feedback disabled for better UX
+            self._after_write()
             logger.debug(f"Stored learning: {category}")
             
         except Exception as e:
@@ -172,6 +553,11 @@ class SublimeMemory:
                 "user_id": self.user_id  # Simple direct filter for v2 API
             }
             
+            cache_key = self.cache.make_key(self.user_id, "search", query, filters, max_results)
+            cached = self.cache.get(cache_key)
+            if cached is not MemoryCache._MISSING:
+                return list(cached)
+            
             search_results = self.memory.search(
                 query=query,
                 version="v2", 
@@ -212,100 +598,81 @@ class SublimeMemory:
                         "id": result.get("id", "")
                     })
             
+            self.cache.put(cache_key, relevant_memories)
             logger.debug(f"Found {len(relevant_memories)} relevant memories for: {query}")
-            return relevant_memories
+            return list(relevant_memories)
             
         except Exception as e:
             logger.error(f"Failed to recall context: {e}")
             return []
     
-    def search_memories_by_type(self, memory_type: str, max_results: int = 10) -> List[Dict]:
+    def search_memories_by_type(self, memory_type: str, max_results: int = 10, use_cache: bool = True) -> List[Dict]:
         """Search for memories by specific type (conversation, tool_success, learning, etc)"""
         if not self.is_available():
             return []
             
         try:
             # Get all memories and filter by type
-            all_memories_response = self.memory.get_all(
-                user_id=self.user_id,
-                version="v2",
-                output_format="v1.1",
-                page=1, 
-                page_size=50
-            )
-            
-            # Extract memories from paginated response
-            if isinstance(all_memories_response, dict) and "results" in all_memories_response:
-                results = all_memories_response["results"]
-                if isinstance(results, dict) and "results" in results:
-                    all_memories = results["results"]
-                else:
-                    all_memories = results if isinstance(results, list) else []
-            else:
-                all_memories = all_memories_response if isinstance(all_memories_response, list) else []
-            
-            # Filter by type
-            filtered_memories = []
-            for memory in all_memories:
-                if isinstance(memory, dict):
-                    metadata = memory.get("metadata", {})
-                    if metadata.get("type") == memory_type:
-                        filtered_memories.append({
-                            "content": memory.get("memory", ""),
-                            "metadata": metadata,
-                            "created_at": memory.get("created_at", ""),
-                            "id": memory.get("id", "")
-                        })
-            
-            return filtered_memories[:max_results]
+            all_memories = self._list_memories([{"metadata": {"type": memory_type}}], use_cache=use_cache)
+            return self._filter_by_type(all_memories, memory_type)[:max_results]
             
         except Exception as e:
             logger.error(f"Failed to search memories by type: {e}")
             return []
     
+    @staticmethod
+    def _filter_by_type(all_memories: List[Dict], memory_type: str) -> List[Dict]:
+        """Memories of one type from a get_all listing, in recall format"""
+        filtered_memories = []
+        for memory in all_memories:
+            if isinstance(memory, dict):
+                metadata = memory.get("metadata", {})
+                if metadata.get("type") == memory_type:
+                    filtered_memories.append({
+                        "content": memory.get("memory", ""),
+                        "metadata": metadata,
+                        "created_at": memory.get("created_at", ""),
+                        "id": memory.get("id", "")
+                    })
+        return filtered_memories
+    
+    @staticmethod
+    def _as_aware(moment: datetime) -> datetime:
+        """Naive datetimes are local time; make them comparable with Mem0's offset timestamps"""
+        return moment if moment.tzinfo is not None else moment.astimezone()
+    
+    @classmethod
+    def _created_at(cls, memory: Dict) -> Optional[datetime]:
+        """Parsed created_at of a memory (format: 2025-06-17T03:14:02.321149-07:00), or None"""
+        created_at_str = memory.get("created_at", "")
+        if not created_at_str:
+            return None
+        try:
+            return cls._as_aware(datetime.fromisoformat(created_at_str.replace('Z', '+00:00')))
+        except Exception as e:
+            logger.debug(f"Failed to parse date {created_at_str}: {e}")
+            return None
+    
     def search_memories_by_date_range(self, start_date: datetime, end_date: datetime, max_results: int = 10) -> List[Dict]:
         """Search for memories within a specific date range"""
         if not self.is_available():
             return []
             
         try:
-            # Get all memories first (Mem0 doesn't have native date filtering)
-            all_memories_response = self.memory.get_all(
-                user_id=self.user_id,
-                version="v2",
-                output_format="v1.1",
-                page=1, 
-                page_size=100  # Get more for date filtering
+            # Range filter is applied by Mem0 where supported and re-checked locally
+            start_date, end_date = self._as_aware(start_date), self._as_aware(end_date)
+            all_memories = self._list_memories(
+                [{"created_at": {"gte": start_date.isoformat(), "lte": end_date.isoformat()}}],
+                predicate=lambda memory: (self._created_at(memory) is not None and
+                                          start_date <= self._created_at(memory) <= end_date)
             )
             
-            # Extract memories from paginated response
-            if isinstance(all_memories_response, dict) and "results" in all_memories_response:
-                results = all_memories_response["results"]
-                if isinstance(results, dict) and "results" in results:
-                    all_memories = results["results"]
-                else:
-                    all_memories = results if isinstance(results, list) else []
-            else:
-                all_memories = all_memories_response if isinstance(all_memories_response, list) else []
-            
-            # Filter by date range
-            filtered_memories = []
-            for memory in all_memories:
-                if isinstance(memory, dict):
-                    created_at_str = memory.get("created_at", "")
-                    if created_at_str:
-                        try:
-                            # Parse the datetime string (format: 2025-06-17T03:14:02.321149-07:00)
-                            created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-                            if start_date <= created_at <= end_date:
-                                filtered_memories.append({
-                                    "content": memory.get("memory", ""),
-                                    "metadata": memory.get("metadata", {}),
-                                    "created_at": created_at_str,
-                                    "id": memory.get("id", "")
-                                })
-                        except Exception as e:
-                            logger.debug(f"Failed to parse date {created_at_str}: {e}")
+            filtered_memories = [{
+                "content": memory.get("memory", ""),
+                "metadata": memory.get("metadata", {}),
+                "created_at": memory.get("created_at", ""),
+                "id": memory.get("id", "")
+            } for memory in all_memories]
             
             # Sort by date (newest first)
             filtered_memories.sort(key=lambda x: x.get("created_at", ""), reverse=True)
@@ -320,23 +687,23 @@ class SublimeMemory:
         if not self.is_available():
             return []
         
-        # Analyze the query type and use appropriate strategy
-        query_lower = query.lower()
+        # Analyze the query type and use appropriate strategy (one pass over the query)
+        strategy = recall_strategy(query)
         
         # Temporal queries (yesterday, last week, etc.)
-        if any(term in query_lower for term in ["yesterday", "today", "last week", "last month", "this week"]):
+        if strategy == "temporal":
             return self._handle_temporal_query(query, max_results)
         
         # Personal info queries
-        elif any(term in query_lower for term in ["about me", "know about me", "who am i", "my info", "my details"]):
+        elif strategy == "personal":
             return self._handle_personal_info_query(max_results)
         
         # Activity queries (what did I do, where did I go)
-        elif any(term in query_lower for term in ["what did i", "where did i", "what have i", "activities", "events"]):
+        elif strategy == "activity":
             return self._handle_activity_query(query, max_results)
         
         # Tool/work queries
-        elif any(term in query_lower for term in ["tools", "work", "projects", "code", "development"]):
+        elif strategy == "work":
             return self._handle_work_query(query, max_results)
         
         # Default to regular context search
@@ -346,17 +713,18 @@ class SublimeMemory:
     def _handle_temporal_query(self, query: str, max_results: int) -> List[Dict]:
         """Handle time-based queries like 'yesterday', 'last week'"""
         now = datetime.now()
+        query_lower = query.lower()
         
-        if "yesterday" in query.lower():
+        if "yesterday" in query_lower:
             start_date = now - timedelta(days=1)
             end_date = now
-        elif "last week" in query.lower():
+        elif "last week" in query_lower:
             start_date = now - timedelta(weeks=1)
             end_date = now
-        elif "last month" in query.lower():
+        elif "last month" in query_lower:
             start_date = now - timedelta(days=30)
             end_date = now
-        elif "today" in query.lower():
+        elif "today" in query_lower:
             start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = now
         else:
@@ -366,35 +734,65 @@ class SublimeMemory:
         
         return self.search_memories_by_date_range(start_date, end_date, max_results)
     
+    def _fan_out(self, calls: List[Tuple[Callable, tuple]], timeout: Optional[float] = None) -> List[List[Dict]]:
+        """
+        Run independent recall calls concurrently on the bounded recall pool.
+        
+        Returns one result list per call, in call order; calls that fail or are
+        still running when the overall timeout expires contribute an empty list.
+        """
+        if len(calls) <= 1:
+            return [fn(*args) for fn, args in calls]
+        
+        pool = self._get_pool("recall")
+        futures = {pool.submit(fn, *args): index for index, (fn, args) in enumerate(calls)}
+        results: List[List[Dict]] = [[] for _ in calls]
+        try:
+            for future in as_completed(futures, timeout=timeout if timeout is not None else self.recall_timeout):
+                try:
+                    results[futures[future]] = future.result() or []
+                except Exception as e:
+                    logger.debug(f"Recall call failed: {e}")
+        except FutureTimeout:
+            pending = [future for future in futures if not future.done()]
+            for future in pending:
+                future.cancel()
+            logger.warning(f"Memory recall timed out; {len(pending)}/{len(calls)} searches dropped")
+        return results
+    
+    @staticmethod
+    def _merge_unique(result_lists: List[List[Dict]], key: str) -> List[Dict]:
+        """Concatenate result lists, keeping the first memory per ``key`` value"""
+        unique_memories = []
+        seen = set()
+        for memories in result_lists:
+            for memory in memories:
+                value = memory.get(key, "")
+                if value and value not in seen:
+                    unique_memories.append(memory)
+                    seen.add(value)
+        return unique_memories
+    
     def _handle_personal_info_query(self, max_results: int) -> List[Dict]:
         """Handle personal information queries"""
-        # Use multiple targeted searches for better results
-        all_memories = []
+        # Use multiple targeted searches for better results, issued concurrently
         search_terms = ["name", "occupation", "work", "developer", "CPA", "programming", "hobby", "interests", "preferences"]
         
-        for term in search_terms:
-            try:
-                term_memories = self.recall_context(term, max_results=3)
-                all_memories.extend(term_memories)
-            except:
-                continue
+        results = self._fan_out([(self.recall_context, (term, 3)) for term in search_terms])
         
         # Deduplicate memories by content
-        unique_memories = []
-        seen_content = set()
-        for memory in all_memories:
-            content = memory.get("content", "")
-            if content and content not in seen_content:
-                unique_memories.append(memory)
-                seen_content.add(content)
-        
-        return unique_memories[:max_results]
+        return self._merge_unique(results, "content")[:max_results]
     
     def _handle_activity_query(self, query: str, max_results: int) -> List[Dict]:
         """Handle activity-based queries"""
-        # Look for tool usage and conversation memories
-        tool_memories = self.search_memories_by_type("tool_success", max_results // 2)
-        conversation_memories = self.search_memories_by_type("conversation", max_results // 2)
+        # Look for tool usage and conversation memories (one listing serves both types)
+        try:
+            all_memories = self._list_memories()
+        except Exception as e:
+            logger.error(f"Failed to search activity memories: {e}")
+            return []
+        tool_memories = self._filter_by_type(all_memories, "tool_success")[:max_results // 2]
+        conversation_memories = self._filter_by_type(all_memories, "conversation")[:max_results // 2]
         
         # Combine and sort by relevance/date
         all_memories = tool_memories + conversation_memories
@@ -404,26 +802,15 @@ class SublimeMemory:
     
     def _handle_work_query(self, query: str, max_results: int) -> List[Dict]:
         """Handle work/development related queries"""
-        # First try specific tool pattern recall
-        work_memories = self.search_memories_by_type("tool_success", max_results)
-        
-        # Also search for programming-related conversations
-        programming_terms = ["code", "programming", "development", "python", "typescript", "react", "bun"]
-        for term in programming_terms:
-            if term in query.lower():
-                term_memories = self.recall_context(term, max_results=3)
-                work_memories.extend(term_memories)
+        # Tool pattern recall plus searches for programming-related conversations, concurrently
+        calls = [(self.search_memories_by_type, ("tool_success", max_results))]
+        mentioned = PROGRAMMING_KEYWORDS.classify(query)
+        for term in PROGRAMMING_TERMS:
+            if term in mentioned:
+                calls.append((self.recall_context, (term, 3)))
         
         # Deduplicate and return
-        unique_memories = []
-        seen_ids = set()
-        for memory in work_memories:
-            memory_id = memory.get("id", "")
-            if memory_id and memory_id not in seen_ids:
-                unique_memories.append(memory)
-                seen_ids.add(memory_id)
-        
-        return unique_memories[:max_results]
+        return self._merge_unique(self._fan_out(calls), "id")[:max_results]
     
     def explicit_remember(self, content: str, category: str = "explicit", tags: List[str] = None, importance: str = "medium") -> bool:
         """Explicitly store a memory with enhanced metadata"""
@@ -456,6 +843,7 @@ class SublimeMemory:
             
             # Provide user feedback
             if result:
+                self._after_write()
                 from ui_components import ui
                 ui.print(f"📝 [green]Memory stored in category '{category}'[/green]")
                 return True
@@ -475,6 +863,7 @@ class SublimeMemory:
             result = self.memory.delete(memory_id=memory_id)
             
             if result:
+                self._after_delete([memory_id])
                 from ui_components import ui
                 ui.print(f"🗑️ [yellow]Memory deleted[/yellow]")
                 return True
@@ -490,64 +879,20 @@ class SublimeMemory:
             return False
             
         try:
-            # First, get all memory IDs
-            all_memories_response = self.memory.get_all(
-                user_id=self.user_id,
-                version="v2",
-                output_format="v1.1",
-                page=1, 
-                page_size=1000  # Get all memories
-            )
-            
-            # Extract memories from paginated response
-            if isinstance(all_memories_response, dict) and "results" in all_memories_response:
-                results = all_memories_response["results"]
-                if isinstance(results, dict) and "results" in results:
-                    all_memories = results["results"]
-                else:
-                    all_memories = results if isinstance(results, list) else []
-            else:
-                all_memories = all_memories_response if isinstance(all_memories_response, list) else []
+            # Stream IDs from Mem0 (never the cache) straight into batched deletes
+            logger.info("Batch deleting all memories...")
+            memory_ids = (memory.get("id") for memory in self.iter_memories(reverse=True)
+                          if isinstance(memory, dict))
+            deleted, total = self._delete_stream(memory_ids)
             
-            if not all_memories:
+            if not total:
                 logger.info("No memories found to delete")
                 return True
-            
-            # Extract memory IDs
-            memory_ids = []
-            for memory in all_memories:
-                if isinstance(memory, dict) and "id" in memory:
-                    memory_ids.append(memory["id"])
-            
-            if not memory_ids:
-                logger.info("No valid memory IDs found")
-                return True
-            
-            # Use batch delete API (max 1000 per request)
-            logger.info(f"Batch deleting {len(memory_ids)} memories...")
-            
-            # Format memory IDs correctly for batch delete
-            delete_memories = [{"memory_id": mid} for mid in memory_ids]
-            
-            # Process in batches of 1000
-            success_count = 0
-            for i in range(0, len(delete_memories), 1000):
-                batch = delete_memories[i:i+1000]
-                try:
-                    result = self.memory.batch_delete(batch)
-                    if result:
-                        success_count += len(batch)
-                        logger.info(f"Deleted batch of {len(batch)} memories")
-                    else:
-                        logger.error(f"Failed to delete batch of {len(batch)} memories")
-                except Exception as e:
-                    logger.error(f"Error deleting batch: {e}")
-                    
-            if success_count == len(delete_memories):
-                logger.info(f"Successfully deleted all {len(memory_ids)} memories")
+            if deleted == total:
+                logger.info(f"Successfully deleted all {total} memories")
                 return True
             else:
-                logger.error(f"Only deleted {success_count}/{len(memory_ids)} memories")
+                logger.error(f"Only deleted {deleted}/{total} memories")
                 return False
             
         except Exception as e:
@@ -560,45 +905,20 @@ class SublimeMemory:
             return False
             
         try:
-            # Get memories of specific type
-            memories = self.search_memories_by_type(memory_type, max_results=1000)
+            # Stream IDs of the type from Mem0 (never the cache) straight into batched deletes
+            logger.info(f"Batch deleting memories of type '{memory_type}'...")
+            memory_ids = (memory.get("id") for memory in self.iter_memories([{"metadata": {"type": memory_type}}], reverse=True)
+                          if isinstance(memory, dict) and memory.get("metadata", {}).get("type") == memory_type)
+            deleted, total = self._delete_stream(memory_ids)
             
-            if not memories:
+            if not total:
                 logger.info(f"No memories of type '{memory_type}' found")
                 return True
-            
-            # Extract memory IDs
-            memory_ids = [m.get("id") for m in memories if m.get("id")]
-            
-            if not memory_ids:
-                logger.info(f"No valid memory IDs found for type '{memory_type}'")
-                return True
-            
-            # Use batch delete API (max 1000 per request)
-            logger.info(f"Batch deleting {len(memory_ids)} memories of type '{memory_type}'...")
-            
-            # Format memory IDs correctly for batch delete
-            delete_memories = [{"memory_id": mid} for mid in memory_ids]
-            
-            # Process in batches of 1000
-            success_count = 0
-            for i in range(0, len(delete_memories), 1000):
-                batch = delete_memories[i:i+1000]
-                try:
-                    result = self.memory.batch_delete(batch)
-                    if result:
-                        success_count += len(batch)
-                        logger.info(f"Deleted batch of {len(batch)} memories")
-                    else:
-                        logger.error(f"Failed to delete batch of {len(batch)} memories")
-                except Exception as e:
-                    logger.error(f"Error deleting batch: {e}")
-                    
-            if success_count == len(delete_memories):
-                logger.info(f"Successfully deleted all {len(memory_ids)} memories of type '{memory_type}'")
+            if deleted == total:
+                logger.info(f"Successfully deleted all {total} memories of type '{memory_type}'")
                 return True
             else:
-                logger.error(f"Only deleted {success_count}/{len(memory_ids)} memories of type '{memory_type}'")
+                logger.error(f"Only deleted {deleted}/{total} memories of type '{memory_type}'")
                 return False
             
         except Exception as e:
@@ -611,71 +931,24 @@ class SublimeMemory:
             return False
             
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_old)
-            
-            # Get all memories and filter by date
-            all_memories_response = self.memory.get_all(
-                user_id=self.user_id,
-                version="v2",
-                output_format="v1.1",
-                page=1, 
-                page_size=1000
-            )
+            cutoff_date = self._as_aware(datetime.now() - timedelta(days=days_old))
             
-            # Extract memories from paginated response
-            if isinstance(all_memories_response, dict) and "results" in all_memories_response:
-                results = all_memories_response["results"]
-                if isinstance(results, dict) and "results" in results:
-                    all_memories = results["results"]
-                else:
-                    all_memories = results if isinstance(results, list) else []
-            else:
-                all_memories = all_memories_response if isinstance(all_memories_response, list) else []
+            # Stream old memory IDs from Mem0 (never the cache) straight into batched deletes
+            logger.info(f"Batch deleting memories older than {days_old} days...")
+            old_memories = self.iter_memories([{"created_at": {"lt": cutoff_date.isoformat()}}], reverse=True)
+            memory_ids = (memory.get("id") for memory in old_memories
+                          if isinstance(memory, dict) and self._created_at(memory) is not None
+                          and self._created_at(memory) < cutoff_date)
+            deleted, total = self._delete_stream(memory_ids)
             
-            # Filter old memories
-            old_memory_ids = []
-            for memory in all_memories:
-                if isinstance(memory, dict):
-                    created_at_str = memory.get("created_at", "")
-                    try:
-                        # Parse the created_at timestamp
-                        if created_at_str:
-                            created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-                            if created_at < cutoff_date:
-                                old_memory_ids.append(memory.get("id"))
-                    except Exception as e:
-                        logger.debug(f"Failed to parse date {created_at_str}: {e}")
-                        continue
-            
-            if not old_memory_ids:
+            if not total:
                 logger.info(f"No memories older than {days_old} days found")
                 return True
-            
-            # Use batch delete API (max 1000 per request)
-            logger.info(f"Batch deleting {len(old_memory_ids)} memories older than {days_old} days...")
-            
-            # Format memory IDs correctly for batch delete
-            delete_memories = [{"memory_id": mid} for mid in old_memory_ids]
-            
-            # Process in batches of 1000
-            success_count = 0
-            for i in range(0, len(delete_memories), 1000):
-                batch = delete_memories[i:i+1000]
-                try:
-                    result = self.memory.batch_delete(batch)
-                    if result:
-                        success_count += len(batch)
-                        logger.info(f"Deleted batch of {len(batch)} memories")
-                    else:
-                        logger.error(f"Failed to delete batch of {len(batch)} memories")
-                except Exception as e:
-                    logger.error(f"Error deleting batch: {e}")
-                    
-            if success_count == len(delete_memories):
-                logger.info(f"Successfully deleted all {len(old_memory_ids)} old memories")
+            if deleted == total:
+                logger.info(f"Successfully deleted all {total} old memories")
                 return True
             else:
-                logger.error(f"Only deleted {success_count}/{len(old_memory_ids)} old memories")
+                logger.error(f"Only deleted {deleted}/{total} old memories")
                 return False
             
         except Exception as e:
@@ -729,40 +1002,17 @@ class SublimeMemory:
             return {"status": "unavailable", "total_memories": 0}
             
         try:
-            # Get all memories for the user using cloud client API with v1.1 format
-            all_memories_response = self.memory.get_all(
-                user_id=self.user_id,
-                version="v2",
-                output_format="v1.1",
-                page=1, 
-                page_size=50
-            )
-            
-            # Extract memories from paginated response (handle double-nested structure)
-            if isinstance(all_memories_response, dict) and "results" in all_memories_response:
-                results = all_memories_response["results"]
-                # Handle double-nested results structure from v1.1 API
-                if isinstance(results, dict) and "results" in results:
-                    all_memories = results["results"]
-                else:
-                    all_memories = results if isinstance(results, list) else []
-            else:
-                all_memories = all_memories_response if isinstance(all_memories_response, list) else []
-            
-            # Handle case where get_all returns a string or unexpected format
-            if isinstance(all_memories, str):
-                all_memories = []
-            elif all_memories is None:
-                all_memories = []
-            elif not isinstance(all_memories, list):
-                all_memories = []
+            # Every memory of the user (served from the cached listing when fresh)
+            all_memories = self._list_memories()
             
             stats = {
                 "status": "active",
                 "total_memories": len(all_memories),
                 "session_start": self.session_start.isoformat(),
                 "tool_patterns": len(self.tool_patterns),
-                "user_id": self.user_id
+                "user_id": self.user_id,
+                "cache": self.cache.stats(),
+                "writer": self._writer.stats() if self._writer is not None else None
             }
             
             # Count by type
@@ -801,15 +1051,307 @@ class SublimeMemory:
         return " | ".join(summary_parts)
 
 
-# Global memory instance
-_global_memory = None
+class MemoryWriter:
+    """
+    Single background writer for memories learned during a session.
+    
+    Writes go into a bounded queue instead of a thread each. One worker
+    thread drains it in batches of up to ``batch_size``: identical writes in
+    a batch are stored once, the adds run back to back and the read cache is
+    invalidated once per batch. Mem0's add endpoint takes one conversation
+    per call, so a batch is not a single request, but a burst of tool calls
+    no longer turns into a burst of concurrent adds. Failed adds (rate
+    limits, network errors) are retried with exponential backoff. A full
+    queue drops the new write rather than blocking the caller.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, memory: "SublimeMemory", max_queue: int = 256, batch_size: int = 20,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0):
+        self.memory = memory
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._idle = threading.Condition()
+        self._unfinished = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.counters = {"queued": 0, "written": 0, "failed": 0, "retried": 0,
+                         "dropped": 0, "duplicates": 0, "batches": 0}
+        self.max_depth = 0
+        self._write_time = 0.0
+        self._max_write_time = 0.0
+        self._wait_time = 0.0
+    
+    def submit(self, write: Tuple[List[Dict], Dict], label: str = "memory",
+               on_success: Optional[Callable[[], None]] = None) -> bool:
+        """Queue ``(messages, metadata)`` for storage; False if the writer is closed or full"""
+        if self._closed:
+            return False
+        self._ensure_thread()
+        with self._idle:
+            self._unfinished += 1
+        try:
+            self._queue.put_nowait((time.monotonic(), label, write, on_success))
+        except queue.Full:
+            self._task_done()
+            self._bump("dropped")
+            logger.warning(f"Memory write queue full, dropping {label} write")
+            return False
+        self._bump("queued")
+        with self._stats_lock:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+    
+    @property
+    def pending(self) -> int:
+        with self._idle:
+            return self._unfinished
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued write has been stored or given up on"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+    
+    def close(self, timeout: float = 10.0) -> bool:
+        """Flush, then stop the worker thread; later submits are refused"""
+        drained = self.flush(timeout)
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(self._STOP, timeout=1.0)
+            except queue.Full:
+                pass  # daemon thread; it dies with the process
+        if not drained:
+            logger.warning(f"{self.pending} memory writes were still pending at shutdown")
+        return drained
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            attempts = self.counters["written"] + self.counters["failed"]
+            return {
+                **self.counters,
+                "depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "avg_write_latency": (self._write_time / attempts) if attempts else 0.0,
+                "max_write_latency": self._max_write_time,
+                "avg_queue_wait": (self._wait_time / attempts) if attempts else 0.0,
+            }
+    
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+                self._thread.start()
+    
+    def _bump(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.counters[key] += amount
+    
+    def _task_done(self, count: int = 1) -> None:
+        with self._idle:
+            self._unfinished -= count
+            if self._unfinished <= 0:
+                self._idle.notify_all()
+    
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            finally:
+                self._task_done(len(batch))
+            if stop:
+                return
+    
+    def _write_batch(self, batch: List[tuple]) -> None:
+        self._bump("batches")
+        stored = False
+        seen: Dict[str, bool] = {}
+        for queued_at, label, (messages, metadata), on_success in batch:
+            # The timestamp differs between otherwise identical writes
+            key = json.dumps([messages, {k: v for k, v in metadata.items() if k != "timestamp"}],
+                             sort_keys=True, default=str)
+            if key in seen:
+                self._bump("duplicates")
+                if seen[key] and on_success is not None:
+                    on_success()
+                continue
+            started = time.monotonic()
+            seen[key] = self._write_one(label, messages, metadata)
+            if seen[key]:
+                stored = True
+                if on_success is not None:
+                    on_success()
+            finished = time.monotonic()
+            with self._stats_lock:
+                self._write_time += finished - started
+                self._max_write_time = max(self._max_write_time, finished - started)
+                self._wait_time += started - queued_at
+        if stored:
+            self.memory._after_write()
+    
+    def _write_one(self, label: str, messages: List[Dict], metadata: Dict) -> bool:
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.memory._add(messages, metadata)
+                self._bump("written")
+                logger.debug(f"Stored {label} memory")
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._bump("failed")
+                    logger.error(f"Failed to store {label} memory after {attempt + 1} attempts: {e}")
+                    return False
+                self._bump("retried")
+                logger.debug(f"Retrying {label} memory write in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        return False
+
+
+class MemoryPrefetcher:
+    """
+    Speculative memory retrieval with a latency deadline.
+    
+    ``start`` launches the lookup in the background as soon as user input
+    arrives; ``collect`` waits at most ``deadline`` seconds for it. A lookup
+    that misses the deadline keeps running and its result is handed out by
+    the next ``collect`` call, so slow Mem0 round trips never hold up the
+    request they were started for.
+    """
+    
+    def __init__(self, fetch: Callable[[str], str], max_workers: int = 2):
+        self.fetch = fetch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memory-prefetch")
+        self._lock = threading.Lock()
+        self._pending: Optional[Tuple[str, Future]] = None
+        self._missed: set = set()
+        self._late: List[str] = []
+        self.stats = {"started": 0, "on_time": 0, "late": 0, "errors": 0}
+    
+    def start(self, query: str) -> None:
+        """Begin looking up memory context for ``query`` (no-op if already running for it)"""
+        with self._lock:
+            if self._pending is not None and self._pending[0] == query:
+                return
+            self.stats["started"] += 1
+            future = self._executor.submit(self.fetch, query)
+            self._pending = (query, future)
+        future.add_done_callback(self._on_done)
+    
+    def is_pending(self, query: str) -> bool:
+        with self._lock:
+            return self._pending is not None and self._pending[0] == query
+    
+    def collect(self, query: str, deadline: float) -> str:
+        """
+        Memory context to inject for ``query``, waiting at most ``deadline`` seconds.
+        
+        Returns late results from earlier turns plus this turn's result if it
+        arrived in time; an empty string if there is nothing to inject.
+        """
+        with self._lock:
+            pending = self._pending if self._pending and self._pending[0] == query else None
+            if pending is not None:
+                self._pending = None
+        
+        fresh = ""
+        if pending is not None:
+            future = pending[1]
+            try:
+                fresh = future.result(timeout=max(0.0, deadline)) or ""
+                with self._lock:
+                    self.stats["on_time"] += 1
+            except FutureTimeout:
+                logger.debug(f"Memory lookup missed the {deadline:.2f}s deadline; keeping it for next turn")
+                with self._lock:
+                    self._missed.add(future)
+                if future.done():
+                    # Finished between the timeout and registering it as missed
+                    self._on_done(future)
+            except Exception as e:
+                logger.warning(f"Memory lookup failed: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+        
+        with self._lock:
+            late, self._late = self._late, []
+        
+        parts = [part for part in late if part and part != fresh]
+        if fresh:
+            parts.append(fresh)
+        return "\n".join(parts)
+    
+    async def collect_async(self, query: str, deadline: float) -> str:
+        """``collect`` without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.collect, query, deadline)
+    
+    def _on_done(self, future: Future) -> None:
+        """Keep results of lookups that missed their deadline for the next turn"""
+        with self._lock:
+            if future not in self._missed:
+                return  # collected on time, or superseded before anyone waited
+            self._missed.discard(future)
+            if future.exception() is not None:
+                self.stats["errors"] += 1
+                return
+            self.stats["late"] += 1
+            result = future.result()
+            if result:
+                self._late.append(result)
+
+
+# Global memory instances: one per (user_id, backend). Callers keep references,
+# so an instance is never replaced or closed before exit
+_memory_managers: Dict[Tuple[str, str], SublimeMemory] = {}
+_memory_managers_lock = threading.Lock()
+
+def get_memory_manager(user_id: str = "default_user", backend: Optional[str] = None) -> SublimeMemory:
+    """Get or create the shared memory manager for a user and backend"""
+    key = (user_id, (backend or os.getenv("SUBLIME_MEMORY_BACKEND") or "mem0").lower())
+    with _memory_managers_lock:
+        memory = _memory_managers.get(key)
+        if memory is None:
+            memory = SublimeMemory(user_id, key[1])
+            _memory_managers[key] = memory
+        return memory
+
+def shutdown_memory(timeout: float = 10.0):
+    """Flush queued memory writes before the interpreter exits"""
+    with _memory_managers_lock:
+        managers = list(_memory_managers.values())
+    for memory in managers:
+        memory.close(timeout)
 
-def get_memory_manager(user_id: str = "default_user") -> SublimeMemory:
-    """Get or create the global memory manager instance"""
-    global _global_memory
-    if _global_memory is None or _global_memory.user_id != user_id:
-        _global_memory = SublimeMemory(user_id)
-    return _global_memory
+atexit.register(shutdown_memory)
 
 
 # Convenience functions for easy integration
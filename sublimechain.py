@@ -31,8 +31,9 @@ Features:
 - 🚀 Streaming: Real-time thinking + tool execution
 """
 
-import os, json, itertools, time, asyncio
+import os, json, itertools, time, asyncio, threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 import logging
 
@@ -83,12 +84,19 @@ from dotenv import load_dotenv
 
 # Import our enhanced tool discovery system
 from tool_discovery import (
-    get_tool_discovery, get_claude_tools, execute_tool_sync, 
-    refresh_tools, list_tools, initialize_tool_discovery
+    get_tool_discovery, get_claude_tools, execute_tool_sync, execute_tool,
+    refresh_tools, list_tools, initialize_tool_discovery, run_coroutine_sync, submit_coroutine
 )
 
 # Import memory manager for persistent context
-from memory_manager import get_memory_manager, SublimeMemory
+from memory_manager import get_memory_manager, SublimeMemory, MemoryPrefetcher
+from memory_heuristics import should_remember_tool_usage, should_remember_conversation, wants_memory_search
+
+# Import the iterative agent loop and token-budget transcript compaction
+from agent_loop import AsyncAgentLoop, RoundTiming
+from context_compactor import (
+    get_transcript_compactor, context_budget, estimate_text_tokens, truncate_conversation_history
+)
 
 # Import enhanced UI components
 from ui_components import ui, print_banner, print_initialization_progress, format_command_suggestions
@@ -109,7 +117,17 @@ CONFIG = {
     "memory_enabled": True,
     "memory_search": True,
     "memory_learning": True,
-    "rate_limit_delay": 1.0    # Seconds between API calls
+    "memory_backend": os.getenv("SUBLIME_MEMORY_BACKEND", "mem0"),  # "mem0" (cloud) or "local" (offline SQLite)
+    "rate_limit_delay": 1.0,   # Seconds between API calls
+    "memory_deadline": 0.3,    # Max seconds a request waits for memory context before going out
+    "parallel_tools": True,    # Run independent tool_use blocks from one turn concurrently
+    "max_tool_workers": 4,     # Upper bound on tools executing at the same time
+    "prompt_caching": True,    # Cache breakpoints on the tools block and conversation prefix
+    "stream_markdown": False,  # Render streamed responses as Markdown, one finished block at a time
+    "context_strategy": "tokens",      # "tokens" (budget-aware compaction) or "messages" (last N)
+    "history_token_budget": 120000,    # Upper bound on transcript tokens sent per request
+    "max_rounds": 25,          # Upper bound on model requests (tool rounds) per user turn
+    "max_turn_tokens": 500000  # Upper bound on input + output tokens spent per user turn
 }
 
 AVAILABLE_MODELS = [
@@ -122,10 +140,11 @@ BETA_HEADERS   = ",".join([
     "fine-grained-tool-streaming-2025-05-14",
 ])
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# The chat engine is async; it runs on the shared runtime loop next to the MCP sessions
+async_client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
 # Initialize memory manager
-MEMORY = get_memory_manager("sublime_user")
+MEMORY = get_memory_manager("sublime_user", CONFIG["memory_backend"])
 
 # Session stats tracking
 SESSION_STATS = {
@@ -137,10 +156,23 @@ SESSION_STATS = {
     "successful_tools": 0,
     "failed_tools": 0,
     "memories_created": 0,
-    "conversations": 0
+    "conversations": 0,
+    "input_tokens": 0,
+    "cache_read_tokens": 0,
+    "cache_write_tokens": 0,
+    "model_time": 0.0,
+    "tool_time": 0.0,
+    "memory_time": 0.0
 }
+# Tools may finish on worker threads, so counter updates go through a lock
+_STATS_LOCK = threading.Lock()
 
 # ────────────────────────────── Helper Functions ─────────────────────────────── #
+def bump_stat(key: str, amount: int = 1):
+    """Increment a SESSION_STATS counter (safe to call from tool worker threads)"""
+    with _STATS_LOCK:
+        SESSION_STATS[key] = SESSION_STATS.get(key, 0) + amount
+
 def get_memory_stats_safe() -> Dict:
     """Safely get memory stats"""
     if not MEMORY.is_available():
@@ -179,7 +211,7 @@ def initialize_tools_with_progress():
         
         # MCP integration
         try:
-            total_tools = asyncio.run(initialize_tool_discovery())
+            total_tools = run_coroutine_sync(initialize_tool_discovery())
             mcp_count = total_tools - local_count
         except Exception as e:
             logger.debug(f"MCP initialization failed: {e}")
@@ -207,6 +239,56 @@ def beta_headers() -> dict[str, str]:
     """Return extra headers for every call."""
     return {"anthropic-beta": BETA_HEADERS}
 
+def request_tools() -> list:
+    """Tools payload for the next request (built once, cache-marked when enabled)"""
+    try:
+        return get_claude_tools(cacheable=CONFIG["prompt_caching"])
+    except Exception as e:
+        logger.debug(f"Falling back to startup tool list: {e}")
+        return TOOLS
+
+_TOOLS_TOKENS: Dict[str, Any] = {"tools": None, "tokens": 0}
+
+def with_cache_breakpoint(messages: list[dict]) -> list[dict]:
+    """
+    Return ``messages`` with a prompt cache breakpoint on the last content block.
+    
+    Everything up to that block is the stable prefix the next request will
+    resend, so the following call reads it from the cache. The stored transcript
+    is never modified: only the last message and its last block are copied.
+    """
+    if not CONFIG["prompt_caching"] or not messages:
+        return messages
+    
+    last_message = messages[-1]
+    content = last_message.get("content")
+    if isinstance(content, str):
+        if not content:
+            return messages
+        blocks = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content and isinstance(content[-1], dict):
+        blocks = list(content)
+    else:
+        return messages
+    
+    # Thinking blocks cannot carry cache_control
+    if blocks[-1].get("type") in ("thinking", "redacted_thinking"):
+        return messages
+    
+    blocks[-1] = {**blocks[-1], "cache_control": {"type": "ephemeral"}}
+    return messages[:-1] + [{**last_message, "content": blocks}]
+
+def record_usage(message) -> None:
+    """Add the token usage of one API response (including cache hits) to SESSION_STATS"""
+    usage = getattr(message, "usage", None)
+    if usage is None:
+        return
+    
+    bump_stat("input_tokens", getattr(usage, "input_tokens", 0) or 0)
+    bump_stat("response_tokens_used", getattr(usage, "output_tokens", 0) or 0)
+    bump_stat("cache_read_tokens", getattr(usage, "cache_read_input_tokens", 0) or 0)
+    bump_stat("cache_write_tokens", getattr(usage, "cache_creation_input_tokens", 0) or 0)
+
 def get_memory_context(user_input: str) -> str:
     """Get relevant memory context for the current interaction"""
     if not MEMORY.is_available() or not CONFIG["memory_search"]:
@@ -236,437 +318,321 @@ def get_memory_context(user_input: str) -> str:
         logger.warning(f"Memory context retrieval failed: {e}")
         return ""
 
-def _should_remember_tool_usage(name: str, args: dict, result: str, context: str) -> bool:
-    """Determine if a tool usage is worth remembering based on value and reusability"""
+# Memory lookups run speculatively from the moment input arrives (see prefetch_memory)
+MEMORY_PREFETCH = MemoryPrefetcher(get_memory_context)
+
+def _record_tool_success(name: str, args: dict, result: str, context: str) -> str:
+    """Update stats and memory after a tool call succeeded"""
+    # Track successful tool
+    bump_stat("successful_tools")
+    
+    # Store successful tool usage in memory ONLY if it's valuable (async, non-blocking)
+    if MEMORY.is_available() and CONFIG["memory_learning"]:
+        if should_remember_tool_usage(name, args, result, context):
+            ui.print(f"🧠 [dim blue]Learned {name} pattern[/dim blue]")
+            bump_stat("memories_created")
+            try:
+                task_description = f"{name} with args: {json.dumps(args, default=str)[:100]}"
+                # Queued for the background memory writer so the UI never waits on Mem0
+                MEMORY.queue_tool_success(name, task_description, result[:500], {"context": context})
+            except Exception as e:
+                logger.debug(f"Failed to queue memory storage: {e}")
     
-    # Never remember simple/common tools that don't provide lasting value
-    trivial_tools = {
-        'duckduckgotool',  # Generic web searches
-        'webscrapertool',   # One-time content fetching
-        'mcp_fetch_fetch',  # One-time content fetching
-        'filecontentreadertool',  # One-time file reads
-        'weathertool'  # Temporal data
-    }
+    return result
+
+def _record_tool_failure(name: str, exc: Exception) -> str:
+    """Update stats after a tool call raised and build the error result"""
+    bump_stat("failed_tools")
+    return f"<error>Tool {name} execution failed: {exc}</error>"
+
+# Local tools are blocking, so they run on this pool; the semaphore in
+# run_tools_with_memory decides how many run at once
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="tool")
+
+async def run_tools_with_memory(tool_uses: list, context: str = "") -> List[str]:
+    """
+    Execute every tool_use block from one assistant turn.
     
-    if name in trivial_tools:
-        return False
+    Local tools run on ``TOOL_EXECUTOR`` and MCP tools are awaited directly on
+    the runtime loop. With ``parallel_tools`` enabled up to ``max_tool_workers``
+    run at the same time, otherwise one at a time. Results are returned in the
+    same order as ``tool_uses`` so the tool_result blocks line up with the
+    assistant's tool_use blocks.
+    """
+    discovery = get_tool_discovery()
+    loop = asyncio.get_running_loop()
+    limit = CONFIG["max_tool_workers"] if CONFIG["parallel_tools"] else 1
+    semaphore = asyncio.Semaphore(max(1, limit))
+    results: List[Any] = [None] * len(tool_uses)
     
-    # Handle Brave search tools specifically
-    if name.startswith('mcp_brave-search_'):
-        # local_search often fails due to API limits - don't remember failed attempts
-        if 'local_search' in name and ('error' in result.lower() or len(result) < 50):
-            return False
-        
-        # Only remember searches that seem like preferences/research patterns
-        search_terms = str(args).lower()
-        valuable_searches = [
-            'prefer', 'favorite', 'best', 'recommend', 'how to', 'tutorial',
-            'learn', 'guide', 'documentation', 'api', 'error', 'problem',
-            'comparison', 'versus', 'review', 'alternative'
-        ]
+    with ui.tool_progress([tool_use.name for tool_use in tool_uses]) as progress:
         
-        # For web_search, be more selective since it's reliable
-        if 'web_search' in name:
-            if not any(term in search_terms for term in valuable_searches):
-                return False
+        async def run_one(index: int):
+            tool_use = tool_uses[index]
+            async with semaphore:
+                bump_stat("tool_calls")
+                progress.start(index)
+                start_time = time.time()
+                try:
+                    route = discovery.resolve(tool_use.name)
+                    if route is not None and route.is_local:
+                        result = await loop.run_in_executor(
+                            TOOL_EXECUTOR, execute_tool_sync, tool_use.name, tool_use.input, tool_use.id
+                        )
+                    else:
+                        # MCP tools, bounded by MCP_CALL_TIMEOUT (unknown names are reported as not found)
+                        result = await execute_tool(tool_use.name, tool_use.input, tool_use.id)
+                except Exception as exc:
+                    progress.finish(index, "failed", time.time() - start_time)
+                    results[index] = _record_tool_failure(tool_use.name, exc)
+                    return
+                progress.finish(index, "completed", time.time() - start_time)
+                results[index] = _record_tool_success(tool_use.name, tool_use.input, result, context)
         
-        # For local_search, only remember if it actually succeeded AND is reusable
-        if 'local_search' in name:
-            if not any(term in search_terms for term in valuable_searches + ['near me', 'nearby', 'area']):
-                return False
-    
-    # Handle other search tools
-    elif 'search' in name.lower():
-        search_terms = str(args).lower()
-        valuable_searches = [
-            'prefer', 'favorite', 'best', 'recommend', 'how to', 'tutorial',
-            'learn', 'guide', 'documentation', 'api', 'error', 'problem'
-        ]
-        if not any(term in search_terms for term in valuable_searches):
-            return False
-    
-    # Always remember configuration/setup tools
-    valuable_tools = {
-        'claudecode',  # Coding patterns worth remembering
-        'createfolderstool',  # Project structure patterns
-        'diffeditortool',  # Code editing patterns
-        'uvpackagemanager',  # Package management patterns
-    }
+        outcomes = await asyncio.gather(*(run_one(index) for index in range(len(tool_uses))),
+                                        return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"Concurrent tool dispatch failed: {outcome}")
+    
+    # Anything left unset crashed before recording a result
+    for index, tool_use in enumerate(tool_uses):
+        if results[index] is None:
+            results[index] = f"<error>Tool {tool_use.name} execution failed: no result</error>"
+    
+    return results
+
+# ────────────────────────────── 3. Memory-Enhanced Streaming loop ────────────────────── #
+def compact_transcript(transcript: list[dict]) -> list[dict]:
+    """Fit the transcript into the request's token budget (or the legacy message window)"""
+    if CONFIG["context_strategy"] == "messages":
+        return truncate_conversation_history(transcript, max_messages=15)
+    
+    # The tools payload is rebuilt only on registry changes, so its size is measured once per build
+    tools = request_tools()
+    if _TOOLS_TOKENS["tools"] is not tools:
+        _TOOLS_TOKENS["tools"] = tools
+        _TOOLS_TOKENS["tokens"] = estimate_text_tokens(json.dumps(tools, default=str))
+    
+    budget = context_budget(
+        CONFIG["model"],
+        max(CONFIG["max_tokens"], CONFIG["thinking_budget"]),
+        reserved_tokens=_TOOLS_TOKENS["tokens"],
+        cap=CONFIG["history_token_budget"],
+    )
+    return get_transcript_compactor().compact(transcript, budget)
+
+def prefetch_memory(user_input: str) -> None:
+    """Start the memory lookup for a user message in the background, if it warrants one"""
+    if not user_input or not MEMORY.is_available() or not CONFIG["memory_search"] or len(user_input) <= 10:
+        return
     
-    if name in valuable_tools:
-        return True
-    
-    # Remember Notion/productivity tools (project/workflow patterns)
-    if 'notion' in name.lower() or 'pushover' in name.lower():
-        return True
-    
-    # Remember MCP tools that modify state or create content
-    if name.startswith('mcp_') and any(action in name.lower() for action in [
-        'create', 'update', 'delete', 'write', 'edit', 'add', 'remove'
-    ]):
-        return True
-    
-    # Check result quality - only remember if substantial and useful
-    if len(result) < 100:  # Too short to be valuable
-        return False
-    
-    # Skip error results
-    if result.startswith('<error>') or 'error' in result.lower()[:50]:
-        return False
-    
-    # Skip very long results (probably one-time data dumps)
-    if len(result) > 2000:
-        return False
-    
-    # Check context for personal preferences or reusable patterns
-    if context and any(keyword in context.lower() for keyword in [
-        'prefer', 'like', 'favorite', 'always', 'usually', 'workflow',
-        'setup', 'configure', 'pattern', 'template', 'standard'
-    ]):
-        return True
-    
-    # Default: don't remember (be conservative)
-    return False
-
-def _should_remember_conversation(user_input: str, assistant_response: str) -> bool:
-    """Determine if a conversation is worth remembering for future context"""
-    
-    # Skip short conversations
-    if len(user_input) < 30 or len(assistant_response) < 100:
-        return False
-    
-    # Skip generic responses
-    generic_phrases = [
-        "i don't have", "i don't know", "based on the information",
-        "according to what", "hello", "hi there", "how can i help",
-        "sure, i can help", "let me help", "i'll help you"
-    ]
+    # Only search memories for specific types of queries to reduce API calls
+    should_search = wants_memory_search(user_input)
     
-    if any(phrase in assistant_response.lower()[:200] for phrase in generic_phrases):
-        return False
+    # Also limit memory search frequency
+    current_time = time.time()
+    if not should_search or (current_time - _LOOP_STATE["last_memory_search"]) <= 30:  # 30 second cooldown
+        return
     
-    # Remember conversations about preferences, learning, and personal info
-    valuable_topics = [
-        # Personal information
-        'my name is', 'i am', 'i work', 'i live', 'i prefer', 'i like',
-        'i usually', 'my favorite', 'my background', 'about me',
-        
-        # Preferences and workflows
-        'prefer', 'workflow', 'process', 'standard', 'template',
-        'always do', 'usually do', 'best practice', 'convention',
-        
-        # Learning and insights
-        'learned', 'discovered', 'figured out', 'solution', 'pattern',
-        'mistake', 'lesson', 'insight', 'remember that', 'note that',
-        
-        # Technical setup/configuration
-        'configuration', 'setup', 'environment', 'api key', 'token',
-        'credential', 'setting', 'config', 'install', 'deploy'
-    ]
+    _LOOP_STATE["last_memory_search"] = current_time
+    MEMORY_PREFETCH.start(user_input)
+
+async def inject_memory_context(messages: list[dict], user_input: str, timing: RoundTiming) -> None:
+    """
+    Append memory context to the last user message, waiting at most ``memory_deadline``.
     
-    combined_text = f"{user_input} {assistant_response}".lower()
+    The lookup normally started when the input was read (see prefetch_memory);
+    if it misses the deadline the request goes out without it and the result
+    is injected on the next turn instead.
+    """
+    if not MEMORY.is_available():
+        return
     
-    if any(topic in combined_text for topic in valuable_topics):
-        return True
+    if not MEMORY_PREFETCH.is_pending(user_input):
+        prefetch_memory(user_input)
     
-    # Remember conversations with explicit learning/memory requests
-    memory_requests = [
-        'remember', 'note', 'save', 'store', 'keep in mind',
-        'for future', 'next time', 'going forward'
-    ]
+    with timing.measure("memory"):
+        memory_context = await MEMORY_PREFETCH.collect_async(user_input, CONFIG["memory_deadline"])
     
-    if any(request in user_input.lower() for request in memory_requests):
-        return True
+    if not memory_context or not messages:
+        return
     
-    # Default: don't remember
-    return False
+    ui.print(f"🧠 [italic blue]Using memory context...[/italic blue]")
+    # Add memory context to the last user message
+    last_message = messages[-1]
+    if last_message.get("role") == "user":
+        content = last_message.get("content", "")
+        if isinstance(content, str):
+            messages[-1] = {**last_message, "content": f"{content}\n\n{memory_context}"}
 
-def run_tool_with_memory(name: str, args: dict, context: str = "") -> str:
-    """Enhanced tool execution with memory integration and stats tracking"""
-    start_time = time.time()
-    
-    # Track tool call
-    SESSION_STATS["tool_calls"] += 1
-    
-    # Show tool execution start
-    ui.print_tool_execution(name, "executing")
+def learn_from_response(user_input: str, assistant_response: str) -> None:
+    """Store the exchange in memory ONLY if it's valuable for future context"""
+    if not MEMORY.is_available() or not CONFIG["memory_learning"]:
+        return
     
-    # Execute discovered tool with memory context
     try:
-        result = execute_tool_sync(name, args)
-        duration = time.time() - start_time
-        ui.print_tool_execution(name, "completed", duration)
-        
-        # Track successful tool
-        SESSION_STATS["successful_tools"] += 1
-        
-        # Store successful tool usage in memory ONLY if it's valuable (async, non-blocking)
-        if MEMORY.is_available() and CONFIG["memory_learning"]:
-            if _should_remember_tool_usage(name, args, result, context):
-                ui.print(f"🧠 [dim blue]Learned {name} pattern[/dim blue]")
-                SESSION_STATS["memories_created"] += 1
-                try:
-                    task_description = f"{name} with args: {json.dumps(args, default=str)[:100]}"
-                    # Run memory storage in background to avoid blocking the UI
-                    import threading
-                    def store_memory():
-                        try:
-                            MEMORY.store_tool_success(name, task_description, result[:500], {"context": context})
-                        except Exception as e:
-                            logger.warning(f"Failed to store tool success in memory: {e}")
-                    
-                    thread = threading.Thread(target=store_memory, daemon=True)
-                    thread.start()
-                except Exception as e:
-                    logger.debug(f"Failed to setup memory storage: {e}")
-        
-        return result
-        
-    except Exception as exc:
-        duration = time.time() - start_time
-        ui.print_tool_execution(name, "failed", duration)
-        SESSION_STATS["failed_tools"] += 1
-        return f"<error>Tool {name} execution failed: {exc}</error>"
+        if should_remember_conversation(user_input, assistant_response):
+            ui.print(f"🧠 [dim blue]Learned conversation pattern[/dim blue]")
+            bump_stat("memories_created")
+            # Queued for the background memory writer to avoid blocking
+            conversation_messages = [
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": assistant_response}
+            ]
+            MEMORY.queue_conversation(conversation_messages, "sublime_chat")
+    except Exception as e:
+        logger.debug(f"Failed to queue memory storage: {e}")
 
-# ────────────────────────────── 3. Memory-Enhanced Streaming loop ────────────────────── #
-def truncate_conversation_history(transcript: list[dict], max_messages: int = 20) -> list[dict]:
-    """Truncate conversation history to prevent context explosion while preserving tool_use/tool_result pairs"""
-    if len(transcript) <= max_messages:
-        return transcript
-    
-    # Keep system messages
-    system_messages = [msg for msg in transcript if msg.get("role") == "system"]
-    recent_messages = transcript[-max_messages:]
-    
-    # Fix orphaned tool_result blocks by removing them if their tool_use is missing
-    cleaned_recent = []
-    for msg in recent_messages:
-        if msg.get("role") == "user" and isinstance(msg.get("content"), list):
-            # Check for tool_result blocks
-            content_blocks = []
-            for block in msg.get("content", []):
-                if isinstance(block, dict) and block.get("type") == "tool_result":
-                    tool_use_id = block.get("tool_use_id")
-                    # Look for corresponding tool_use in previous assistant message
-                    found_tool_use = False
-                    if cleaned_recent:
-                        prev_msg = cleaned_recent[-1]
-                        if prev_msg.get("role") == "assistant" and isinstance(prev_msg.get("content"), list):
-                            for prev_block in prev_msg.get("content", []):
-                                if (isinstance(prev_block, dict) and 
-                                    prev_block.get("type") == "tool_use" and 
-                                    prev_block.get("id") == tool_use_id):
-                                    found_tool_use = True
-                                    break
-                    
-                    # Only keep tool_result if we found its tool_use
-                    if found_tool_use:
-                        content_blocks.append(block)
-                    # Skip orphaned tool_result blocks
-                else:
-                    content_blocks.append(block)
-            
-            # Update message content if we have any blocks
-            if content_blocks:
-                msg = {**msg, "content": content_blocks}
-                cleaned_recent.append(msg)
-        else:
-            cleaned_recent.append(msg)
+# Timestamps shared across turns (rate limiting and memory search cooldown)
+_LOOP_STATE = {"last_api_call": 0.0, "last_memory_search": 0.0}
+
+async def stream_round(messages: list[dict], user_input: str, timing: RoundTiming):
+    """Send one streaming request for the current transcript and return the final message"""
+    # Add rate limiting to prevent API overload
+    time_since_last = time.time() - _LOOP_STATE["last_api_call"]
+    if time_since_last < CONFIG["rate_limit_delay"]:
+        await asyncio.sleep(CONFIG["rate_limit_delay"] - time_since_last)
     
-    # Combine system + cleaned recent messages
-    result = system_messages.copy()
-    for msg in cleaned_recent:
-        if msg not in result:
-            result.append(msg)
+    _LOOP_STATE["last_api_call"] = time.time()
+    
+    # Track API call
+    bump_stat("api_calls")
     
-    return result
-
-def stream_once_with_memory(transcript: list[dict], user_input: str = "") -> dict:
-    """
-    Enhanced streaming with memory context injection.
-    Provides memory-aware interactions and learns from each exchange.
-    """
     try:
-        # Get memory context for this interaction (reduced frequency)
-        memory_context = ""
-        if user_input and MEMORY.is_available() and len(user_input) > 10:
-            # Only search memories for specific types of queries to reduce API calls
-            memory_keywords = ["remember", "recall", "told you", "discussed", "my", "me", "i am", "name", "preferences"]
-            should_search = any(keyword in user_input.lower() for keyword in memory_keywords)
-            
-            # Also limit memory search frequency
-            import time
-            current_time = time.time()
-            if not hasattr(stream_once_with_memory, 'last_memory_search'):
-                stream_once_with_memory.last_memory_search = 0
-            
-            if should_search and (current_time - stream_once_with_memory.last_memory_search) > 30:  # 30 second cooldown
-                try:
-                    memory_context = get_memory_context(user_input)
-                    stream_once_with_memory.last_memory_search = current_time
-                    if memory_context:
-                        ui.print(f"🧠 [italic blue]Using memory context...[/italic blue]")
-                except Exception as e:
-                    logger.warning(f"Failed to get memory context: {e}")
-                    memory_context = ""
-        
-        # Truncate conversation history to prevent context explosion
-        truncated_transcript = truncate_conversation_history(transcript, max_messages=15)
-        
-        # Inject memory context into the conversation if available
-        enhanced_transcript = truncated_transcript.copy()
-        if memory_context and enhanced_transcript:
-            # Add memory context to the last user message
-            last_message = enhanced_transcript[-1]
-            if last_message.get("role") == "user":
-                content = last_message.get("content", "")
-                if isinstance(content, str):
-                    enhanced_content = f"{content}\n\n{memory_context}"
-                    enhanced_transcript[-1] = {**last_message, "content": enhanced_content}
-        
-        # Add rate limiting to prevent API overload
-        import time
-        if hasattr(stream_once_with_memory, 'last_api_call'):
-            time_since_last = time.time() - stream_once_with_memory.last_api_call
-            if time_since_last < CONFIG["rate_limit_delay"]:
-                time.sleep(CONFIG["rate_limit_delay"] - time_since_last)
-        
-        stream_once_with_memory.last_api_call = time.time()
-        
-        # Track API call
-        SESSION_STATS["api_calls"] += 1
-        
         # Create a streaming request with thinking enabled
-        with client.messages.stream(
+        async with async_client.messages.stream(
             model=CONFIG["model"],
             max_tokens=CONFIG["max_tokens"],
-            tools=TOOLS,
-            messages=enhanced_transcript,
+            tools=request_tools(),
+            messages=with_cache_breakpoint(compact_transcript(messages)),
             extra_headers=beta_headers(),
             thinking={"type": "enabled", "budget_tokens": CONFIG["thinking_budget"]},
         ) as stream:
             
             thinking_content = []
             response_content = []
-            in_thinking = False
             
-            # Handle the stream events
-            for chunk in stream:
-                if chunk.type == 'message_start':
-                    continue
-                elif chunk.type == 'content_block_start':
-                    if hasattr(chunk.content_block, 'type'):
-                        if chunk.content_block.type == 'tool_use':
-                            ui.print(f"\n🔧 [bold yellow]Tool Use:[/bold yellow] [cyan]{chunk.content_block.name}[/cyan]")
-                        elif chunk.content_block.type == 'thinking':
-                            ui.print(f"\n💭 [bold blue]Thinking:[/bold blue] ", end='')
-                            in_thinking = True
-                elif chunk.type == 'content_block_delta':
-                    if hasattr(chunk.delta, 'text') and chunk.delta.text:
-                        if in_thinking:
-                            ui.console.print(chunk.delta.text, end='', style="italic blue")
-                            thinking_content.append(chunk.delta.text)
-                        else:
-                            ui.console.print(chunk.delta.text, end='')
-                            response_content.append(chunk.delta.text)
-                elif chunk.type == 'content_block_stop':
-                    if in_thinking:
-                        ui.print("")  # New line after thinking
-                        in_thinking = False
-                elif chunk.type == 'message_delta':
-                    continue
-                elif chunk.type == 'message_stop':
-                    break
+            # Deltas are buffered and written in batches, thinking and response in separate regions
+            with ui.stream_renderer(markdown=CONFIG["stream_markdown"]) as renderer:
+                async for chunk in stream:
+                    if chunk.type == 'message_start':
+                        continue
+                    elif chunk.type == 'content_block_start':
+                        if hasattr(chunk.content_block, 'type'):
+                            if chunk.content_block.type == 'tool_use':
+                                renderer.note(f"\n🔧 [bold yellow]Tool Use:[/bold yellow] [cyan]{chunk.content_block.name}[/cyan]")
+                            elif chunk.content_block.type == 'thinking':
+                                renderer.begin("thinking", f"\n💭 [bold blue]Thinking:[/bold blue] ")
+                            elif chunk.content_block.type == 'text':
+                                renderer.begin("response")
+                    elif chunk.type == 'content_block_delta':
+                        if hasattr(chunk.delta, 'text') and chunk.delta.text:
+                            if renderer.region == "thinking":
+                                thinking_content.append(chunk.delta.text)
+                            else:
+                                response_content.append(chunk.delta.text)
+                            renderer.write(chunk.delta.text)
+                    elif chunk.type == 'content_block_stop':
+                        renderer.end()
+                    elif chunk.type == 'message_delta':
+                        continue
+                    elif chunk.type == 'message_stop':
+                        break
             
             # Get the final message
-            final_message = stream.get_final_message()
-            
-            # Store conversation in memory ONLY if it's valuable for future context
-            if MEMORY.is_available() and CONFIG["memory_learning"]:
-                try:
-                    assistant_response = "".join(response_content)
-                    
-                    if _should_remember_conversation(user_input, assistant_response):
-                        ui.print(f"🧠 [dim blue]Learned conversation pattern[/dim blue]")
-                        SESSION_STATS["memories_created"] += 1
-                        # Store in background thread to avoid blocking
-                        import threading
-                        def store_memory():
-                            try:
-                                conversation_messages = [
-                                    {"role": "user", "content": user_input},
-                                    {"role": "assistant", "content": assistant_response}
-                                ]
-                                MEMORY.store_conversation(conversation_messages, "sublime_chat")
-                            except Exception as e:
-                                logger.debug(f"Background memory storage failed: {e}")
-                        
-                        thread = threading.Thread(target=store_memory, daemon=True)
-                        thread.start()
-                except Exception as e:
-                    logger.debug(f"Failed to setup memory storage: {e}")
-            
-            # Check if there are tool uses that need to be handled
-            tool_uses = [block for block in final_message.content if block.type == 'tool_use']
-            
-            if tool_uses:
-                # Add the assistant message with tool uses
-                enhanced_transcript.append({
-                    "role": "assistant",
-                    "content": [block.model_dump() for block in final_message.content]
-                })
-                
-                # Process each tool use with memory context
-                tool_results = []
-                for tool_use in tool_uses:
-                    ui.print(f"\n🔧 [bold cyan]Executing:[/bold cyan] {tool_use.name}")
-                    ui.print_json(tool_use.input, f"Arguments for {tool_use.name}")
-                    
-                    # Run the tool with memory integration
-                    result = run_tool_with_memory(tool_use.name, tool_use.input, user_input)
-                    
-                    # Format result nicely
-                    try:
-                        # Try to parse as JSON for better display
-                        parsed_result = json.loads(result)
-                        ui.print_json(parsed_result, f"Result from {tool_use.name}")
-                    except:
-                        # If not JSON, just show as text
-                        ui.print_panel(result, f"Result from {tool_use.name}", "success")
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use.id,
-                        "content": result,
-                    })
-                
-                # Add tool results to transcript
-                enhanced_transcript.append({
-                    "role": "user",
-                    "content": tool_results
-                })
-                
-                ui.print("\n🔄 [bold blue]Continuing with tool results...[/bold blue]\n")
-                # Add rate limiting between recursive calls
-                import time
-                time.sleep(0.5)  # Brief pause to avoid rapid API calls
-                # Continue the conversation with tool results - this should trigger more thinking
-                return stream_once_with_memory(enhanced_transcript, user_input)
-            
-            return final_message
+            final_message = await stream.get_final_message()
             
     except Exception as e:
         ui.print_error("Stream error", str(e))
         # Fallback to non-streaming with thinking
-        response = client.messages.create(
+        final_message = await async_client.messages.create(
             model=CONFIG["model"],
             max_tokens=CONFIG["max_tokens"],
-            tools=TOOLS,
-            messages=enhanced_transcript,
+            tools=request_tools(),
+            messages=with_cache_breakpoint(compact_transcript(messages)),
             extra_headers=beta_headers(),
             thinking={"type": "enabled", "budget_tokens": CONFIG["thinking_budget"]},
         )
-        return response
+        response_content = [block.text for block in final_message.content if block.type == 'text']
+    
+    record_usage(final_message)
+    
+    with timing.measure("memory"):
+        learn_from_response(user_input, "".join(response_content))
+    
+    return final_message
+
+async def run_round_tools(tool_uses: list, user_input: str) -> List[str]:
+    """Show, execute and display the tool_use blocks of one round"""
+    # Show what is about to run, then execute the whole batch
+    for tool_use in tool_uses:
+        ui.print(f"\n🔧 [bold cyan]Executing:[/bold cyan] {tool_use.name}")
+        ui.print_json(tool_use.input, f"Arguments for {tool_use.name}")
+    
+    results = await run_tools_with_memory(tool_uses, user_input)
+    
+    for tool_use, result in zip(tool_uses, results):
+        # Large results are previewed; the API payload is untouched
+        ui.print_tool_result(result, f"Result from {tool_use.name}")
+    
+    ui.print("\n🔄 [bold blue]Continuing with tool results...[/bold blue]\n")
+    return results
+
+def report_round(timing: RoundTiming) -> None:
+    """Accumulate and show where one round's time went"""
+    bump_stat("model_time", timing.model)
+    bump_stat("tool_time", timing.tools)
+    bump_stat("memory_time", timing.memory)
+    if timing.tool_calls or timing.index > 1:
+        ui.print(f"[dim]⏱️  {timing.summary()}[/dim]")
+
+async def stream_once_with_memory_async(transcript: list[dict], user_input: str = ""):
+    """
+    Enhanced streaming with memory context injection.
+    Provides memory-aware interactions and learns from each exchange.
+    
+    Runs the tool loop within the ``max_rounds`` / ``max_turn_tokens`` budget and
+    returns the final assistant message. If the budget runs out first, the
+    rounds the turn ran are appended to ``transcript`` (closed by a short
+    assistant note, since they end on tool results) and None is returned.
+    Everything here awaits (model stream,
+    MCP tools) or runs in executors (local tools, Mem0), so several sessions
+    can share one event loop.
+    """
+    # Full transcript for this turn; compaction only shapes what is sent
+    messages = transcript.copy()
+    
+    loop = AsyncAgentLoop(
+        request_round=lambda msgs, timing: stream_round(msgs, user_input, timing),
+        run_tools=lambda tool_uses, timing: run_round_tools(tool_uses, user_input),
+        prepare=lambda msgs, timing: inject_memory_context(msgs, user_input, timing),
+        max_rounds=CONFIG["max_rounds"],
+        max_tokens=CONFIG["max_turn_tokens"],
+        on_round_end=report_round,
+    )
+    result = await loop.run(messages)
+    
+    if not result.completed:
+        limit = (f"{CONFIG['max_rounds']} rounds" if result.stop_reason == "max_rounds"
+                 else f"{CONFIG['max_turn_tokens']:,} tokens")
+        ui.print_warning(f"Stopped after {len(result.rounds)} rounds: turn budget of {limit} reached")
+        # Keep what the tools did so the next turn can pick up from there
+        transcript.extend(messages[len(transcript):])
+        transcript.append({"role": "assistant", "content": "[stopped: turn budget reached]"})
+        return None
+    
+    return result.final_message
+
+def stream_once_with_memory(transcript: list[dict], user_input: str = ""):
+    """Sync facade for the REPL: run one turn on the runtime loop and wait for it"""
+    future = submit_coroutine(stream_once_with_memory_async(transcript, user_input))
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        # Stop the in-flight request and tools instead of leaving them running
+        future.cancel()
+        raise
 
 # ────────────────────────────── 4. Enhanced Commands with Memory ──────────────────── #
 def show_tools_command():
@@ -710,7 +676,16 @@ def show_tools_command():
         stats = get_memory_stats_safe()
         memory_stats = f" | 🧠 {stats.get('total_memories', 0)} memories"
     
-    ui.print(f"\n📊 [bold]Total:[/bold] {len(TOOLS)} tools available{memory_stats}")
+    ui.print(f"\n📊 [bold]Total:[/bold] {len(request_tools())} tools available{memory_stats}")
+
+def flush_memory_writes(timeout: float = 10.0):
+    """Store queued memory writes before exiting"""
+    if not MEMORY.pending_writes():
+        MEMORY.close(timeout)
+        return
+    ui.print("🧠 [dim]Saving pending memories...[/dim]")
+    if not MEMORY.close(timeout):
+        ui.print_warning("Some memories could not be saved before exit")
 
 def show_memory_command():
     """Show memory system status and statistics"""
@@ -718,7 +693,8 @@ def show_memory_command():
         ui.print_panel(
             "❌ Memory system is not available\n"
             "Install with: pip install mem0ai\n"
-            "Add MEM0_API_KEY to your .env file",
+            "Add MEM0_API_KEY to your .env file\n"
+            "Or run offline with SUBLIME_MEMORY_BACKEND=local",
             "Memory Status",
             "error"
         )
@@ -740,8 +716,34 @@ def show_memory_command():
     for mem_type, count in memory_types.items():
         memory_info += f"• {mem_type}: {count}\n"
     
+    cache = stats.get('cache')
+    if cache:
+        memory_info += (f"\n**Read Cache:** {cache['hits']} hits · {cache['misses']} misses "
+                        f"({cache['hit_rate']:.0%} hit rate) · {cache['entries']} entries, "
+                        f"TTL {cache['ttl']:.0f}s\n")
+    
+    writer = stats.get('writer')
+    if writer:
+        memory_info += (f"\n**Write Queue:** {writer['depth']} pending (peak {writer['max_depth']}) · "
+                        f"{writer['written']} written · {writer['failed']} failed · "
+                        f"{writer['retried']} retries · {writer['dropped']} dropped · "
+                        f"avg write {writer['avg_write_latency'] * 1000:.0f}ms, "
+                        f"avg wait {writer['avg_queue_wait'] * 1000:.0f}ms\n")
+    
     ui.print_markdown(memory_info)
 
+def handle_result_command(args):
+    """Page through the full text of a previewed tool result"""
+    number = None
+    if args:
+        try:
+            number = int(args[0])
+        except ValueError:
+            ui.print_error("Usage", "/result [number]")
+            return
+    if not ui.page_tool_result(number):
+        ui.print_warning("No such tool result (only the last 20 are kept)")
+
 def show_help_command():
     """Enhanced help command with memory features"""
     commands = {
@@ -763,10 +765,18 @@ def show_help_command():
         "/config worker-model <name>": "Set worker model for execution",
         "/config thinking <1024-16000>": "Change thinking token budget",
         "/config memory <on|off>": "Toggle memory features",
+        "/config parallel-tools <on|off>": "Toggle concurrent tool execution",
+        "/config tool-workers <1-16>": "Set max concurrently running tools",
+        "/config prompt-cache <on|off>": "Toggle prompt caching of tools and conversation prefix",
+        "/config markdown <on|off>": "Render streamed responses as Markdown",
+        "/config context <tokens|messages>": "Choose token-budget compaction or last-N-messages history",
+        "/config max-rounds <1-100>": "Set max tool rounds per turn",
+        "/config memory-deadline <seconds>": "Max time a request waits for memory context",
         "/forget": "Clear ALL memories (with confirmation)",
         "/forget-type <type>": "Clear memories by type (conversation, tool_success, etc)",
         "/forget-old <days>": "Clear memories older than X days",
         "/stats": "Show detailed session statistics",
+        "/result [n]": "Page through the full output of a tool result",
         "/exit": "Exit SublimeChain"
     }
     
@@ -833,6 +843,14 @@ def show_config_command():
         "Memory Enabled": "✅ Yes" if CONFIG['memory_enabled'] else "❌ No",
         "Memory Search": "✅ Yes" if CONFIG['memory_search'] else "❌ No",
         "Memory Learning": "✅ Yes" if CONFIG['memory_learning'] else "❌ No",
+        "Memory Backend": "💾 Local (SQLite)" if MEMORY.backend == "local" else "☁️ Mem0 cloud",
+        "Parallel Tools": f"✅ Yes (max {CONFIG['max_tool_workers']} workers)" if CONFIG['parallel_tools'] else "❌ No",
+        "Prompt Caching": "✅ Yes" if CONFIG['prompt_caching'] else "❌ No",
+        "Markdown Streaming": "✅ Yes" if CONFIG['stream_markdown'] else "❌ No",
+        "Context": (f"Token budget (≤{CONFIG['history_token_budget']:,} tokens)"
+                    if CONFIG['context_strategy'] == "tokens" else "Last 15 messages"),
+        "Turn Budget": f"{CONFIG['max_rounds']} rounds / {CONFIG['max_turn_tokens']:,} tokens",
+        "Memory Deadline": f"{CONFIG['memory_deadline']:.2f}s",
         "Available Models": ", ".join(AVAILABLE_MODELS)
     }
     
@@ -845,7 +863,14 @@ def show_config_command():
         "\n💡 Other Commands:" +
         "\n   /config model <model> - Change single model" +
         "\n   /config thinking <1024-16000> - Change thinking budget" +
-        "\n   /config memory <on|off> - Toggle memory features",
+        "\n   /config memory <on|off> - Toggle memory features" +
+        "\n   /config parallel-tools <on|off> - Toggle concurrent tool execution" +
+        "\n   /config tool-workers <1-16> - Set max concurrent tools" +
+        "\n   /config prompt-cache <on|off> - Toggle prompt caching" +
+        "\n   /config markdown <on|off> - Render streamed responses as Markdown" +
+        "\n   /config context <tokens|messages> - Choose history compaction strategy" +
+        "\n   /config max-rounds <1-100> - Set max tool rounds per turn" +
+        "\n   /config memory-deadline <seconds> - Max wait for memory context",
         "SublimeChain Configuration",
         "info"
     )
@@ -960,9 +985,111 @@ def handle_config_command(args):
             ui.print_success("Memory features disabled")
         else:
             ui.print_error("Invalid option", "Use 'on' or 'off'")
+    
+    elif args[0] == "parallel-tools":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config parallel-tools <on|off>")
+            return
+        
+        if args[1].lower() in ["on", "true", "yes", "1"]:
+            CONFIG["parallel_tools"] = True
+            ui.print_success(f"Parallel tool execution enabled (max {CONFIG['max_tool_workers']} workers)")
+        elif args[1].lower() in ["off", "false", "no", "0"]:
+            CONFIG["parallel_tools"] = False
+            ui.print_success("Parallel tool execution disabled")
+        else:
+            ui.print_error("Invalid option", "Use 'on' or 'off'")
+    
+    elif args[0] == "tool-workers":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config tool-workers <1-16>")
+            return
+        
+        try:
+            workers = int(args[1])
+            if not (1 <= workers <= 16):
+                ui.print_error("Invalid worker count", "Must be between 1 and 16")
+                return
+            
+            CONFIG["max_tool_workers"] = workers
+            ui.print_success(f"Max concurrent tools changed to: {workers}")
+            
+        except ValueError:
+            ui.print_error("Invalid number", args[1])
+    
+    elif args[0] == "prompt-cache":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config prompt-cache <on|off>")
+            return
+        
+        if args[1].lower() in ["on", "true", "yes", "1"]:
+            CONFIG["prompt_caching"] = True
+            ui.print_success("Prompt caching enabled")
+        elif args[1].lower() in ["off", "false", "no", "0"]:
+            CONFIG["prompt_caching"] = False
+            ui.print_success("Prompt caching disabled")
+        else:
+            ui.print_error("Invalid option", "Use 'on' or 'off'")
+    
+    elif args[0] == "markdown":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config markdown <on|off>")
+            return
+        
+        if args[1].lower() in ["on", "true", "yes", "1"]:
+            CONFIG["stream_markdown"] = True
+            ui.print_success("Markdown streaming enabled")
+        elif args[1].lower() in ["off", "false", "no", "0"]:
+            CONFIG["stream_markdown"] = False
+            ui.print_success("Markdown streaming disabled")
+        else:
+            ui.print_error("Invalid option", "Use 'on' or 'off'")
+    
+    elif args[0] == "context":
+        if len(args) < 2 or args[1].lower() not in ["tokens", "messages"]:
+            ui.print_error("Usage", "/config context <tokens|messages>")
+            return
+        
+        CONFIG["context_strategy"] = args[1].lower()
+        get_transcript_compactor().reset()
+        ui.print_success(f"Context strategy changed to: {CONFIG['context_strategy']}")
+    
+    elif args[0] == "max-rounds":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config max-rounds <1-100>")
+            return
+        
+        try:
+            rounds = int(args[1])
+            if not (1 <= rounds <= 100):
+                ui.print_error("Invalid round limit", "Must be between 1 and 100")
+                return
+            
+            CONFIG["max_rounds"] = rounds
+            ui.print_success(f"Max tool rounds per turn changed to: {rounds}")
+            
+        except ValueError:
+            ui.print_error("Invalid number", args[1])
+    
+    elif args[0] == "memory-deadline":
+        if len(args) < 2:
+            ui.print_error("Usage", "/config memory-deadline <0-5 seconds>")
+            return
+        
+        try:
+            deadline = float(args[1])
+            if not (0 <= deadline <= 5):
+                ui.print_error("Invalid deadline", "Must be between 0 and 5 seconds")
+                return
+            
+            CONFIG["memory_deadline"] = deadline
+            ui.print_success(f"Memory deadline changed to: {deadline:.2f}s")
+            
+        except ValueError:
+            ui.print_error("Invalid number", args[1])
     else:
         ui.print_error("Unknown config option", args[0])
-        ui.print("Available options: model, multi-model, lead-model, worker-model, thinking, memory")
+        ui.print("Available options: model, multi-model, lead-model, worker-model, thinking, memory, parallel-tools, tool-workers, prompt-cache, markdown, context, max-rounds, memory-deadline")
 
 def handle_forget_command():
     """Clear memory for current session"""
@@ -1300,7 +1427,7 @@ def main():
                     handle_forget_memory_command(args)
                 elif command in ['refresh', 'reload']:
                     ui.print("🔄 Refreshing tools...")
-                    refresh_tools()
+                    run_coroutine_sync(refresh_tools())
                     ui.print_success("Tools refreshed successfully!")
                 elif command == 'status':
                     show_status_command()
@@ -1316,6 +1443,8 @@ def main():
                     handle_forget_old_command(args)
                 elif command == 'stats':
                     ui.print_session_stats(SESSION_STATS)
+                elif command == 'result':
+                    handle_result_command(args)
                 elif command in ['exit', 'quit', 'q']:
                     ui.print("👋 Thanks for using SublimeChain!")
                     break
@@ -1330,23 +1459,25 @@ def main():
                 main_input = f"/{command_input}"
                 continue
             
-            # Regular conversation
+            # Regular conversation: start the memory lookup right away so it overlaps with setup
+            prefetch_memory(user_input)
             transcript.append({"role": "user", "content": user_input})
-            SESSION_STATS["conversations"] += 1
+            bump_stat("conversations")
             
             ui.print("")  # Add some space
             
             # Stream the response with memory integration
             response = stream_once_with_memory(transcript, user_input)
             
-            # Add assistant response to transcript
+            # Add assistant response to transcript (a stopped turn has already recorded itself)
             if hasattr(response, 'content'):
                 response_text = ""
                 for block in response.content:
                     if hasattr(block, 'text'):
                         response_text += block.text
                 
-                transcript.append({"role": "assistant", "content": response_text})
+                # The API rejects an assistant message with empty content
+                transcript.append({"role": "assistant", "content": response_text or "[no text response]"})
             
             ui.print("\n")  # Add space after response
             
@@ -1356,6 +1487,9 @@ def main():
         except Exception as e:
             ui.print_error("Unexpected error", str(e))
             ui.print("Please try again or type [bold]/help[/bold] for assistance")
+    
+    # Don't lose memories that are still waiting in the write queue
+    flush_memory_writes()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -36,6 +36,9 @@ from tool_discovery import (
     refresh_tools, list_tools, initialize_tool_discovery
 )
 
+# Import the iterative agent loop
+from agent_loop import AgentLoop, RoundTiming
+
 # Import enhanced UI components
 from ui_components import ui, print_banner, print_initialization_progress, format_command_suggestions
 
@@ -47,7 +50,10 @@ load_dotenv()
 CONFIG = {
     "model": "claude-sonnet-4-20250514",  # or "claude-opus-4-20250514"
     "thinking_budget": 1024,  # 1024-16000
-    "max_tokens": 1024
+    "max_tokens": 1024,
+    "stream_markdown": False,  # Render streamed responses as Markdown, one finished block at a time
+    "max_rounds": 25,          # Upper bound on model requests (tool rounds) per question
+    "max_turn_tokens": 500000  # Upper bound on input + output tokens spent per question
 }
 
 AVAILABLE_MODELS = [
@@ -110,7 +116,7 @@ def beta_headers() -> dict[str, str]:
     """Return extra headers for every call."""
     return {"anthropic-beta": BETA_HEADERS}
 
-def run_tool(name: str, args: dict) -> str:
+def run_tool(name: str, args: dict, tool_use_id: str = None) -> str:
     """Dispatch to discovered tool function and stringify the result."""
     start_time = time.time()
     
@@ -119,7 +125,7 @@ def run_tool(name: str, args: dict) -> str:
     
     # Execute discovered tool (using sync wrapper)
     try:
-        result = execute_tool_sync(name, args)
+        result = execute_tool_sync(name, args, tool_use_id)
         duration = time.time() - start_time
         ui.print_tool_execution(name, "completed", duration)
         return result
@@ -129,12 +135,8 @@ def run_tool(name: str, args: dict) -> str:
         return f"<error>Tool {name} execution failed: {exc}</error>"
 
 # ────────────────────────────── 3. Streaming loop ────────────────────── #
-def stream_once(transcript: list[dict]) -> dict:
-    """
-    Send one request, handle tools if any, and return the final message.
-    Shows thinking process including after tool execution with enhanced UI.
-    Returns the final assistant Message object.
-    """
+def stream_round(transcript: list[dict], timing: RoundTiming):
+    """Send one streaming request and return the final assistant Message object."""
     try:
         # Create a streaming request with thinking enabled
         with client.messages.stream(
@@ -147,83 +149,34 @@ def stream_once(transcript: list[dict]) -> dict:
         ) as stream:
             
             thinking_content = []
-            in_thinking = False
             
-            # Handle the stream events
-            for chunk in stream:
-                if chunk.type == 'message_start':
-                    continue
-                elif chunk.type == 'content_block_start':
-                    if hasattr(chunk.content_block, 'type'):
-                        if chunk.content_block.type == 'tool_use':
-                            ui.print(f"\n🔧 [bold yellow]Tool Use:[/bold yellow] [cyan]{chunk.content_block.name}[/cyan]")
-                        elif chunk.content_block.type == 'thinking':
-                            ui.print(f"\n💭 [bold blue]Thinking:[/bold blue] ", end='')
-                            in_thinking = True
-                elif chunk.type == 'content_block_delta':
-                    if hasattr(chunk.delta, 'text') and chunk.delta.text:
-                        if in_thinking:
-                            ui.console.print(chunk.delta.text, end='', style="italic blue")
-                            thinking_content.append(chunk.delta.text)
-                        else:
-                            ui.console.print(chunk.delta.text, end='')
-                elif chunk.type == 'content_block_stop':
-                    if in_thinking:
-                        ui.print("")  # New line after thinking
-                        in_thinking = False
-                elif chunk.type == 'message_delta':
-                    continue
-                elif chunk.type == 'message_stop':
-                    break
+            # Deltas are buffered and written in batches, thinking and response in separate regions
+            with ui.stream_renderer(markdown=CONFIG["stream_markdown"]) as renderer:
+                for chunk in stream:
+                    if chunk.type == 'message_start':
+                        continue
+                    elif chunk.type == 'content_block_start':
+                        if hasattr(chunk.content_block, 'type'):
+                            if chunk.content_block.type == 'tool_use':
+                                renderer.note(f"\n🔧 [bold yellow]Tool Use:[/bold yellow] [cyan]{chunk.content_block.name}[/cyan]")
+                            elif chunk.content_block.type == 'thinking':
+                                renderer.begin("thinking", f"\n💭 [bold blue]Thinking:[/bold blue] ")
+                            elif chunk.content_block.type == 'text':
+                                renderer.begin("response")
+                    elif chunk.type == 'content_block_delta':
+                        if hasattr(chunk.delta, 'text') and chunk.delta.text:
+                            if renderer.region == "thinking":
+                                thinking_content.append(chunk.delta.text)
+                            renderer.write(chunk.delta.text)
+                    elif chunk.type == 'content_block_stop':
+                        renderer.end()
+                    elif chunk.type == 'message_delta':
+                        continue
+                    elif chunk.type == 'message_stop':
+                        break
             
             # Get the final message
-            final_message = stream.get_final_message()
-            
-            # Check if there are tool uses that need to be handled
-            tool_uses = [block for block in final_message.content if block.type == 'tool_use']
-            
-            if tool_uses:
-                # Add the assistant message with tool uses
-                transcript.append({
-                    "role": "assistant",
-                    "content": [block.model_dump() for block in final_message.content]
-                })
-                
-                # Process each tool use
-                tool_results = []
-                for tool_use in tool_uses:
-                    ui.print(f"\n🔧 [bold cyan]Executing:[/bold cyan] {tool_use.name}")
-                    ui.print_json(tool_use.input, f"Arguments for {tool_use.name}")
-                    
-                    # Run the tool
-                    result = run_tool(tool_use.name, tool_use.input)
-                    
-                    # Format result nicely
-                    try:
-                        # Try to parse as JSON for better display
-                        parsed_result = json.loads(result)
-                        ui.print_json(parsed_result, f"Result from {tool_use.name}")
-                    except:
-                        # If not JSON, just show as text
-                        ui.print_panel(result, f"Result from {tool_use.name}", "success")
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use.id,
-                        "content": result,
-                    })
-                
-                # Add tool results to transcript
-                transcript.append({
-                    "role": "user",
-                    "content": tool_results
-                })
-                
-                ui.print("\n🔄 [bold blue]Continuing with tool results...[/bold blue]\n")
-                # Continue the conversation with tool results - this should trigger more thinking
-                return stream_once(transcript)
-            
-            return final_message
+            return stream.get_final_message()
             
     except Exception as e:
         ui.print_error("Stream error", str(e))
@@ -238,6 +191,54 @@ def stream_once(transcript: list[dict]) -> dict:
         )
         return response
 
+def run_round_tools(tool_uses: list, timing: RoundTiming) -> list[str]:
+    """Execute and display the tool_use blocks of one round, returning results in order."""
+    results = []
+    for tool_use in tool_uses:
+        ui.print(f"\n🔧 [bold cyan]Executing:[/bold cyan] {tool_use.name}")
+        ui.print_json(tool_use.input, f"Arguments for {tool_use.name}")
+        
+        # Run the tool
+        result = run_tool(tool_use.name, tool_use.input, tool_use.id)
+        
+        # Large results are previewed; the API payload is untouched
+        ui.print_tool_result(result, f"Result from {tool_use.name}")
+        
+        results.append(result)
+    
+    ui.print("\n🔄 [bold blue]Continuing with tool results...[/bold blue]\n")
+    return results
+
+def report_round(timing: RoundTiming):
+    """Show where the time of a tool round went."""
+    if timing.tool_calls or timing.index > 1:
+        ui.print(f"[dim]⏱️  {timing.summary()}[/dim]")
+
+def stream_once(transcript: list[dict]):
+    """
+    Send requests and handle tools until Claude answers, then return the final message.
+    Shows thinking process including after tool execution with enhanced UI.
+    Tool rounds are appended to ``transcript`` and bounded by the turn budget.
+    Returns the final assistant Message object, or None if the budget ran out
+    (the rounds then end with a short assistant note in ``transcript``).
+    """
+    loop = AgentLoop(
+        request_round=stream_round,
+        run_tools=run_round_tools,
+        max_rounds=CONFIG["max_rounds"],
+        max_tokens=CONFIG["max_turn_tokens"],
+        on_round_end=report_round,
+    )
+    result = loop.run(transcript)
+    
+    if not result.completed:
+        ui.print_warning(f"Stopped after {len(result.rounds)} rounds: turn budget reached ({result.stop_reason})")
+        # The last round ends on tool results; the API needs an assistant turn with content after them
+        transcript.append({"role": "assistant", "content": "[stopped: turn budget reached]"})
+        return None
+    
+    return result.final_message
+
 # ────────────────────────────── 4. Enhanced Commands ──────────────────── #
 def show_tools_command():
     """Enhanced tools listing command"""
@@ -273,6 +274,18 @@ def show_tools_command():
     ui.print_tool_table(tools_by_category)
     ui.print(f"\n📊 [bold]Total:[/bold] {len(TOOLS)} tools available")
 
+def handle_result_command(args):
+    """Page through the full text of a previewed tool result"""
+    number = None
+    if args:
+        try:
+            number = int(args[0])
+        except ValueError:
+            ui.print_error("Usage", "/result [number]")
+            return
+    if not ui.page_tool_result(number):
+        ui.print_warning("No such tool result (only the last 20 are kept)")
+
 def show_help_command():
     """Enhanced help command"""
     commands = {
@@ -284,6 +297,7 @@ def show_help_command():
         "/config": "Show/edit configuration (model, thinking budget)",
         "/config model <name>": "Change Claude model (sonnet/opus)",
         "/config thinking <1024-16000>": "Change thinking token budget",
+        "/result [n]": "Page through the full output of a tool result",
         "/exit": "Exit the application"
     }
     
@@ -422,6 +436,8 @@ def ask(prompt: str, chat_history: list[dict]):
     ui.print(f"\n👤 [bold blue]You:[/bold blue] {prompt}")
     
     final_msg = stream_once(chat_history)
+    if final_msg is None:
+        return chat_history
     
     # Handle both dict and object responses
     if hasattr(final_msg, 'content'):
@@ -442,7 +458,8 @@ def ask(prompt: str, chat_history: list[dict]):
     ui.print_claude_response(assistant_response)
     
     # Add assistant response to history
-    chat_history.append({"role": "assistant", "content": assistant_response})
+    # The API rejects an assistant message with empty content
+    chat_history.append({"role": "assistant", "content": assistant_response or "[no text response]"})
     
     return chat_history
 
@@ -517,7 +534,7 @@ def interactive_chat():
     ]
     
     # Available commands for autocomplete (with slash prefixes)
-    command_words = ['/help', '/tools', '/refresh', '/reload', '/status', '/clear', '/config', '/exit', '/quit',
+    command_words = ['/help', '/tools', '/refresh', '/reload', '/status', '/clear', '/config', '/result', '/exit', '/quit',
                     'help', 'tools', 'refresh', 'reload', 'status', 'clear', 'debug', 'config', 'exit', 'quit']
     
     try:
@@ -556,6 +573,10 @@ def interactive_chat():
                         show_status_command()
                         continue
                     
+                    elif command == 'result':
+                        handle_result_command(args)
+                        continue
+                    
                     elif command == 'clear':
                         ui.clear_screen()
                         print_banner()
@@ -36,6 +36,9 @@ from tool_discovery import (
     refresh_tools, list_tools, initialize_tool_discovery
 )
 
+# Import the iterative agent loop
+from agent_loop import AgentLoop, RoundTiming
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -44,7 +47,9 @@ load_dotenv()
 CONFIG = {
     "model": "claude-sonnet-4-20250514",  # or "claude-opus-4-20250514"
     "thinking_budget": 1024,  # 1024-16000
-    "max_tokens": 1024
+    "max_tokens": 1024,
+    "max_rounds": 25,          # Upper bound on model requests (tool rounds) per question
+    "max_turn_tokens": 500000  # Upper bound on input + output tokens spent per question
 }
 
 AVAILABLE_MODELS = [
@@ -111,12 +116,8 @@ def run_tool(name: str, args: dict) -> str:
         return f"<error>Tool {name} execution failed: {exc}</error>"
 
 # ────────────────────────────── 3. Streaming loop ────────────────────── #
-def stream_once(transcript: list[dict]) -> dict:
-    """
-    Send one request, handle tools if any, and return the final message.
-    Shows thinking process including after tool execution.
-    Returns the final assistant Message object.
-    """
+def stream_round(transcript: list[dict], timing: RoundTiming):
+    """Send one streaming request and return the final assistant Message object."""
     try:
         # Create a streaming request with thinking enabled
         with client.messages.stream(
@@ -159,43 +160,7 @@ def stream_once(transcript: list[dict]) -> dict:
                     break
             
             # Get the final message
-            final_message = stream.get_final_message()
-            
-            # Check if there are tool uses that need to be handled
-            tool_uses = [block for block in final_message.content if block.type == 'tool_use']
-            
-            if tool_uses:
-                # Add the assistant message with tool uses
-                transcript.append({
-                    "role": "assistant",
-                    "content": [block.model_dump() for block in final_message.content]
-                })
-                
-                # Process each tool use
-                tool_results = []
-                for tool_use in tool_uses:
-                    print(f"\n[tool_use:{tool_use.name}] args → {tool_use.input}", flush=True)
-                    
-                    # Run the tool
-                    result = run_tool(tool_use.name, tool_use.input)
-                    print(f"[tool_result] {result}", flush=True)
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": tool_use.id,
-                        "content": result,
-                    })
-                
-                # Add tool results to transcript
-                transcript.append({
-                    "role": "user",
-                    "content": tool_results
-                })
-                
-                print("\n[continuing with tool results...]\n", flush=True)
-                # Continue the conversation with tool results - this should trigger more thinking
-                return stream_once(transcript)
-            
-            return final_message
+            return stream.get_final_message()
             
     except Exception as e:
         print(f"\nError in stream: {e}")
@@ -210,6 +175,50 @@ def stream_once(transcript: list[dict]) -> dict:
         )
         return response
 
+def run_round_tools(tool_uses: list, timing: RoundTiming) -> list[str]:
+    """Execute the tool_use blocks of one round, returning results in order."""
+    results = []
+    for tool_use in tool_uses:
+        print(f"\n[tool_use:{tool_use.name}] args → {tool_use.input}", flush=True)
+        
+        # Run the tool
+        result = run_tool(tool_use.name, tool_use.input)
+        print(f"[tool_result] {result}", flush=True)
+        results.append(result)
+    
+    print("\n[continuing with tool results...]\n", flush=True)
+    return results
+
+def report_round(timing: RoundTiming):
+    """Show where the time of a tool round went."""
+    if timing.tool_calls or timing.index > 1:
+        print(f"[timing] {timing.summary()}", flush=True)
+
+def stream_once(transcript: list[dict]):
+    """
+    Send requests and handle tools until Claude answers, then return the final message.
+    Shows thinking process including after tool execution.
+    Tool rounds are appended to ``transcript`` and bounded by the turn budget.
+    Returns the final assistant Message object, or None if the budget ran out
+    (the rounds then end with a short assistant note in ``transcript``).
+    """
+    loop = AgentLoop(
+        request_round=stream_round,
+        run_tools=run_round_tools,
+        max_rounds=CONFIG["max_rounds"],
+        max_tokens=CONFIG["max_turn_tokens"],
+        on_round_end=report_round,
+    )
+    result = loop.run(transcript)
+    
+    if not result.completed:
+        print(f"\n[stopped after {len(result.rounds)} rounds: turn budget reached ({result.stop_reason})]", flush=True)
+        # The last round ends on tool results; the API needs an assistant turn with content after them
+        transcript.append({"role": "assistant", "content": "[stopped: turn budget reached]"})
+        return None
+    
+    return result.final_message
+
 # Legacy function removed - no longer needed without mock tools
 
 # ────────────────────────────── 4. Driver ---------------------------------- #
@@ -223,6 +232,8 @@ def ask(prompt: str, chat_history: list[dict]):
         chat_history.append({"role": "user", "content": tool_reminder})
     
     final_msg = stream_once(chat_history)
+    if final_msg is None:
+        return chat_history
     
     # Handle both dict and object responses
     if hasattr(final_msg, 'content'):
@@ -243,7 +254,8 @@ def ask(prompt: str, chat_history: list[dict]):
     print("\n\n[assistant] " + assistant_response)
     
     # Add assistant response to history
-    chat_history.append({"role": "assistant", "content": assistant_response})
+    # The API rejects an assistant message with empty content
+    chat_history.append({"role": "assistant", "content": assistant_response or "[no text response]"})
     
     return chat_history
 
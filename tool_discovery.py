@@ -6,22 +6,26 @@ validates them against the BaseTool interface, and creates the tool registry for
 use with Claude's API.
 """
 
+import atexit
+import concurrent.futures
 import importlib
 import inspect
 import os
 import sys
 import asyncio
+import threading
 from pathlib import Path
 from typing import Dict, List, Any, Type, Optional
 import logging
 
-from tools.base import BaseTool
+from tools.base import BaseTool, current_tool_use_id
 
 # Import MCP integration (optional)
 try:
     from mcp_integration import (
         get_mcp_manager, initialize_mcp, get_mcp_tools, 
-        execute_mcp_tool, list_mcp_tools, refresh_mcp
+        execute_mcp_tool, execute_mcp_server_tool, list_mcp_tools, refresh_mcp, run_mcp_sync,
+        get_mcp_runtime
     )
     MCP_INTEGRATION_AVAILABLE = True
 except ImportError:
@@ -32,6 +36,94 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound for a single MCP tool call (sync and async paths)
+MCP_CALL_TIMEOUT = 60.0
+
+
+def normalize_description(description: str) -> str:
+    """Dedent a tool description and strip trailing spaces and runs of blank lines"""
+    lines = [line.rstrip() for line in inspect.cleandoc(description or "").splitlines()]
+    normalized = []
+    for line in lines:
+        if line or (normalized and normalized[-1]):
+            normalized.append(line)
+    return "\n".join(normalized).strip()
+
+
+class ToolRoute:
+    """Where a tool name dispatches to: a local tool class or a tool on an MCP server"""
+    
+    def __init__(self, name: str, kind: str, tool_class: Optional[Type[BaseTool]] = None,
+                 server_name: Optional[str] = None, original_name: Optional[str] = None):
+        self.name = name
+        self.kind = kind  # "local" or "mcp"
+        self.tool_class = tool_class
+        self.server_name = server_name
+        self.original_name = original_name
+    
+    @property
+    def is_local(self) -> bool:
+        return self.kind == "local"
+
+
+class ToolInstancePool:
+    """
+    Owns the lifecycle of local tool instances.
+    
+    Tools are singletons by default: the first call creates the instance and
+    runs its ``setup`` hook, later calls reuse it, and ``close`` runs when the
+    pool is reset or shut down. Tools with ``reuse_instance = False`` get a
+    fresh instance per call that is closed as soon as the call finishes.
+    """
+    
+    def __init__(self):
+        self._instances: Dict[str, BaseTool] = {}
+        self._ready: set = set()
+        self._lock = threading.Lock()
+    
+    def seed(self, tool_name: str, instance: BaseTool):
+        """Adopt an instance created during discovery so it is not built twice"""
+        if instance.reuse_instance:
+            with self._lock:
+                self._instances.setdefault(tool_name, instance)
+    
+    def acquire(self, tool_name: str, tool_class: Type[BaseTool]) -> BaseTool:
+        """Get a ready-to-use instance of a tool"""
+        if not getattr(tool_class, 'reuse_instance', True):
+            instance = tool_class()
+            instance.setup()
+            return instance
+        
+        with self._lock:
+            instance = self._instances.get(tool_name)
+            if instance is None or type(instance) is not tool_class:
+                instance = tool_class()
+                self._instances[tool_name] = instance
+            if tool_name not in self._ready:
+                instance.setup()
+                self._ready.add(tool_name)
+            return instance
+    
+    def release(self, instance: BaseTool):
+        """Finish a call; per-call instances are closed here"""
+        if not instance.reuse_instance:
+            self._close(instance)
+    
+    def reset(self):
+        """Close every pooled instance (used when tools are re-discovered)"""
+        with self._lock:
+            instances = [self._instances[name] for name in self._ready if name in self._instances]
+            self._instances = {}
+            self._ready = set()
+        for instance in instances:
+            self._close(instance)
+    
+    def _close(self, instance: BaseTool):
+        try:
+            instance.close()
+        except Exception as e:
+            logger.error(f"Error closing tool {instance.__class__.__name__}: {e}")
+
 
 class ToolDiscovery:
     """Discovers and manages tools from the tools directory and MCP servers"""
@@ -42,6 +134,14 @@ class ToolDiscovery:
         self.tool_registry: Dict[str, Any] = {}
         self.mcp_tools: List[Dict[str, Any]] = []
         self.mcp_initialized = False
+        # Single routing table used by every dispatch path (tool name -> ToolRoute)
+        self.routes: Dict[str, ToolRoute] = {}
+        self.instance_pool = ToolInstancePool()
+        # Instances built while validating, reused for the registry and pool
+        self._discovered_instances: Dict[str, BaseTool] = {}
+        # Serialized tools payload, rebuilt only when the routing table changes
+        self._claude_tools: Optional[List[Dict[str, Any]]] = None
+        self._cacheable_claude_tools: List[Dict[str, Any]] = []
         
     def discover_tools(self) -> Dict[str, Type[BaseTool]]:
         """
@@ -51,6 +151,8 @@ class ToolDiscovery:
             Dict mapping tool names to tool classes
         """
         self.discovered_tools.clear()
+        self._discovered_instances.clear()
+        self.instance_pool.reset()
         
         if not self.tools_dir.exists():
             logger.debug(f"Tools directory {self.tools_dir} does not exist")
@@ -82,10 +184,11 @@ class ToolDiscovery:
                         issubclass(obj, BaseTool) and 
                         obj.__module__ == module_name):
                         
-                        # Validate the tool
-                        if self._validate_tool(obj):
-                            tool_instance = obj()
+                        # Validate the tool (one instance serves validation, registry and pool)
+                        tool_instance = self._instantiate_tool(obj)
+                        if tool_instance is not None and self._validate_tool(obj, tool_instance):
                             self.discovered_tools[tool_instance.name] = obj
+                            self._discovered_instances[tool_instance.name] = tool_instance
                             logger.info(f"Discovered tool: {tool_instance.name}")
                         else:
                             logger.debug(f"Tool {name} failed validation")
@@ -96,19 +199,29 @@ class ToolDiscovery:
         logger.info(f"Discovered {len(self.discovered_tools)} tools")
         return self.discovered_tools
     
-    def _validate_tool(self, tool_class: Type[BaseTool]) -> bool:
+    def _instantiate_tool(self, tool_class: Type[BaseTool]) -> Optional[BaseTool]:
+        """Create a tool instance for discovery, or None if the constructor fails"""
+        try:
+            return tool_class()
+        except Exception as e:
+            logger.error(f"Error validating tool {tool_class.__name__}: {e}")
+            return None
+    
+    def _validate_tool(self, tool_class: Type[BaseTool], tool_instance: Optional[BaseTool] = None) -> bool:
         """
         Validate that a tool class properly implements the BaseTool interface
         
         Args:
             tool_class: The tool class to validate
+            tool_instance: Already-created instance to inspect (optional)
             
         Returns:
             True if valid, False otherwise
         """
         try:
             # Try to instantiate the tool
-            tool_instance = tool_class()
+            if tool_instance is None:
+                tool_instance = tool_class()
             
             # Check required properties exist and are not None
             if not hasattr(tool_instance, 'name') or not tool_instance.name:
@@ -161,7 +274,8 @@ class ToolDiscovery:
         
         for tool_name, tool_class in self.discovered_tools.items():
             try:
-                tool_instance = tool_class()
+                tool_instance = self._discovered_instances.get(tool_name) or tool_class()
+                self.instance_pool.seed(tool_name, tool_instance)
                 self.tool_registry[tool_name] = {
                     'name': tool_instance.name,
                     'description': tool_instance.description,
@@ -170,9 +284,77 @@ class ToolDiscovery:
                 }
             except Exception as e:
                 logger.error(f"Error creating registry entry for {tool_name}: {e}")
-                
+        
+        self._index_local_tools()
         return self.tool_registry
     
+    def _index_local_tools(self):
+        """Replace the local entries of the routing table with the current registry"""
+        routes = {
+            tool_name: ToolRoute(tool_name, "local", tool_class=tool_info['class'])
+            for tool_name, tool_info in self.tool_registry.items()
+        }
+        # Local tools win over MCP tools with the same name
+        for tool_name, route in self.routes.items():
+            if not route.is_local and tool_name not in routes:
+                routes[tool_name] = route
+        self.routes = routes
+        self._invalidate_claude_tools()
+    
+    def _index_mcp_tools(self, server_name: Optional[str] = None):
+        """
+        Update the MCP entries of the routing table.
+        
+        With ``server_name`` only that server's routes are replaced; otherwise
+        all MCP routes are rebuilt from the MCP manager.
+        """
+        if not MCP_INTEGRATION_AVAILABLE:
+            return
+        
+        manager = get_mcp_manager()
+        if server_name is None:
+            routes = {name: route for name, route in self.routes.items() if route.is_local}
+            mcp_tools = manager.mcp_tools
+        else:
+            routes = {name: route for name, route in self.routes.items()
+                      if route.is_local or route.server_name != server_name}
+            mcp_tools = manager.get_server_tools(server_name)
+        
+        for tool in mcp_tools:
+            if tool.name not in routes:
+                routes[tool.name] = ToolRoute(
+                    tool.name, "mcp", server_name=tool.server_name, original_name=tool.original_name
+                )
+        # Swap in a new dict so concurrent lookups never see a partial update
+        self.routes = routes
+        self._invalidate_claude_tools()
+    
+    def resolve(self, tool_name: str) -> Optional[ToolRoute]:
+        """Look up where a tool name dispatches to"""
+        return self.routes.get(tool_name)
+    
+    def execute_local_tool(self, route: ToolRoute, tool_input: Dict[str, Any],
+                           tool_use_id: Optional[str] = None) -> str:
+        """Run a local tool and stringify its result; the tool can read ``tool_use_id`` from ``current_tool_use_id``"""
+        try:
+            tool_instance = self.instance_pool.acquire(route.name, route.tool_class)
+            token = current_tool_use_id.set(tool_use_id)
+            try:
+                result = tool_instance.execute(**tool_input)
+            finally:
+                current_tool_use_id.reset(token)
+                self.instance_pool.release(tool_instance)
+            
+            # Ensure result is a string
+            if not isinstance(result, str):
+                result = str(result)
+                
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error executing local tool {route.name}: {e}")
+            return f"Error executing local tool {route.name}: {str(e)}"
+    
     async def initialize_mcp(self) -> int:
         """Initialize MCP integration"""
         if not MCP_INTEGRATION_AVAILABLE:
@@ -180,8 +362,10 @@ class ToolDiscovery:
             return 0
         
         try:
+            get_mcp_manager().add_tools_changed_listener(self._on_mcp_tools_changed)
             mcp_tool_count = await initialize_mcp()
             self.mcp_tools = get_mcp_tools()
+            self._index_mcp_tools()
             self.mcp_initialized = True
             logger.info(f"Initialized MCP integration with {mcp_tool_count} tools")
             return mcp_tool_count
@@ -189,69 +373,96 @@ class ToolDiscovery:
             logger.error(f"Failed to initialize MCP: {e}")
             return 0
     
-    def get_claude_tools(self) -> List[Dict[str, Any]]:
+    def _on_mcp_tools_changed(self, server_name: str):
+        """Pick up MCP schemas revalidated after a server connected"""
+        self.mcp_tools = get_mcp_tools()
+        self._index_mcp_tools(server_name)
+        logger.info(f"MCP tools updated after {server_name} revalidated its schemas")
+    
+    def get_claude_tools(self, cacheable: bool = False) -> List[Dict[str, Any]]:
         """
         Get tools in the format expected by Claude's Messages API
         
+        The payload is built once per registry change with tools sorted by name
+        and descriptions whitespace-normalized, so consecutive requests send
+        byte-identical tool definitions. Callers must not mutate the result.
+        
+        Args:
+            cacheable: Mark the last tool with a prompt cache breakpoint so the
+                whole tools block is cached
+        
         Returns:
             List of tool definitions for Claude API (local + MCP tools)
         """
-        claude_tools = []
+        if self._claude_tools is None:
+            self._build_claude_tools()
+        return self._cacheable_claude_tools if cacheable else self._claude_tools
+    
+    def _build_claude_tools(self):
+        """Build the canonical tools payload (and its cache-marked variant)"""
+        definitions: Dict[str, Dict[str, Any]] = {}
         
         # Add local tools
         for tool_name, tool_info in self.tool_registry.items():
-            claude_tool = {
+            definitions[tool_name] = {
                 'name': tool_info['name'],
-                'description': tool_info['description'],
+                'description': normalize_description(tool_info['description']),
                 'input_schema': tool_info['input_schema']
             }
-            claude_tools.append(claude_tool)
         
-        # Add MCP tools
-        claude_tools.extend(self.mcp_tools)
-            
-        return claude_tools
+        # Add MCP tools (a local tool with the same name wins, as in routing)
+        for mcp_tool in self.mcp_tools:
+            if mcp_tool['name'] not in definitions:
+                definitions[mcp_tool['name']] = {
+                    **mcp_tool,
+                    'description': normalize_description(mcp_tool.get('description', ''))
+                }
+        
+        claude_tools = [definitions[name] for name in sorted(definitions)]
+        cacheable_tools = list(claude_tools)
+        if cacheable_tools:
+            cacheable_tools[-1] = {**cacheable_tools[-1], 'cache_control': {'type': 'ephemeral'}}
+        
+        self._cacheable_claude_tools = cacheable_tools
+        self._claude_tools = claude_tools
     
-    async def execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
+    def _invalidate_claude_tools(self):
+        """Drop the cached tools payload after the registry changed"""
+        self._claude_tools = None
+    
+    async def execute_tool(self, tool_name: str, tool_input: Dict[str, Any],
+                           tool_use_id: Optional[str] = None) -> str:
         """
         Execute a discovered tool with the given input (local or MCP)
         
         Args:
             tool_name: Name of the tool to execute
             tool_input: Input parameters for the tool
+            tool_use_id: Id of the tool_use block being answered, if any
             
         Returns:
             Tool execution result as string
         """
-        # Try local tools first
-        if tool_name in self.tool_registry:
-            try:
-                tool_class = self.tool_registry[tool_name]['class']
-                tool_instance = tool_class()
-                result = tool_instance.execute(**tool_input)
-                
-                # Ensure result is a string
-                if not isinstance(result, str):
-                    result = str(result)
-                    
-                return result
-                
-            except Exception as e:
-                logger.error(f"Error executing local tool {tool_name}: {e}")
-                return f"Error executing local tool {tool_name}: {str(e)}"
+        route = self.routes.get(tool_name)
+        if route is None:
+            return f"Error: Tool '{tool_name}' not found in local or MCP registries"
         
-        # Try MCP tools
-        if self.mcp_initialized and MCP_INTEGRATION_AVAILABLE:
-            try:
-                mcp_tool_names = list_mcp_tools()
-                if tool_name in mcp_tool_names:
-                    result = await execute_mcp_tool(tool_name, tool_input)
-                    return result
-            except Exception as e:
-                logger.error(f"Error executing MCP tool {tool_name}: {e}")
-                return f"Error executing MCP tool {tool_name}: {str(e)}"
+        if route.is_local:
+            # Local tools block; run them off the caller's event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.execute_local_tool, route, tool_input, tool_use_id)
         
-        return f"Error: Tool '{tool_name}' not found in local or MCP registries"
+        try:
+            return await asyncio.wait_for(
+                execute_mcp_server_tool(route.server_name, route.original_name, tool_input),
+                timeout=MCP_CALL_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"MCP tool {tool_name} timed out after {MCP_CALL_TIMEOUT:.0f}s")
+            return f"Error executing MCP tool {tool_name}: timed out after {MCP_CALL_TIMEOUT:.0f}s"
+        except Exception as e:
+            logger.error(f"Error executing MCP tool {tool_name}: {e}")
+            return f"Error executing MCP tool {tool_name}: {str(e)}"
     
     async def refresh_tools(self) -> int:
         """
@@ -270,6 +481,7 @@ class ToolDiscovery:
             try:
                 mcp_count = await refresh_mcp()
                 self.mcp_tools = get_mcp_tools()
+                self._index_mcp_tools()
             except Exception as e:
                 logger.error(f"Error refreshing MCP tools: {e}")
         
@@ -283,16 +495,7 @@ class ToolDiscovery:
         Returns:
             List of tool names
         """
-        local_tools = list(self.discovered_tools.keys())
-        mcp_tool_names = []
-        
-        if MCP_INTEGRATION_AVAILABLE and self.mcp_initialized:
-            try:
-                mcp_tool_names = list_mcp_tools()
-            except Exception as e:
-                logger.error(f"Error listing MCP tools: {e}")
-        
-        return local_tools + mcp_tool_names
+        return list(self.routes)
     
     def get_tool_info(self, tool_name: str) -> Dict[str, Any]:
         """
@@ -304,10 +507,14 @@ class ToolDiscovery:
         Returns:
             Tool information dictionary
         """
-        if tool_name not in self.tool_registry:
+        route = self.routes.get(tool_name)
+        if route is None:
             return {}
-            
-        return self.tool_registry[tool_name]
+        
+        if route.is_local:
+            return self.tool_registry.get(tool_name, {})
+        
+        return get_mcp_manager().get_tool_info(tool_name) or {}
 
 
 # Global instance for easy access
@@ -322,6 +529,13 @@ def get_tool_discovery() -> ToolDiscovery:
         _tool_discovery.create_tool_registry()
     return _tool_discovery
 
+def close_tools():
+    """Run the close hook of every pooled tool instance"""
+    if _tool_discovery is not None:
+        _tool_discovery.instance_pool.reset()
+
+atexit.register(close_tools)
+
 async def initialize_tool_discovery() -> int:
     """Initialize tool discovery including MCP integration"""
     discovery = get_tool_discovery()
@@ -337,76 +551,57 @@ async def refresh_tools() -> int:
     """Refresh the global tool discovery"""
     return await get_tool_discovery().refresh_tools()
 
-def get_claude_tools() -> List[Dict[str, Any]]:
+def get_claude_tools(cacheable: bool = False) -> List[Dict[str, Any]]:
     """Get all tools in Claude API format"""
-    return get_tool_discovery().get_claude_tools()
+    return get_tool_discovery().get_claude_tools(cacheable)
 
-async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> str:
+async def execute_tool(tool_name: str, tool_input: Dict[str, Any], tool_use_id: Optional[str] = None) -> str:
     """Execute a tool by name (async to support MCP tools)"""
-    return await get_tool_discovery().execute_tool(tool_name, tool_input)
+    return await get_tool_discovery().execute_tool(tool_name, tool_input, tool_use_id)
 
 def list_tools() -> List[str]:
     """List all available tool names"""
     return get_tool_discovery().list_tools()
 
 # Synchronous wrapper for backward compatibility
-def execute_tool_sync(tool_name: str, tool_input: Dict[str, Any]) -> str:
+def execute_tool_sync(tool_name: str, tool_input: Dict[str, Any], tool_use_id: Optional[str] = None) -> str:
     """Execute a tool by name (synchronous wrapper for legacy support)"""
     discovery = get_tool_discovery()
+    route = discovery.resolve(tool_name)
     
-    # Try local tools first (these are synchronous)
-    if tool_name in discovery.tool_registry:
-        try:
-            tool_class = discovery.tool_registry[tool_name]['class']
-            tool_instance = tool_class()
-            result = tool_instance.execute(**tool_input)
-            
-            # Ensure result is a string
-            if not isinstance(result, str):
-                result = str(result)
-                
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error executing local tool {tool_name}: {e}")
-            return f"Error executing local tool {tool_name}: {str(e)}"
+    if route is None:
+        return f"Error: Tool '{tool_name}' not found in local or MCP registries"
     
-    # For MCP tools, we need to run in an event loop
-    if discovery.mcp_initialized and MCP_INTEGRATION_AVAILABLE:
-        try:
-            mcp_tool_names = list_mcp_tools()
-            if tool_name in mcp_tool_names:
-                # Proper event loop handling for MCP tools
-                try:
-                    # Try to get the current event loop
-                    loop = asyncio.get_running_loop()
-                    # If we're in an async context, we can't use asyncio.run
-                    raise RuntimeError("Cannot use asyncio.run from within an event loop")
-                except RuntimeError:
-                    # No event loop running or we're in one - use asyncio.run
-                    try:
-                        return asyncio.run(execute_mcp_tool(tool_name, tool_input))
-                    except RuntimeError as e:
-                        if "cannot be called from a running event loop" in str(e):
-                            # We're in an async context, use ThreadPoolExecutor
-                            import concurrent.futures
-                            import threading
-                            
-                            def run_in_new_loop():
-                                new_loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(new_loop)
-                                try:
-                                    return new_loop.run_until_complete(execute_mcp_tool(tool_name, tool_input))
-                                finally:
-                                    new_loop.close()
-                            
-                            with concurrent.futures.ThreadPoolExecutor() as executor:
-                                future = executor.submit(run_in_new_loop)
-                                return future.result(timeout=30)  # 30 second timeout
-                        else:
-                            raise e
-        except Exception as e:
-            logger.error(f"Error executing MCP tool {tool_name}: {e}")
-            return f"Error executing MCP tool {tool_name}: {str(e)}"
+    # Local tools are synchronous
+    if route.is_local:
+        return discovery.execute_local_tool(route, tool_input, tool_use_id)
     
-    return f"Error: Tool '{tool_name}' not found in local or MCP registries"
\ No newline at end of file
+    # MCP tools run on the MCP runtime loop that owns their sessions
+    try:
+        return run_mcp_sync(
+            execute_mcp_server_tool(route.server_name, route.original_name, tool_input),
+            timeout=MCP_CALL_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"Error executing MCP tool {tool_name}: {e}")
+        return f"Error executing MCP tool {tool_name}: {str(e)}"
+
+def submit_coroutine(coro) -> concurrent.futures.Future:
+    """
+    Start a coroutine on the shared MCP loop and return its future.
+    
+    Lets sync callers wait on long-running async work (and cancel it, e.g. on
+    Ctrl-C) while tool calls inside it await MCP sessions on the same loop.
+    """
+    if MCP_INTEGRATION_AVAILABLE:
+        return get_mcp_runtime().submit(coro)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(asyncio.run, coro)
+    executor.shutdown(wait=False)
+    return future
+
+def run_coroutine_sync(coro, timeout: Optional[float] = None) -> Any:
+    """Run a tool discovery coroutine from sync code on the shared MCP loop"""
+    if MCP_INTEGRATION_AVAILABLE:
+        return run_mcp_sync(coro, timeout)
+    return asyncio.run(coro)
@@ -1,7 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Dict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Id of the tool_use block being executed, set by the dispatcher around execute()
+current_tool_use_id: ContextVar[Optional[str]] = ContextVar("current_tool_use_id", default=None)
 
 class BaseTool(ABC):
+    # One shared instance serves every call by default. Tools that keep
+    # per-call state should set this to False to get a fresh instance per call.
+    reuse_instance: bool = True
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -23,4 +31,12 @@ class BaseTool(ABC):
     @abstractmethod
     def execute(self, **kwargs) -> str:
         """Execute the tool with given parameters"""
-        pass
\ No newline at end of file
+        pass
+
+    def setup(self) -> None:
+        """Acquire clients or sessions before the first execute call (optional)"""
+        pass
+
+    def close(self) -> None:
+        """Release anything acquired in setup (optional)"""
+        pass
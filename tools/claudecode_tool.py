@@ -90,8 +90,12 @@ class ClaudeCodeTool(BaseTool):
     }
     
     def __init__(self):
-        self.memory = get_memory_manager() if MEMORY_AVAILABLE else None
+        self.memory = None
         self.coding_patterns = {}
+    
+    def setup(self) -> None:
+        """Resolve the memory manager once for the pooled instance"""
+        self.memory = get_memory_manager() if MEMORY_AVAILABLE else None
         
     def execute(self, **kwargs) -> str:
         """Execute Claude Code with memory-enhanced context"""
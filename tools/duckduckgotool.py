@@ -1,4 +1,5 @@
 from tools.base import BaseTool
+from http_client import BROWSER_HEADERS, http_get
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import quote_plus
@@ -38,12 +39,10 @@ class DuckduckgoTool(BaseTool):
         num_results = kwargs.get("num_results", 8)
 
         url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
+        
         try:
-            response = requests.get(url, headers=headers)
+            # Repeating a search within a few minutes reuses the cached results page
+            response = http_get(url, headers=BROWSER_HEADERS, ttl=300)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
             
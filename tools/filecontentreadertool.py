@@ -1,7 +1,14 @@
-from tools.base import BaseTool
+from tools.base import BaseTool, current_tool_use_id
+from workspace_index import get_read_cache, get_workspace_index
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import codecs
+import hashlib
+import mmap
 import os
 import json
 import mimetypes
+import threading
 
 class FileContentReaderTool(BaseTool):
     name = "filecontentreadertool"
@@ -10,8 +17,33 @@ class FileContentReaderTool(BaseTool):
     Accepts a list of file paths and returns a dictionary with file paths as keys
     and their content as values.
     Handles file reading errors gracefully with built-in Python exceptions.
-    When given a directory, recursively reads all text files while skipping binaries and common ignore patterns.
+    When given a directory, recursively reads all text files while skipping binaries, common ignore patterns
+    and anything excluded by .gitignore/.ignore files, shallowest files first. Use "glob" (e.g. "**/*.py") to
+    read only matching files, and "list_only" to get each file's size, type and line count without reading it.
+    Output is capped per file (max_file_bytes) and in total (max_total_bytes); when anything is truncated,
+    skipped or left unread, a "_manifest" entry lists it so you can request those files directly.
+    Files you already read in this session can be re-requested with skip_unchanged to get a short
+    "unchanged since tool_use ..." note instead of their content when they have not changed.
+    For large files, pass start_line/end_line (1-based, inclusive) or start_byte/end_byte to read only
+    that part of each listed file, e.g. lines 5000-5200 of a big log.
     '''
+
+    # Byte budgets for one call
+    DEFAULT_MAX_FILE_BYTES = 100_000
+    DEFAULT_MAX_TOTAL_BYTES = 1_000_000
+    # Reader threads, and how many reads may be queued ahead of the walk
+    READ_WORKERS = 8
+    MAX_IN_FLIGHT = 32
+    # Entries kept per manifest list; the counts always cover everything
+    MANIFEST_LIMIT = 100
+    # application/* mimetypes that are text
+    TEXT_MIME_SUFFIXES = ('json', 'xml', 'javascript', 'yaml', 'toml', 'x-sh')
+    # Files described by one list_only call
+    MAX_LISTED_FILES = 2000
+    # Leading bytes checked for NUL bytes and invalid UTF-8 before a file is read
+    SNIFF_BYTES = 8192
+    # Block size for counting newlines when seeking to a line in a mapped file
+    LINE_SCAN_BYTES = 1 << 20
     
     # Files and directories to ignore
     IGNORE_PATTERNS = {
@@ -48,90 +80,395 @@ class FileContentReaderTool(BaseTool):
                     "type": "string"
                 },
                 "description": "List of file paths to read"
+            },
+            "max_file_bytes": {
+                "type": "integer",
+                "description": "Bytes read per file before it is truncated (default 100000)"
+            },
+            "max_total_bytes": {
+                "type": "integer",
+                "description": "Bytes read across all files; reading stops once it is spent (default 1000000)"
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "First line to return (1-based) from each file path; not applied to directories"
+            },
+            "end_line": {
+                "type": "integer",
+                "description": "Last line to return (inclusive); defaults to the end of the file"
+            },
+            "start_byte": {
+                "type": "integer",
+                "description": "Byte offset to start reading each file path at; not applied to directories"
+            },
+            "end_byte": {
+                "type": "integer",
+                "description": "Byte offset to stop reading at (exclusive); defaults to the end of the file"
+            },
+            "glob": {
+                "type": "string",
+                "description": "Only read files under the given directories whose relative path matches, e.g. src/**/*.ts"
+            },
+            "skip_unchanged": {
+                "type": "boolean",
+                "description": "For files whose full content you already received this session and that have not changed, return an 'Unchanged since tool_use ...' note instead of the content"
+            },
+            "list_only": {
+                "type": "boolean",
+                "description": "List files with their size, type and line count (when known) instead of reading them"
             }
         },
         "required": ["file_paths"]
     }
 
-    def _should_skip(self, path: str) -> bool:
-        """Determine if a file or directory should be skipped."""
-        name = os.path.basename(path)
+    def __init__(self):
+        self.index = get_workspace_index()
+        self.reads = get_read_cache()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """The lazily created reader pool, shared by concurrent calls"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.READ_WORKERS, thread_name_prefix="file-read")
+            return self._pool
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def _is_ignored(self, name: str) -> bool:
+        """Whether a file or directory name matches the ignore patterns or is hidden"""
         ext = os.path.splitext(name)[1].lower()
+        return name in self.IGNORE_PATTERNS or ext in self.IGNORE_PATTERNS or name.startswith('.')
 
-        # Skip if name or extension matches ignore patterns
-        if name in self.IGNORE_PATTERNS or ext in self.IGNORE_PATTERNS:
-            return True
+    def _is_binary_type(self, path: str) -> bool:
+        """Whether a file's mimetype says it is not text"""
+        mime_type, _ = mimetypes.guess_type(path)
+        if not mime_type or mime_type.startswith('text/'):
+            return False
+        # JSON, XML and scripts are text under application/; the content sniff catches the rest
+        return not mime_type.endswith(self.TEXT_MIME_SUFFIXES)
 
-        # Skip hidden files/directories (starting with .)
-        if name.startswith('.'):
+    def _should_skip(self, path: str) -> bool:
+        """Determine if a file or directory should be skipped."""
+        if self._is_ignored(os.path.basename(path)):
             return True
-
         # If it's a file, check if it's binary using mimetype
-        if os.path.isfile(path):
-            mime_type, _ = mimetypes.guess_type(path)
-            if mime_type and not mime_type.startswith('text/'):
-                return True
+        return os.path.isfile(path) and self._is_binary_type(path)
 
+    def _looks_binary(self, sample: bytes) -> bool:
+        """Whether a file's leading bytes hold a NUL byte or invalid UTF-8"""
+        if b'\0' in sample:
+            return True
+        try:
+            # Non-final, so a character cut off by the end of the sample is not an error
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        except UnicodeDecodeError:
+            return True
         return False
 
-    def _read_file(self, file_path: str) -> str:
-        """Safely read a file and handle errors."""
-        try:
-            if not os.path.exists(file_path):
-                return "Error: File not found"
+    def _skip_lines(self, mm: mmap.mmap, pos: int, count: int) -> int:
+        """Offset just past the ``count``-th newline from ``pos`` (the end of the file if it has fewer)"""
+        size = len(mm)
+        while count > 0 and pos < size:
+            block = mm[pos:pos + self.LINE_SCAN_BYTES]
+            newlines = block.count(b'\n')
+            if newlines < count:
+                count -= newlines
+                pos += len(block)
+                continue
+            index = -1
+            for _ in range(count):
+                index = block.find(b'\n', index + 1)
+            return pos + index + 1
+        return pos if count == 0 else size
 
-            if self._should_skip(file_path):
-                return "Skipped: Binary or ignored file type"
+    def _read_span(self, file, limit: int, selection: dict) -> tuple:
+        """
+        Map the file and slice out the selected lines or bytes, so only the
+        pages covering the selection are read. Returns (data, truncated,
+        at EOF, span), or all None when the leading bytes look binary.
+        """
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return b'', False, True, {"size": 0, "start_byte": 0, "end_byte": 0}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if self._looks_binary(mm[:self.SNIFF_BYTES]):
+                return None, None, None, None
+            if selection.get("start_line") or selection.get("end_line"):
+                first = selection.get("start_line") or 1
+                start = self._skip_lines(mm, 0, first - 1)
+                last = selection.get("end_line")
+                end = self._skip_lines(mm, start, last - first + 1) if last else size
+            else:
+                start = min(selection.get("start_byte") or 0, size)
+                end = selection.get("end_byte")
+                end = size if end is None else max(start, min(end, size))
+                # Step off UTF-8 continuation bytes so decoding starts on a character
+                while start < end and mm[start] & 0xC0 == 0x80:
+                    start += 1
+            stop = min(end, start + limit)
+            data = mm[start:stop]
+        return data, end > stop, stop == size, {"size": size, "start_byte": start, "end_byte": stop}
+
+    def _should_skip_named(self, path: str) -> bool:
+        """
+        Whether a file named directly in file_paths should be skipped.
+        Extensions on the ignore list are what a directory walk leaves out;
+        a file asked for by name (a .log, say) is read unless it is hidden,
+        ignored by name, or its content or mimetype is binary.
+        """
+        name = os.path.basename(path)
+        return name in self.IGNORE_PATTERNS or name.startswith('.') or self._is_binary_type(path)
 
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+    def _read_file(self, file_path: str, limit: int, selection: dict = None) -> tuple:
+        """
+        Safely read up to ``limit`` bytes of a file, or of the selected
+        range of it. Returns (content, bytes read, truncated, span, digest);
+        content is None when the leading bytes look binary, span describes a
+        ranged read and digest is set only for a whole-file read.
+        """
+        try:
+            with open(file_path, 'rb') as file:
+                if selection:
+                    data, truncated, at_eof, span = self._read_span(file, limit, selection)
+                    if data is None:
+                        return None, 0, False, None, None
+                else:
+                    sample = file.read(min(self.SNIFF_BYTES, limit + 1))
+                    if self._looks_binary(sample):
+                        return None, 0, False, None, None
+                    data = sample + file.read(limit + 1 - len(sample))
+                    at_eof = len(data) <= limit
+                    truncated = not at_eof
+                    data = data[:limit]
+                    span = None
+            # Data cut before EOF can end inside a multi-byte character; a non-final decode holds it back
+            content = codecs.getincrementaldecoder('utf-8')().decode(data, final=at_eof)
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest() if at_eof and not span else None
+            return content.replace('\r\n', '\n').replace('\r', '\n'), len(data), truncated, span, digest
 
         except PermissionError:
-            return "Error: Permission denied"
+            return "Error: Permission denied", 0, False, None, None
         except IsADirectoryError:
-            return "Error: Path is a directory"
+            return "Error: Path is a directory", 0, False, None, None
         except UnicodeDecodeError:
-            return "Error: Unable to decode file (likely binary)"
+            return "Error: Unable to decode file (likely binary)", 0, False, None, None
         except Exception as e:
-            return f"Error: {str(e)}"
+            return f"Error: {str(e)}", 0, False, None, None
 
-    def _read_directory(self, dir_path: str) -> dict:
-        """Recursively read all files in a directory."""
-        results = {}
-
-        try:
-            for root, dirs, files in os.walk(dir_path):
-                # Filter out directories to skip
-                dirs[:] = [d for d in dirs if not self._should_skip(os.path.join(root, d))]
+    def _walk_ignore(self, name: str, path: str, is_dir: bool):
+        """Why a directory walk leaves an entry out, beyond the ignore files (None to keep it)"""
+        if self._is_ignored(name):
+            return "ignored"
+        if not is_dir and self._is_binary_type(path):
+            return "binary"
+        return None
 
-                # Process files
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if not self._should_skip(file_path):
-                        content = self._read_file(file_path)
-                        results[file_path] = content
+    def _iter_targets(self, file_paths: list, results: dict, skipped: list, pattern: str = None):
+        """
+        Yield ``(path, info, explicit)`` for every file to read, ``info``
+        being its workspace index entry and ``explicit`` marking paths given
+        directly rather than found in a directory (directories are walked
+        shallowest first, so a spent budget cuts off the deepest files);
+        answers other paths in ``results`` directly.
+        """
+        for path in file_paths:
+            if os.path.isdir(path):
+                root = os.path.abspath(path)
+                try:
+                    if pattern:
+                        infos = self.index.glob(root, pattern, self._walk_ignore)
+                    else:
+                        infos = self.index.walk(root, self._walk_ignore, skipped)
+                    for info in infos:
+                        # Keys keep the form the directory was given in
+                        yield os.path.join(path, info.path[len(root) + 1:]), info, False
+                except OSError as e:
+                    results[path] = f"Error reading directory: {str(e)}"
+            elif not os.path.exists(path):
+                results[path] = "Error: File not found"
+            elif self._should_skip_named(path):
+                results[path] = "Skipped: Binary or ignored file type"
+            else:
+                try:
+                    yield path, self.index.file_info(path), True
+                except OSError as e:
+                    results[path] = f"Error: {str(e)}"
 
-        except Exception as e:
-            results[dir_path] = f"Error reading directory: {str(e)}"
-
-        return results
+    def _list_files(self, file_paths: list, pattern: str = None) -> str:
+        """The list_only answer: index metadata for every file the call would read"""
+        results = {}
+        skipped = []
+        listed = 0
+        for path, info, _ in self._iter_targets(file_paths, results, skipped, pattern):
+            if listed >= self.MAX_LISTED_FILES:
+                results["_manifest"] = {"listed": listed, "stopped_at": path,
+                                        "note": "Listing capped; narrow it with glob or a subdirectory"}
+                return json.dumps(results, indent=2)
+            results[path] = info.to_dict()
+            listed += 1
+        if skipped:
+            results["_manifest"] = {"listed": listed, "skipped_count": len(skipped),
+                                    "skipped": skipped[:self.MANIFEST_LIMIT]}
+        return json.dumps(results, indent=2)
 
     def execute(self, **kwargs) -> str:
         file_paths = kwargs.get('file_paths', [])
+        max_file_bytes = max(1, int(kwargs.get('max_file_bytes') or self.DEFAULT_MAX_FILE_BYTES))
+        max_total_bytes = max(1, int(kwargs.get('max_total_bytes') or self.DEFAULT_MAX_TOTAL_BYTES))
+        selection = {key: kwargs[key] for key in ('start_line', 'end_line', 'start_byte', 'end_byte')
+                     if kwargs.get(key) is not None}
+        error = self._check_selection(selection)
+        if error:
+            return json.dumps({"error": error}, indent=2)
+        pattern = kwargs.get('glob') or None
+        skip_unchanged = bool(kwargs.get('skip_unchanged'))
+        tool_use_id = current_tool_use_id.get()
+        if kwargs.get('list_only'):
+            try:
+                return self._list_files(file_paths, pattern)
+            except Exception as e:
+                return json.dumps({"error": str(e)}, indent=2)
+
         results = {}
+        truncated = []
+        skipped = []
+        ranges = []
+        remaining = max_total_bytes
+        bytes_read = 0
+        stopped_at = None
+        in_flight = deque()
 
-        try:
-            for path in file_paths:
-                if os.path.isdir(path):
-                    # If it's a directory, read it recursively
-                    dir_results = self._read_directory(path)
-                    results.update(dir_results)
+        def collect():
+            # Budget is reserved from the stat size at submit; hand back what the read didn't use
+            nonlocal remaining, bytes_read
+            path, info, reserved, explicit, future = in_flight.popleft()
+            content, read, cut, span, digest = future.result()
+            if content is None:
+                self.index.note_content(info, "binary")
+                # Binary by its content rather than its name: treated like a binary type
+                if explicit:
+                    results[path] = "Skipped: Binary or ignored file type"
+                else:
+                    del results[path]
+                    skipped.append({"path": path, "reason": "binary content"})
+            elif digest is not None and read == info.size:
+                # A whole-file read: cached, or a note if the model already has this exact text
+                lines = content.count('\n') + (not content.endswith('\n')) if content else 0
+                self.index.note_content(info, "text", lines)
+                previous = self.reads.previous(info.path)
+                if skip_unchanged and previous is not None and previous.digest == digest:
+                    self.reads.refresh(info, previous)
+                    results[path] = self._unchanged_note(info, previous)
+                    read = 0
                 else:
-                    # If it's a file, read it directly
-                    content = self._read_file(path)
+                    self.reads.store(info, content, digest, tool_use_id)
                     results[path] = content
+            else:
+                results[path] = content
+            if span:
+                ranges.append({"path": path, **span})
+            remaining += reserved - read
+            bytes_read += read
+            if cut:
+                truncated.append({"path": path, "size": info.size, "read": read})
+
+        try:
+            pool = self._get_pool()
+            for path, info, explicit in self._iter_targets(file_paths, results, skipped, pattern):
+                while remaining <= 0 and in_flight:
+                    collect()
+                if remaining <= 0:
+                    stopped_at = path
+                    break
+                limit = min(max_file_bytes, remaining)
+                if info.kind == "binary":
+                    # Seen by content on an earlier read and unchanged since
+                    if explicit:
+                        results[path] = "Skipped: Binary or ignored file type"
+                    else:
+                        skipped.append({"path": path, "reason": "binary content"})
+                    continue
+                cached = None if explicit and selection else self.reads.get(info)
+                if cached is not None and info.size <= limit:
+                    # Unchanged since it was last read in full: no disk I/O
+                    if skip_unchanged:
+                        results[path] = self._unchanged_note(info, cached)
+                    else:
+                        results[path] = cached.content
+                        cached.tool_use_id = tool_use_id
+                        remaining -= info.size
+                        bytes_read += info.size
+                    continue
+                reserved = min(info.size, limit)
+                remaining -= reserved
+                # Claim the slot now so results keep walk order
+                results[path] = None
+                future = pool.submit(self._read_file, path, limit, selection if explicit else None)
+                in_flight.append((path, info, reserved, explicit, future))
+                if len(in_flight) >= self.MAX_IN_FLIGHT:
+                    collect()
+            while in_flight:
+                collect()
+
+            if truncated or skipped or stopped_at or ranges:
+                results["_manifest"] = self._manifest(
+                    truncated, skipped, ranges, stopped_at, bytes_read, max_file_bytes, max_total_bytes)
 
             return json.dumps(results, indent=2)
 
         except Exception as e:
-            return json.dumps({"error": str(e)}, indent=2)
\ No newline at end of file
+            for *_, future in in_flight:
+                future.cancel()
+            return json.dumps({"error": str(e)}, indent=2)
+
+    def _unchanged_note(self, info, cached) -> str:
+        """What a skip_unchanged read returns instead of text the model already has"""
+        self.reads.stats["unchanged"] += 1
+        since = f"tool_use {cached.tool_use_id}" if cached.tool_use_id else "an earlier read in this session"
+        lines = "" if info.line_count is None else f", {info.line_count} line{'' if info.line_count == 1 else 's'}"
+        return (f"Unchanged since {since} ({info.size} bytes{lines}); content omitted. "
+                f"If that result is no longer in context, read again without skip_unchanged.")
+
+    def _check_selection(self, selection: dict):
+        """An error message for an unusable line or byte range, or None"""
+        try:
+            for key, value in selection.items():
+                selection[key] = int(value)
+        except (TypeError, ValueError):
+            return "Line and byte ranges must be integers"
+        if ('start_line' in selection or 'end_line' in selection) and \
+                ('start_byte' in selection or 'end_byte' in selection):
+            return "Give either a line range or a byte range, not both"
+        if selection.get('start_line', 1) < 1 or selection.get('end_line', 1) < 1:
+            return "Line numbers start at 1"
+        if selection.get('start_byte', 0) < 0 or selection.get('end_byte', 0) < 0:
+            return "Byte offsets cannot be negative"
+        if selection.get('end_line', float('inf')) < selection.get('start_line', 1):
+            return "end_line is before start_line"
+        return None
+
+    def _manifest(self, truncated: list, skipped: list, ranges: list, stopped_at, bytes_read: int,
+                  max_file_bytes: int, max_total_bytes: int) -> dict:
+        """What the call left out, with each list capped at MANIFEST_LIMIT entries"""
+        manifest = {
+            "bytes_read": bytes_read,
+            "max_file_bytes": max_file_bytes,
+            "max_total_bytes": max_total_bytes,
+            "truncated_count": len(truncated),
+            "truncated": truncated[:self.MANIFEST_LIMIT],
+            "skipped_count": len(skipped),
+            "skipped": skipped[:self.MANIFEST_LIMIT],
+        }
+        if ranges:
+            manifest["ranges"] = ranges[:self.MANIFEST_LIMIT]
+        if stopped_at:
+            manifest["budget_exhausted"] = True
+            manifest["stopped_at"] = stopped_at
+            manifest["note"] = "Total byte budget spent; files from stopped_at onward were not read"
+        return manifest
@@ -29,9 +29,19 @@ class ToolCreatorTool(BaseTool):
     }
 
     def __init__(self):
+        self.client = None
+        self.console = None
+        self.tools_dir = Path(__file__).parent.parent / "tools"  # Fixed path
+
+    def setup(self) -> None:
+        """Create the API client once; the pooled instance keeps it warm across calls"""
         self.client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
         self.console = Console()
-        self.tools_dir = Path(__file__).parent.parent / "tools"  # Fixed path
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
 
     def _sanitize_filename(self, name: str) -> str:
         """Convert tool name to valid Python filename"""
@@ -1,4 +1,5 @@
 from tools.base import BaseTool
+from http_client import http_get
 import requests
 import json
 
@@ -46,7 +47,8 @@ class WeatherTool(BaseTool):
             # Format: plain text with temperature info
             url = f"https://wttr.in/{location}?format=j1"
             
-            response = requests.get(url, timeout=10)
+            # wttr.in refreshes conditions roughly every quarter hour
+            response = http_get(url, ttl=600)
             response.raise_for_status()
             
             data = response.json()
@@ -1,4 +1,5 @@
 from tools.base import BaseTool
+from http_client import BROWSER_HEADERS, http_get
 import requests
 from bs4 import BeautifulSoup, Comment
 import re
@@ -27,12 +28,8 @@ class WebScraperTool(BaseTool):
         url = kwargs.get("url")
 
         try:
-            headers = {
-                'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                               'AppleWebKit/537.36 (KHTML, like Gecko) '
-                               'Chrome/91.0.4472.124 Safari/537.36')
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            # Pooled and cached: a page fetched again is served fresh or revalidated with a 304
+            response = http_get(url, headers=BROWSER_HEADERS, ttl=600)
             response.raise_for_status()
 
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -5,7 +5,11 @@ This module provides rich, interactive CLI components that enhance the user expe
 with beautiful formatting, progress indicators, and status displays.
 """
 
+import json
+import sys
+import threading
 import time
+from collections import deque
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
 
@@ -16,7 +20,7 @@ try:
     from rich.columns import Columns
     from rich.layout import Layout
     from rich.live import Live
-    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeElapsedColumn
     from rich.status import Status
     from rich.text import Text
     from rich.tree import Tree
@@ -42,12 +46,291 @@ except ImportError:
     PROMPT_TOOLKIT_AVAILABLE = False
 
 
+# ─────────────────────────── Tool result previews ─────────────────────────── #
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size:,} bytes"
+    if size < 1024 * 1024:
+        return f"{size / 1024:,.1f} KB"
+    return f"{size / (1024 * 1024):,.1f} MB"
+
+
+def _byte_size(text: str) -> int:
+    return len(text.encode("utf-8", "replace"))
+
+
+def preview_text(text: str, max_chars: int = 4000, tail_chars: int = 1000) -> str:
+    """Head and tail of ``text`` with the size of the omitted middle; ``text`` itself if short"""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars - tail_chars]
+    tail = text[-tail_chars:] if tail_chars else ""
+    omitted = _byte_size(text) - _byte_size(head) - _byte_size(tail)
+    return f"{head}\n\n… {_format_size(omitted)} omitted …\n\n{tail}"
+
+
+def summarize_json(text: str, max_items: int = 20, value_chars: int = 200) -> Optional[str]:
+    """
+    Outline of a large JSON object or array, parsing only its first ``max_items`` entries.
+    
+    Returns None if ``text`` does not start like JSON or the entries read so
+    far are malformed, so the caller can fall back to a text preview.
+    """
+    index = len(text) - len(text.lstrip())
+    if index >= len(text) or text[index] not in "{[":
+        return None
+    is_object = text[index] == "{"
+    closing = "}" if is_object else "]"
+    lines = ["{" if is_object else "["]
+    index += 1
+    count = 0
+    try:
+        while True:
+            while index < len(text) and text[index] in " \t\r\n,":
+                index += 1
+            if index >= len(text):
+                return None
+            if text[index] == closing:
+                break
+            if count == max_items:
+                lines.append("  … more entries not parsed")
+                break
+            prefix = "  "
+            if is_object:
+                key, index = _JSON_DECODER.raw_decode(text, index)
+                while text[index] in " \t\r\n":
+                    index += 1
+                if text[index] != ":":
+                    return None
+                index += 1
+                while text[index] in " \t\r\n":
+                    index += 1
+                prefix = f"  {json.dumps(key)}: "
+            start = index
+            value, index = _JSON_DECODER.raw_decode(text, index)
+            # Shown from the source text, so big values are never re-serialized
+            rendered = text[start:index]
+            if len(rendered) > value_chars:
+                rendered = f"{rendered[:value_chars]}… ({_format_size(index - start)} {type(value).__name__})"
+            lines.append(prefix + rendered.replace("\n", " "))
+            count += 1
+    except (ValueError, IndexError):
+        return None
+    lines.append("}" if is_object else "]")
+    return "\n".join(lines)
+
+
+class ToolProgressTracker:
+    """Per-tool status rows for tools that run concurrently within one turn"""
+    
+    def __init__(self, console: "EnhancedConsole", tool_names: List[str], progress=None):
+        self.ui = console
+        self.tool_names = tool_names
+        self.progress = progress
+        self.task_ids = []
+        
+        if self.progress is not None:
+            for name in tool_names:
+                icon = console.icons['mcp'] if name.startswith('mcp_') else console.icons['tool']
+                self.task_ids.append(
+                    self.progress.add_task(f"{icon} [bold]{name}[/bold]: [dim]queued[/dim]", total=1)
+                )
+    
+    def start(self, index: int):
+        """Mark the tool at ``index`` as running"""
+        name = self.tool_names[index]
+        if self.progress is None:
+            print(f"[{name}] executing")
+            return
+        icon = self.ui.icons['mcp'] if name.startswith('mcp_') else self.ui.icons['tool']
+        self.progress.update(
+            self.task_ids[index],
+            description=f"{icon} [bold yellow]{name}[/bold yellow]: [yellow]Executing...[/yellow]"
+        )
+    
+    def finish(self, index: int, status: str, duration: Optional[float] = None):
+        """Mark the tool at ``index`` as completed or failed"""
+        name = self.tool_names[index]
+        if self.progress is None:
+            duration_str = f" ({duration:.1f}s)" if duration else ""
+            print(f"[{name}] {status}{duration_str}")
+            return
+        icon = self.ui.icons['mcp'] if name.startswith('mcp_') else self.ui.icons['tool']
+        duration_str = f" [dim]({duration:.1f}s)[/dim]" if duration else ""
+        if status == "completed":
+            description = f"{icon} [bold green]{name}[/bold green]: [green]Completed[/green]{duration_str}"
+        else:
+            description = f"{icon} [bold red]{name}[/bold red]: [red]Failed[/red]{duration_str}"
+        self.progress.update(self.task_ids[index], description=description, completed=1)
+
+
+class StreamRenderer:
+    """
+    Buffered terminal renderer for streamed model output.
+    
+    Deltas are collected and written out once ``max_chars`` have piled up or
+    ``interval`` seconds have passed (a background flusher covers pauses in
+    the stream), so a response costs a few dozen terminal writes instead of
+    one Rich render and flush per delta. Thinking and response text go into
+    separate regions, each closed before the next one opens. With
+    ``markdown=True`` the response region is rendered as Markdown one
+    finished block at a time; only the unfinished tail is re-rendered, in a
+    transient Live region.
+    """
+    
+    STYLES = {"thinking": "italic blue", "response": None}
+    
+    def __init__(self, console: "EnhancedConsole", interval: float = 0.05, max_chars: int = 1024,
+                 markdown: bool = False):
+        self.ui = console
+        self.interval = interval
+        self.max_chars = max_chars
+        self.markdown = markdown and RICH_AVAILABLE
+        self.region: Optional[str] = None
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        # Incremental Markdown state: the unfinished tail and its live preview
+        self._tail = ""
+        self._live = None
+        self._blocks_printed = False
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.stats = {"deltas": 0, "chars": 0, "writes": 0}
+    
+    def start(self) -> "StreamRenderer":
+        self._flusher = threading.Thread(target=self._flush_periodically, name="stream-flusher", daemon=True)
+        self._flusher.start()
+        return self
+    
+    def begin(self, region: str, header: Optional[str] = None):
+        """Close the current region and open ``region`` ("thinking" or "response")"""
+        with self._lock:
+            self.end()
+            if header:
+                self.ui.print(header, end='')
+            self.region = region
+    
+    def write(self, text: str):
+        """Queue a delta for the current region"""
+        if not text:
+            return
+        with self._lock:
+            if self.region is None:
+                self.region = "response"
+            self._pending.append(text)
+            self._pending_chars += len(text)
+            self.stats["deltas"] += 1
+            self.stats["chars"] += len(text)
+            if self._pending_chars >= self.max_chars or time.monotonic() - self._last_flush >= self.interval:
+                self.flush()
+    
+    def note(self, *args, **kwargs):
+        """Print a status line (tool use, errors) between regions"""
+        with self._lock:
+            self.end()
+            self.ui.print(*args, **kwargs)
+    
+    def end(self):
+        """Flush and close the current region"""
+        with self._lock:
+            if self.region is None:
+                return
+            self.flush()
+            if self._live is not None or self._tail:
+                self._finish_markdown()
+            elif self.region == "thinking":
+                self.ui.print("")  # New line after thinking
+            self.region = None
+    
+    def flush(self):
+        """Write out everything buffered so far"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            text = "".join(self._pending)
+            self._pending.clear()
+            self._pending_chars = 0
+            self.stats["writes"] += 1
+            if self.markdown and self.region == "response":
+                self._write_markdown(text)
+            elif self.ui.console is not None:
+                self.ui.console.print(text, end='', style=self.STYLES.get(self.region),
+                                      markup=False, highlight=False, soft_wrap=True)
+            else:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+    
+    def close(self):
+        """Flush, close the open region and stop the background flusher"""
+        self._closed.set()
+        with self._lock:
+            self.end()
+    
+    def _flush_periodically(self):
+        while not self._closed.wait(self.interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_flush >= self.interval:
+                    self.flush()
+    
+    @staticmethod
+    def _split_finished_blocks(text: str):
+        """Split Markdown at the last blank line outside a code fence: (finished, tail)"""
+        in_fence = False
+        cut = 0
+        position = 0
+        for line in text.splitlines(keepends=True):
+            position += len(line)
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.startswith("~~~"):
+                in_fence = not in_fence
+            elif not stripped and not in_fence and line.endswith("\n"):
+                cut = position
+        return text[:cut], text[cut:]
+    
+    def _write_markdown(self, text: str):
+        finished, self._tail = self._split_finished_blocks(self._tail + text)
+        if finished.strip():
+            # Printed above the live preview, which then only holds the tail
+            self._print_markdown(finished)
+        if self._live is None:
+            self._live = Live(console=self.ui.console, auto_refresh=False, transient=True)
+            self._live.start()
+        self._live.update(Markdown(self._tail), refresh=True)
+    
+    def _finish_markdown(self):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        if self._tail.strip():
+            self._print_markdown(self._tail)
+        self._tail = ""
+        self._blocks_printed = False
+    
+    def _print_markdown(self, text: str):
+        # Separate pieces the way Rich separates blocks within one document
+        if self._blocks_printed:
+            self.ui.console.print("")
+        self.ui.console.print(Markdown(text))
+        self._blocks_printed = True
+
+
 class EnhancedConsole:
     """Enhanced console with rich formatting capabilities"""
     
     def __init__(self):
         self.console = Console() if RICH_AVAILABLE else None
         self.history = InMemoryHistory() if PROMPT_TOOLKIT_AVAILABLE else None
+        # Full text of recent tool results, for /result; the screen only gets previews
+        self.tool_results: deque = deque(maxlen=20)
+        self.tool_result_count = 0
+        self.preview_chars = 4000
         
         # Theme colors
         self.colors = {
@@ -259,7 +542,6 @@ class EnhancedConsole:
     
     def print_json(self, data: Any, title: str = "JSON Output"):
         """Print formatted JSON data"""
-        import json
         json_str = json.dumps(data, indent=2)
         
         if not RICH_AVAILABLE:
@@ -270,6 +552,51 @@ class EnhancedConsole:
         syntax = Syntax(json_str, "json", theme="monokai", line_numbers=False)
         self.print_panel(syntax, title, "info")
     
+    def print_tool_result(self, result: str, title: str):
+        """
+        Show a tool result without rendering all of a large payload.
+        
+        Results up to ``preview_chars`` are shown in full (as JSON when they
+        parse). Larger ones get an outline of their first JSON entries, or
+        their head and tail, plus their size; the full text is kept for
+        ``page_tool_result``.
+        """
+        self.tool_result_count += 1
+        self.tool_results.append((self.tool_result_count, title, result))
+        if len(result) <= self.preview_chars:
+            if result.lstrip()[:1] in ("{", "["):
+                try:
+                    self.print_json(json.loads(result), title)
+                    return
+                except ValueError:
+                    pass
+            self.print_panel(Text(result) if RICH_AVAILABLE else result, title, "success")
+            return
+        
+        preview = summarize_json(result) or preview_text(result, self.preview_chars)
+        footer = (f"{_format_size(_byte_size(result))} total · "
+                  f"/result {self.tool_result_count} shows all of it")
+        if not RICH_AVAILABLE:
+            self.print_panel(f"{preview}\n\n{footer}", title, "success")
+            return
+        content = Text(preview)
+        content.append(f"\n\n{footer}", style="dim")
+        self.print_panel(content, title, "success")
+    
+    def page_tool_result(self, number: Optional[int] = None) -> bool:
+        """Page through a full tool result by its number (default: the latest); False if not kept"""
+        entry = next((entry for entry in reversed(self.tool_results)
+                      if number is None or entry[0] == number), None)
+        if entry is None:
+            return False
+        _, title, result = entry
+        if not RICH_AVAILABLE:
+            print(f"\n=== {title} ===\n{result}")
+            return True
+        with self.console.pager():
+            self.console.print(Text(result))
+        return True
+    
     def print_markdown(self, markdown_text: str):
         """Print markdown-formatted text"""
         if not RICH_AVAILABLE:
@@ -305,6 +632,20 @@ class EnhancedConsole:
         table.add_row("Failed Tools", str(stats.get("failed_tools", 0)), "❌")
         table.add_row("Memories Created", str(stats.get("memories_created", 0)), "🧠")
         
+        # Prompt cache effectiveness (input tokens served from cache vs. total)
+        cache_read = stats.get("cache_read_tokens", 0)
+        prompt_tokens = stats.get("input_tokens", 0) + cache_read + stats.get("cache_write_tokens", 0)
+        if prompt_tokens:
+            hit_rate = cache_read / prompt_tokens * 100
+            table.add_row("Cache Read Tokens", f"{cache_read:,} ({hit_rate:.0f}%)", "⚡")
+            table.add_row("Cache Write Tokens", f"{stats.get('cache_write_tokens', 0):,}", "💾")
+        
+        # Where the time went across all agent rounds
+        if stats.get("model_time") or stats.get("tool_time"):
+            table.add_row("Model Time", f"{stats.get('model_time', 0):.1f}s", "🤖")
+            table.add_row("Tool Time", f"{stats.get('tool_time', 0):.1f}s", "🔧")
+            table.add_row("Memory Time", f"{stats.get('memory_time', 0):.1f}s", "🧠")
+        
         self.console.print(table)
 
     def get_input_with_stats(self, prompt_text: str, session_stats: Dict[str, Any]) -> str:
@@ -391,6 +732,31 @@ class EnhancedConsole:
             yield
             print("Done.")
     
+    @contextmanager
+    def tool_progress(self, tool_names: List[str]):
+        """Context manager showing one live status row per concurrently running tool"""
+        if not RICH_AVAILABLE:
+            yield ToolProgressTracker(self, tool_names)
+            return
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("{task.description}"),
+            TimeElapsedColumn(),
+            console=self.console,
+            transient=False
+        ) as progress:
+            yield ToolProgressTracker(self, tool_names, progress)
+    
+    @contextmanager
+    def stream_renderer(self, markdown: bool = False, interval: float = 0.05, max_chars: int = 1024):
+        """Context manager yielding a StreamRenderer for one streamed response"""
+        renderer = StreamRenderer(self, interval=interval, max_chars=max_chars, markdown=markdown).start()
+        try:
+            yield renderer
+        finally:
+            renderer.close()
+    
     @contextmanager
     def live_update_context(self):
         """Context manager for live updates"""
@@ -506,7 +872,7 @@ def format_command_suggestions(current_input: str) -> List[str]:
     all_commands = [
         '/help', '/tools', '/memory', '/remember', '/recall', '/search-memory', 
         '/what-did-i', '/forget-memory', '/refresh', '/reload', '/config', 
-        '/status', '/clear', '/exit', '/quit', 'help', 'tools', 'memory',
+        '/status', '/clear', '/result', '/exit', '/quit', 'help', 'tools', 'memory',
         'remember', 'recall', 'search-memory', 'what-did-i', 'forget-memory',
         'refresh', 'reload', 'config', 'status', 'clear', 'exit', 'quit'
     ]
@@ -0,0 +1,494 @@
+"""
+Workspace File Index for SublimeChain
+
+A process-wide, in-memory index of the directory trees the file tools
+touch. Directory listings, ``.gitignore``/``.ignore`` rules and per-file
+metadata (size, mtime, detected type, line count) are cached and
+revalidated by mtime, so walking a folder a second time costs a stat sweep
+instead of a fresh scandir of every directory and a re-parse of every
+ignore file. Walks honor gitignore rules, including nested ignore files,
+negation and the rules of parent directories up to the repository root.
+
+``ReadCache`` keeps the text of files read in full during the session, so
+re-reading an unchanged file needs no disk I/O and can be answered with a
+reference to the tool_use that already returned it.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ignore files read in each directory, later ones taking precedence (ripgrep's order)
+IGNORE_FILES = (".gitignore", ".ignore")
+
+# Something modified this close to when it was cached may change again within
+# the same mtime tick, so it is not cached (git's "racily clean" problem)
+RACY_WINDOW_NS = 2_000_000_000
+
+# Entries kept per cache before it is cleared and rebuilt on demand
+MAX_CACHED_FILES = 200_000
+MAX_CACHED_DIRS = 20_000
+# Text held by the session read cache before the least recently used files go
+MAX_CACHED_READ_CHARS = 64 * 1024 * 1024
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Regex source for a gitignore-style glob over ``/``-separated paths:
+    ``*`` and ``?`` stay within one path segment, ``**/`` spans any number
+    of directories and a trailing ``**`` matches everything below.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                if pattern.startswith("**/", i):
+                    out.append("(?:.*/)?")
+                    i += 3
+                else:
+                    out.append(".*")
+                    i += 2
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                negate = body[:1] in ("!", "^")
+                body = body[1:] if negate else body
+                body = body.replace("\\", "\\\\").replace("^", "\\^")
+                out.append(f"(?!/)[{'^' if negate else ''}{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRule:
+    """One line of an ignore file"""
+
+    __slots__ = ("pattern", "regex", "negate", "dir_only")
+
+    def __init__(self, pattern: str, regex: "re.Pattern", negate: bool, dir_only: bool):
+        self.pattern = pattern
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+
+
+def parse_ignore_lines(lines: List[str]) -> List[IgnoreRule]:
+    """Rules from the lines of a .gitignore-format file, in file order"""
+    rules = []
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        # Trailing spaces are dropped unless the last one is escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to the ignore file's directory
+        anchored = "/" in line
+        body = glob_to_regex(line.lstrip("/"))
+        source = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+        try:
+            rules.append(IgnoreRule(raw.strip(), re.compile(source, re.DOTALL), negate, dir_only))
+        except re.error as e:
+            logger.debug(f"Skipping unparseable ignore pattern {raw!r}: {e}")
+    return rules
+
+
+class FileInfo:
+    """
+    Cached metadata for one file. ``kind`` ("text" or "binary") and
+    ``line_count`` are only known once something has read the file and
+    reported it through ``WorkspaceIndex.note_content``.
+    """
+
+    __slots__ = ("path", "size", "mtime_ns", "kind", "line_count")
+
+    def __init__(self, path: str, size: int, mtime_ns: int):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.kind: Optional[str] = None
+        self.line_count: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        return {"size": self.size, "type": self.kind, "lines": self.line_count}
+
+
+# (name, is_dir, is_file) for each entry of a directory, in name order
+_Listing = List[Tuple[str, bool, bool]]
+# Rules of one ignore file, with how to turn a walk-relative path into one
+# relative to the file's directory: drop the ``strip`` prefix, prepend ``above``
+_RuleSet = Tuple[str, str, List[IgnoreRule]]
+
+
+class WorkspaceIndex:
+    """
+    Thread-safe cache of directory listings, ignore rules and file metadata.
+
+    Every lookup stats what it returns, so a cached answer is never older
+    than the filesystem's mtimes say; what the cache saves is rescanning
+    unchanged directories, re-parsing unchanged ignore files and
+    re-detecting the type and line count of unchanged files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings: Dict[str, Tuple[int, _Listing]] = {}
+        self._rules: Dict[str, Tuple[Tuple, List[Tuple[str, List[IgnoreRule]]]]] = {}
+        self._files: Dict[str, FileInfo] = {}
+        self.stats = {"listing_hits": 0, "listing_misses": 0, "rule_parses": 0, "type_hits": 0}
+
+    # ── Cached lookups ───────────────────────────────────────────────────── #
+
+    @staticmethod
+    def _racy(mtime_ns: int) -> bool:
+        return mtime_ns >= time.time_ns() - RACY_WINDOW_NS
+
+    def _listing(self, path: str) -> _Listing:
+        """The entries of a directory, rescanned only when its mtime moved"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(path)
+        if cached and cached[0] == mtime_ns:
+            self.stats["listing_hits"] += 1
+            return cached[1]
+
+        self.stats["listing_misses"] += 1
+        listing = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    listing.append((entry.name, is_dir, not is_dir and entry.is_file()))
+                except OSError:
+                    continue
+        listing.sort()
+        if not self._racy(mtime_ns):
+            with self._lock:
+                if len(self._listings) >= MAX_CACHED_DIRS:
+                    self._listings.clear()
+                self._listings[path] = (mtime_ns, listing)
+        return listing
+
+    def _dir_rules(self, path: str, names: Optional[set] = None) -> List[Tuple[str, List[IgnoreRule]]]:
+        """(ignore file, rules) for each ignore file present in a directory"""
+        stamps = []
+        for name in IGNORE_FILES:
+            if names is not None and name not in names:
+                continue
+            try:
+                st = os.stat(os.path.join(path, name))
+                stamps.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                continue
+        stamps = tuple(stamps)
+        with self._lock:
+            cached = self._rules.get(path)
+        if cached and cached[0] == stamps:
+            return cached[1]
+
+        parsed = []
+        for name, mtime_ns, _ in stamps:
+            try:
+                with open(os.path.join(path, name), "r", encoding="utf-8", errors="replace") as f:
+                    rules = parse_ignore_lines(f.readlines())
+            except OSError:
+                continue
+            self.stats["rule_parses"] += 1
+            if rules:
+                parsed.append((name, rules))
+        if not any(self._racy(mtime_ns) for _, mtime_ns, _ in stamps):
+            with self._lock:
+                if len(self._rules) >= MAX_CACHED_DIRS:
+                    self._rules.clear()
+                self._rules[path] = (stamps, parsed)
+        return parsed
+
+    def file_info(self, path: str) -> FileInfo:
+        """Stat a file, keeping its detected type and line count if it is unchanged"""
+        return self._file_info(os.path.abspath(path))
+
+    def _file_info(self, path: str) -> FileInfo:
+        st = os.stat(path)
+        with self._lock:
+            info = self._files.get(path)
+            if info is not None and info.size == st.st_size and info.mtime_ns == st.st_mtime_ns:
+                if info.kind is not None:
+                    self.stats["type_hits"] += 1
+                return info
+            info = FileInfo(path, st.st_size, st.st_mtime_ns)
+            if len(self._files) >= MAX_CACHED_FILES:
+                self._files.clear()
+            self._files[path] = info
+            return info
+
+    def note_content(self, info: FileInfo, kind: str, line_count: Optional[int] = None) -> None:
+        """Record what a reader found in a file, for as long as its size and mtime hold"""
+        if self._racy(info.mtime_ns):
+            return
+        with self._lock:
+            info.kind = kind
+            info.line_count = line_count
+
+    # ── Ignore rules ─────────────────────────────────────────────────────── #
+
+    @staticmethod
+    def _repo_root(path: str) -> Optional[str]:
+        """The nearest directory at or above ``path`` holding a .git entry"""
+        current = path
+        while True:
+            if os.path.exists(os.path.join(current, ".git")):
+                return current
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+    def _inherited_rules(self, root: str) -> List[_RuleSet]:
+        """
+        Rule sets in effect at ``root`` from its ancestors up to the
+        repository root (plus .git/info/exclude), outermost first.
+        """
+        repo = self._repo_root(root)
+        if repo is None:
+            return []
+        if repo == root:
+            return [("", "", rules) for rules in self._exclude_rules(repo)]
+        parts = os.path.relpath(root, repo).replace(os.sep, "/").split("/")
+        # Exclude rules match relative to the repository root, like its .gitignore
+        stack = [("", "/".join(parts) + "/", rules) for rules in self._exclude_rules(repo)]
+        for depth in range(len(parts)):
+            ancestor = os.path.join(repo, *parts[:depth])
+            # Seen from ``ancestor``, a walk path sits below the rest of root's path
+            above = "/".join(parts[depth:]) + "/"
+            stack.extend(("", above, rules) for _, rules in self._dir_rules(ancestor))
+        return stack
+
+    @staticmethod
+    def _exclude_rules(repo: str) -> List[List[IgnoreRule]]:
+        """The repository's .git/info/exclude rules"""
+        try:
+            with open(os.path.join(repo, ".git", "info", "exclude"), "r", encoding="utf-8", errors="replace") as f:
+                rules = parse_ignore_lines(f.readlines())
+        except OSError:
+            return []
+        return [rules] if rules else []
+
+    @staticmethod
+    def _ignored(stack: List[_RuleSet], rel: str, is_dir: bool) -> bool:
+        """Whether the last matching rule, deepest ignore file first, ignores ``rel``"""
+        for strip, above, rules in reversed(stack):
+            # Patterns match paths relative to their own ignore file's directory
+            sub = above + rel[len(strip):]
+            for rule in reversed(rules):
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.match(sub):
+                    return not rule.negate
+        return False
+
+    # ── Queries ──────────────────────────────────────────────────────────── #
+
+    def walk(self, root: str, ignore: Optional[Callable[[str, str, bool], Optional[str]]] = None,
+             skipped: Optional[List[Dict]] = None) -> Iterator[FileInfo]:
+        """
+        Yield a FileInfo for each file under ``root``, shallowest first and
+        in name order, skipping what the ignore files exclude. ``ignore``
+        may veto more entries: it gets (name, path, is_dir) and returns a
+        reason or None. Skipped entries are appended to ``skipped`` as
+        ``{"path", "reason"}``. The walk is lazy and stops when the caller
+        stops consuming it.
+        """
+        root = os.path.abspath(root)
+        inherited = self._inherited_rules(root)
+        # (directory, its path relative to root, the rule stack in effect there)
+        pending = deque([(root, "", inherited)])
+        while pending:
+            current, rel_dir, stack = pending.popleft()
+            try:
+                listing = self._listing(current)
+            except OSError as e:
+                if current == root:
+                    raise
+                if skipped is not None:
+                    skipped.append({"path": current,
+                                    "reason": f"unreadable directory: {e.strerror or e}"})
+                continue
+
+            names = {name for name, _, _ in listing}
+            local = self._dir_rules(current, names)
+            if local:
+                stack = stack + [(rel_dir, "", rules) for _, rules in local]
+
+            subdirs = []
+            for name, is_dir, is_file in listing:
+                if not is_dir and not is_file:
+                    continue
+                rel = rel_dir + name
+                path = os.path.join(current, name)
+                if stack and self._ignored(stack, rel, is_dir):
+                    reason = "gitignored"
+                else:
+                    reason = ignore(name, path, is_dir) if ignore else None
+                if reason:
+                    if skipped is not None:
+                        skipped.append({"path": path, "reason": reason})
+                elif is_dir:
+                    subdirs.append((path, rel + "/", stack))
+                else:
+                    try:
+                        yield self._file_info(path)
+                    except OSError as e:
+                        if skipped is not None:
+                            skipped.append({"path": path,
+                                            "reason": f"unreadable: {e.strerror or e}"})
+            pending.extend(subdirs)
+
+    def glob(self, root: str, pattern: str,
+             ignore: Optional[Callable[[str, str, bool], Optional[str]]] = None) -> Iterator[FileInfo]:
+        """Files under ``root`` whose path relative to it matches a glob such as ``src/**/*.py``"""
+        root = os.path.abspath(root)
+        regex = re.compile(f"^{glob_to_regex(pattern.strip('/'))}$", re.DOTALL)
+        for info in self.walk(root, ignore):
+            if regex.match(info.path[len(root) + 1:].replace(os.sep, "/")):
+                yield info
+
+    def clear(self) -> None:
+        with self._lock:
+            self._listings.clear()
+            self._rules.clear()
+            self._files.clear()
+
+
+class CachedRead:
+    """
+    A file's full text as last read, with its digest and the tool_use that
+    last returned that text. ``mtime_ns`` is None when the read was too
+    close to a write to trust: the digest still counts, the text is not served.
+    """
+
+    __slots__ = ("size", "mtime_ns", "digest", "content", "tool_use_id")
+
+    def __init__(self, size: int, mtime_ns: Optional[int], digest: str, content: str,
+                 tool_use_id: Optional[str]):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.content = content
+        self.tool_use_id = tool_use_id
+
+
+class ReadCache:
+    """
+    Session-scoped cache of file text keyed by path and validated by
+    (size, mtime), bounded by total characters with LRU eviction.
+    """
+
+    def __init__(self, max_chars: int = MAX_CACHED_READ_CHARS):
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[str, CachedRead]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stores": 0, "unchanged": 0, "evictions": 0}
+
+    def get(self, info: FileInfo) -> Optional[CachedRead]:
+        """The cached read of a file, if its size and mtime still match"""
+        with self._lock:
+            entry = self._entries.get(info.path)
+            if entry is None or entry.mtime_ns != info.mtime_ns or entry.size != info.size:
+                return None
+            self._entries.move_to_end(info.path)
+            self.stats["hits"] += 1
+            return entry
+
+    def previous(self, path: str) -> Optional[CachedRead]:
+        """The last read of a file whatever its current stat, for comparing digests"""
+        with self._lock:
+            return self._entries.get(path)
+
+    def store(self, info: FileInfo, content: str, digest: str, tool_use_id: Optional[str]) -> CachedRead:
+        """Remember a full read of a file returned to the model by ``tool_use_id``"""
+        mtime_ns = None if WorkspaceIndex._racy(info.mtime_ns) else info.mtime_ns
+        entry = CachedRead(info.size, mtime_ns, digest, content, tool_use_id)
+        with self._lock:
+            old = self._entries.pop(info.path, None)
+            if old is not None:
+                self._chars -= len(old.content)
+            if len(content) > self.max_chars:
+                return entry
+            self._entries[info.path] = entry
+            self._chars += len(content)
+            self.stats["stores"] += 1
+            while self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted.content)
+                self.stats["evictions"] += 1
+        return entry
+
+    def refresh(self, info: FileInfo, entry: CachedRead) -> None:
+        """Re-validate an entry under a file's new stat after its digest matched"""
+        with self._lock:
+            entry.size = info.size
+            entry.mtime_ns = None if WorkspaceIndex._racy(info.mtime_ns) else info.mtime_ns
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+
+_index: Optional[WorkspaceIndex] = None
+_read_cache: Optional[ReadCache] = None
+_index_lock = threading.Lock()
+
+
+def get_workspace_index() -> WorkspaceIndex:
+    """The process-wide index shared by the file tools"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = WorkspaceIndex()
+        return _index
+
+
+def get_read_cache() -> ReadCache:
+    """The process-wide read cache shared by the file tools"""
+    global _read_cache
+    with _index_lock:
+        if _read_cache is None:
+            _read_cache = ReadCache()
+        return _read_cache